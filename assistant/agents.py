@@ -1,27 +1,29 @@
 import argparse
 import asyncio
-from typing import AsyncGenerator, List, Union
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import AsyncGenerator, List, Optional, Union
 
 import logfire
 from dotenv import load_dotenv
 from pydantic_ai import Agent, RunContext
-from pydantic_ai.common_tools.tavily import TavilySearchTool
-from pydantic_ai.mcp import MCPServerStreamableHTTP
 from pydantic_ai.messages import TextPartDelta, PartDeltaEvent, ModelMessage, FunctionToolCallEvent, PartStartEvent, \
     ToolCallPartDelta, FinalResultEvent, FunctionToolResultEvent, ModelResponsePart, ModelRequestPart, TextPart, \
     ToolCallPart, ToolReturnPart
 from pydantic_ai.models.openai import OpenAIModel
 from pydantic_ai.providers.openai import OpenAIProvider
 from pydantic_ai import Agent, RunContext, Tool
-from pydantic_ai.common_tools.tavily import TavilySearchTool
-from pydantic_ai.mcp import MCPServerStreamableHTTP
 from pydantic_ai.messages import TextPartDelta, PartDeltaEvent, ModelMessage, FunctionToolCallEvent, PartStartEvent, \
     ToolCallPartDelta, FinalResultEvent, FunctionToolResultEvent
 from pydantic_ai.models.openai import OpenAIModel
 from pydantic_ai.providers.openai import OpenAIProvider
-from tavily import AsyncTavilyClient
+from pydantic_ai.exceptions import AgentRunError
+from pydantic_ai.usage import UsageLimits
 
+from mcp_connections import PersistentMCPServer, MCPConnections
+from search import create_search_backend
 from settings import config
+from tool_cache import ToolResultCache, Embedder
 
 load_dotenv()
 
@@ -29,6 +31,25 @@ if __name__ == '__main__':
     logfire.configure(send_to_logfire="if-token-present")
     logfire.instrument_openai()
 
+mcp_server = PersistentMCPServer(url=config.MCP_SERVER_URL)
+mcp_connections = MCPConnections([mcp_server], config.MCP_TOOLS_REFRESH_S)
+
+search_backend = create_search_backend()
+
+tool_cache_embedder = None
+if config.TOOL_CACHE_EMBEDDING_MODEL:
+    tool_cache_embedder = Embedder(
+        config.TOOL_CACHE_EMBEDDING_API_URL or config.OPENAI_API_URL,
+        config.TOOL_CACHE_EMBEDDING_MODEL
+    )
+
+search_cache = ToolResultCache(
+    'Search', config.TOOL_CACHE_TTL_S, config.TOOL_CACHE_MAX_ENTRIES, tool_cache_embedder, config.TOOL_CACHE_SIMILARITY
+)
+knowledge_cache = ToolResultCache(
+    'Knowledge', config.TOOL_CACHE_TTL_S, config.TOOL_CACHE_MAX_ENTRIES, tool_cache_embedder, config.TOOL_CACHE_SIMILARITY
+)
+
 gpt_model = OpenAIModel(
     config.OPENAI_MODEL,
     provider=OpenAIProvider(api_key='none', base_url=config.OPENAI_API_URL),
@@ -50,10 +71,7 @@ async def web_search_tool(query: str):
     """
 
     logfire.debug(f'Search {query}')
-    tool = TavilySearchTool(client=AsyncTavilyClient(config.TAVILY_API_TOKEN))
-
-    result = await tool(query)
-    return result
+    return await search_cache.get_or_compute(query, lambda: search_backend.search(query))
 
 
 supervisor_agent = Agent(
@@ -68,12 +86,64 @@ supervisor_agent = Agent(
     Format your response so that it can be directly fed to a text-to-speech software: meaning there should be no markdown or other formatting, the numbers should be written out in word form (not as digits) and do not use emojis!
     /no_think
     """,
-    mcp_servers=[MCPServerStreamableHTTP(url='http://192.168.1.87:8080/mcp/')]
+    mcp_servers=[mcp_server]
 )
 
 
+@dataclass
+class DelegatedOutput:
+    """Where the parts of a streamed supervisor run go, sub-agents write their answers into it directly."""
+    output: asyncio.Queue
+    # Set once a sub-agent has streamed a complete answer to the user
+    answered: bool = False
+    # Held by the sub-agent streaming to the user, answers of concurrent tool calls wait for their turn
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+# Tools run in tasks copied from the context of the supervisor run, this is how they find its output
+delegated_output: ContextVar[Optional[DelegatedOutput]] = ContextVar('delegated_output', default=None)
+
+
+async def stream_knowledge_answer(question: str, delegation: DelegatedOutput) -> str:
+    """
+    Streams the answer to the user as it is generated, unless another answer is being streamed already.
+    Then it is buffered and goes out in one piece after that one, interleaved deltas would be gibberish.
+    """
+    streaming = not delegation.lock.locked()
+    if streaming:
+        await delegation.lock.acquire()
+
+    try:
+        buffered: List[str] = []
+
+        def emit(content: str):
+            if streaming:
+                delegation.output.put_nowait(TextPart(content=content))
+            else:
+                buffered.append(content)
+
+        async with knowledge_agent.iter(question) as run:
+            async for node in run:
+                if Agent.is_model_request_node(node):
+                    async with node.stream(run.ctx) as request_stream:
+                        async for event in request_stream:
+                            if isinstance(event, PartStartEvent) and isinstance(event.part, TextPart) and event.part.content:
+                                emit(event.part.content)
+                            elif isinstance(event, PartDeltaEvent) and isinstance(event.delta, TextPartDelta):
+                                emit(event.delta.content_delta)
+
+        if not streaming:
+            async with delegation.lock:
+                delegation.output.put_nowait(TextPart(content=' ' + ''.join(buffered)))
+    finally:
+        if streaming:
+            delegation.lock.release()
+
+    return run.result.output
+
+
 @supervisor_agent.tool
-async def knowledge_agent_tool(ctx: RunContext[None], question: str) -> AsyncGenerator[str, None]:
+async def knowledge_agent_tool(ctx: RunContext[None], question: str) -> str:
     """
     A knowledge agent handling requests concerning general knowledge and searchable information
 
@@ -82,85 +152,194 @@ async def knowledge_agent_tool(ctx: RunContext[None], question: str) -> AsyncGen
         question: the users message
     """
     logfire.debug(f'Knowledge {question}')
-    result = await knowledge_agent.run(question)
-    return result.data
 
+    delegation = delegated_output.get()
+    if delegation is None or config.KNOWLEDGE_DELEGATION != 'streaming':
+        async def answer():
+            result = await knowledge_agent.run(question)
+            return result.data
 
-async def gen(prompt: str, message_history: List[ModelMessage]) -> AsyncGenerator[Union[ModelRequestPart, ModelResponsePart], None]:
-    output_messages: list[str] = []
-    async with supervisor_agent.run_mcp_servers():
-        async with supervisor_agent.iter(prompt, message_history=message_history) as run:
-            async for node in run:
-                if Agent.is_model_request_node(node):
-                    # A model request node => We can stream tokens from the model's request
-                    output_messages.append(
+        return await knowledge_cache.get_or_compute(question, answer)
+
+    streamed = False
+
+    async def answer():
+        nonlocal streamed
+        streamed = True
+        return await stream_knowledge_answer(question, delegation)
+
+    data = await knowledge_cache.get_or_compute(question, answer)
+    if not streamed:
+        # Served from the cache, the user still has to hear it
+        async with delegation.lock:
+            delegation.output.put_nowait(TextPart(content=' ' + data))
+
+    delegation.answered = True
+    return f'The user has already heard this answer, do not repeat it: {data}'
+
+
+async def supervise(
+        prompt: str,
+        message_history: List[ModelMessage],
+        trace: Optional[List[str]],
+        delegation: DelegatedOutput,
+        speculative: bool
+):
+    async with supervisor_agent.iter(prompt, message_history=message_history) as run:
+        async for node in run:
+            if Agent.is_model_request_node(node):
+                # A model request node => We can stream tokens from the model's request
+                if trace is not None:
+                    trace.append(
                         '=== ModelRequestNode: streaming partial request tokens ==='
                     )
-                    async with node.stream(run.ctx) as request_stream:
-                        async for event in request_stream:
-                            if isinstance(event, PartStartEvent):
-                                output_messages.append(
+                async with node.stream(run.ctx) as request_stream:
+                    async for event in request_stream:
+                        if isinstance(event, PartStartEvent):
+                            if trace is not None:
+                                trace.append(
                                     f'[Request] Starting part {event.index}: {event.part!r}'
                                 )
-                            elif isinstance(event, PartDeltaEvent):
-                                if isinstance(event.delta, TextPartDelta):
-                                    # print( f'[Request] Part {event.index} text delta: {event.delta.content_delta!r}')
-                                    output_messages.append(
+                            if isinstance(event.part, TextPart) and event.part.content:
+                                delegation.output.put_nowait(TextPart(
+                                    content=event.part.content
+                                ))
+                        elif isinstance(event, PartDeltaEvent):
+                            if isinstance(event.delta, TextPartDelta):
+                                # print( f'[Request] Part {event.index} text delta: {event.delta.content_delta!r}')
+                                if trace is not None:
+                                    trace.append(
                                         f'[Request] Part {event.index} text delta: {event.delta.content_delta!r}'
                                     )
-                                    yield TextPart(
-                                        content=event.delta.content_delta
-                                    )
-                                elif isinstance(event.delta, ToolCallPartDelta):
-                                    # print(f'[Request] Part {event.index} args_delta={event.delta.args_delta}')
-                                    output_messages.append(
+                                delegation.output.put_nowait(TextPart(
+                                    content=event.delta.content_delta
+                                ))
+                            elif isinstance(event.delta, ToolCallPartDelta):
+                                # print(f'[Request] Part {event.index} args_delta={event.delta.args_delta}')
+                                if trace is not None:
+                                    trace.append(
                                         f'[Request] Part {event.index} args_delta={event.delta.args_delta}'
                                     )
-                            elif isinstance(event, FinalResultEvent):
-                                # print(f'[Result] The model produced a final output (tool_name={event.tool_name})')
-                                output_messages.append(
+                        elif isinstance(event, FinalResultEvent):
+                            # print(f'[Result] The model produced a final output (tool_name={event.tool_name})')
+                            if trace is not None:
+                                trace.append(
                                     f'[Result] The model produced a final output (tool_name={event.tool_name})'
                                 )
-                elif Agent.is_call_tools_node(node):
-                    # A handle-response node => The model returned some data, potentially calls a tool
-                    output_messages.append(
+            elif Agent.is_call_tools_node(node):
+                # A handle-response node => The model returned some data, potentially calls a tool
+                if trace is not None:
+                    trace.append(
                         '=== CallToolsNode: streaming partial response & tool usage ==='
                     )
-                    async with node.stream(run.ctx) as handle_stream:
-                        async for event in handle_stream:
-                            if isinstance(event, FunctionToolCallEvent):
-                                # print(f'[Tools] The LLM calls tool={event.part.tool_name!r} with args={event.part.args} (tool_call_id={event.part.tool_call_id!r})')
-                                yield ToolCallPart(
-                                    tool_name=event.part.tool_name,
-                                    args=event.part.args,
-                                    tool_call_id=event.part.tool_call_id
-                                )
-                                output_messages.append(
+                tool_calls = [part for part in node.model_response.parts if isinstance(part, ToolCallPart)]
+                if speculative and tool_calls:
+                    # Streaming the node runs the tools, even when left early, so a speculative run ends before it
+                    delegation.output.put_nowait(tool_calls[0])
+                    if trace is not None:
+                        trace.append(f'=== Speculative run stopped before calling {tool_calls[0].tool_name!r} ===')
+                    return
+                async with node.stream(run.ctx) as handle_stream:
+                    async for event in handle_stream:
+                        if isinstance(event, FunctionToolCallEvent):
+                            # print(f'[Tools] The LLM calls tool={event.part.tool_name!r} with args={event.part.args} (tool_call_id={event.part.tool_call_id!r})')
+                            delegation.output.put_nowait(ToolCallPart(
+                                tool_name=event.part.tool_name,
+                                args=event.part.args,
+                                tool_call_id=event.part.tool_call_id
+                            ))
+                            if trace is not None:
+                                trace.append(
                                     f'[Tools] The LLM calls tool={event.part.tool_name!r} with args={event.part.args} (tool_call_id={event.part.tool_call_id!r})'
                                 )
-                            elif isinstance(event, FunctionToolResultEvent):
-                                # print(f'[Tools] Tool call {event.tool_call_id!r} returned => {event.result.content}')
-                                yield ToolReturnPart(
-                                    tool_name=event.result.tool_name,
-                                    content=event.result.content,
-                                    tool_call_id=event.tool_call_id,
-                                    timestamp=event.result.timestamp
-                                )
-                                output_messages.append(
+                        elif isinstance(event, FunctionToolResultEvent):
+                            # print(f'[Tools] Tool call {event.tool_call_id!r} returned => {event.result.content}')
+                            delegation.output.put_nowait(ToolReturnPart(
+                                tool_name=event.result.tool_name,
+                                content=event.result.content,
+                                tool_call_id=event.tool_call_id,
+                                timestamp=event.result.timestamp
+                            ))
+                            if trace is not None:
+                                trace.append(
                                     f'[Tools] Tool call {event.tool_call_id!r} returned => {event.result.content}'
                                 )
-                elif Agent.is_end_node(node):
-                    assert run.result.output == node.data.output
-                    # Once an End node is reached, the agent run is complete
-                    # print( f'=== Final Agent Output: {run.result.output} ===')
-                    output_messages.append(
+
+                if delegation.answered and [call.tool_name for call in tool_calls] == ['knowledge_agent_tool']:
+                    # The knowledge agent's answer went straight to the user, another pass over it would only repeat it.
+                    # With several calls the supervisor still has to tie the answers together
+                    if trace is not None:
+                        trace.append('=== Delegated answer streamed, skipping the final model request ===')
+                    return
+            elif Agent.is_end_node(node):
+                assert run.result.output == node.data.output
+                # Once an End node is reached, the agent run is complete
+                # print( f'=== Final Agent Output: {run.result.output} ===')
+                if trace is not None:
+                    trace.append(
                         f'=== Final Agent Output: {run.result.output} ==='
                     )
 
+
+async def gen(
+        prompt: str,
+        message_history: List[ModelMessage],
+        trace: Optional[List[str]] = None,
+        speculative: bool = False
+) -> AsyncGenerator[Union[ModelRequestPart, ModelResponsePart], None]:
+    """
+    Streams the supervisor's text deltas and tool activity, describing every event in `trace` if one is given.
+    A speculative run, for a prompt the user may not have finished yet, ends at its first tool call
+    without running it, the ToolCallPart is then the last part.
+
+    The run happens in its own task so that the knowledge agent can stream its answer
+    into the same output while the supervisor is still waiting on the tool call.
+    """
+    delegation = DelegatedOutput(asyncio.Queue())
+    done = object()
+
+    async def run():
+        delegated_output.set(delegation)
+        try:
+            await supervise(prompt, message_history, trace, delegation, speculative)
+        finally:
+            delegation.output.put_nowait(done)
+
+    task = asyncio.create_task(run())
+    try:
+        while (part := await delegation.output.get()) is not done:
+            yield part
+        # Surfaces an exception raised by the agent run
+        await task
+    finally:
+        task.cancel()
+
+
+async def warm_up(message_history: List[ModelMessage], max_tokens: int = 1):
+    """
+    Sends a throwaway request with the supervisor's instructions, tools and the given history,
+    so that a backend with prefix caching already holds them when the real prompt arrives.
+    """
+    try:
+        await supervisor_agent.run(
+            ' ',
+            message_history=message_history,
+            model_settings={'max_tokens': max_tokens},
+            usage_limits=UsageLimits(request_limit=1)
+        )
+    except AgentRunError as e:
+        # A truncated reply or tool call is expected, only the prefill matters
+        logfire.debug(f'Warm-up run ended with {e}')
+
+
 async def main(prompt):
-    with logfire.span('Standalone assistant test run'):
-        async for token in gen(prompt, []):
-            print(token)
+    await mcp_connections.start()
+    try:
+        with logfire.span('Standalone assistant test run'):
+            async for token in gen(prompt, []):
+                print(token)
+    finally:
+        await mcp_connections.stop()
 
 
 
@@ -0,0 +1,80 @@
+"""
+Time until the user hears the first word of an answer from the knowledge agent, with the
+supervisor blocking on the sub-agent and answering again over its result as it used to, and with
+the sub-agent's answer streamed straight through. Run from the assistant directory:
+
+    python -m benchmarks.knowledge_delegation [--first-token-ms 400] [--tokens-per-s 40] [--answer-tokens 60]
+
+Both models are stand-ins with the given time to first token and decoding rate, every question
+is new so the knowledge cache does not answer it.
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault('OPENAI_MODEL', 'benchmark')
+os.environ.setdefault('OPENAI_API_URL', 'http://127.0.0.1:1/v1')
+os.environ.setdefault('TAVILY_API_TOKEN', 'benchmark')
+os.environ.setdefault('LOGFIRE_TOKEN', '')
+
+from pydantic_ai.messages import ModelMessage, ModelResponse, ToolReturnPart, TextPart
+from pydantic_ai.models.function import AgentInfo, DeltaToolCall, FunctionModel
+
+import agents
+from settings import config
+
+
+def stand_in_model(first_token_s: float, token_s: float, answer_tokens: int, delegate: bool):
+    async def stream(messages: list[ModelMessage], info: AgentInfo):
+        await asyncio.sleep(first_token_s)
+        last = messages[-1].parts[-1]
+        if delegate and not isinstance(last, ToolReturnPart):
+            yield {0: DeltaToolCall('knowledge_agent_tool', f'{{"question": "{last.content}"}}')}
+            return
+
+        for i in range(answer_tokens):
+            yield f' word{i}'
+            await asyncio.sleep(token_s)
+
+    async def respond(messages: list[ModelMessage], info: AgentInfo):
+        # The blocking knowledge agent run
+        await asyncio.sleep(first_token_s + token_s * answer_tokens)
+        return ModelResponse(parts=[TextPart(' '.join(f'word{i}' for i in range(answer_tokens)))])
+
+    return FunctionModel(respond, stream_function=stream)
+
+
+async def ask(question: str) -> tuple[float, float]:
+    start = time.perf_counter()
+    first = None
+    async for part in agents.gen(question, []):
+        if first is None and isinstance(part, TextPart) and part.content.strip():
+            first = time.perf_counter() - start
+    return first * 1000, (time.perf_counter() - start) * 1000
+
+
+async def main(first_token_ms: float, tokens_per_s: float, answer_tokens: int, questions: int):
+    first_token_s, token_s = first_token_ms / 1000, 1 / tokens_per_s
+    supervisor = stand_in_model(first_token_s, token_s, answer_tokens, delegate=True)
+    knowledge = stand_in_model(first_token_s, token_s, answer_tokens, delegate=False)
+
+    print(f'{"delegation":<12} {"first word ms":>14} {"complete ms":>12}')
+    with agents.supervisor_agent.override(model=supervisor), agents.knowledge_agent.override(model=knowledge):
+        for mode in ('blocking', 'streaming'):
+            config.KNOWLEDGE_DELEGATION = mode
+            timings = [await ask(f'{mode} question {i}') for i in range(questions)]
+            first = sum(t[0] for t in timings) / questions
+            complete = sum(t[1] for t in timings) / questions
+            print(f'{mode:<12} {first:>14.0f} {complete:>12.0f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--first-token-ms', type=float, default=400)
+    parser.add_argument('--tokens-per-s', type=float, default=40)
+    parser.add_argument('--answer-tokens', type=int, default=60)
+    parser.add_argument('--questions', type=int, default=3)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.first_token_ms, args.tokens_per_s, args.answer_tokens, args.questions))
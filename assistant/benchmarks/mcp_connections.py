@@ -0,0 +1,112 @@
+"""
+Per-turn cost of the MCP tool server, opened for every turn as the assistant used to do and
+kept open with a cached tool list, against a local stub. Run from the assistant directory:
+
+    python -m benchmarks.mcp_connections [--latency-ms 50] [--turns 20]
+
+Every turn is an agent run with a test model that calls the MCP tools and then answers, so the
+tool list is fetched before both model requests and the tool is really called. Afterwards the
+stub is restarted to check that the persistent connection recovers.
+"""
+import argparse
+import asyncio
+import time
+
+from pydantic_ai import Agent
+from pydantic_ai.mcp import MCPServerStreamableHTTP
+from pydantic_ai.models.test import TestModel
+
+from benchmarks.stub_mcp import create_server
+from mcp_connections import PersistentMCPServer, MCPConnections
+
+HOST = '127.0.0.1'
+PORT = 8090
+URL = f'http://{HOST}:{PORT}/mcp'
+
+
+def create_agent(server) -> Agent:
+    return Agent(TestModel(call_tools='all'), mcp_servers=[server])
+
+
+async def per_turn_connections(turns: int) -> float:
+    agent = create_agent(MCPServerStreamableHTTP(url=URL))
+    start = time.perf_counter()
+    for _ in range(turns):
+        async with agent.run_mcp_servers():
+            await agent.run('Turn on the lights')
+    return (time.perf_counter() - start) / turns
+
+
+async def persistent_connection(turns: int) -> float:
+    server = PersistentMCPServer(url=URL)
+    connections = MCPConnections([server], tools_refresh_s=60)
+    await connections.start()
+
+    agent = create_agent(server)
+    start = time.perf_counter()
+    for _ in range(turns):
+        result = await agent.run('Turn on the lights')
+    elapsed = (time.perf_counter() - start) / turns
+
+    await connections.stop()
+    assert 'lights' in result.output, result.output
+    return elapsed
+
+
+async def reconnect(latency_ms: float) -> bool:
+    stub = create_server(HOST, PORT, latency_ms)
+    stub_task = asyncio.create_task(stub.serve())
+    await asyncio.sleep(0.5)
+
+    server = PersistentMCPServer(url=URL)
+    connections = MCPConnections([server], tools_refresh_s=0.2)
+    await connections.start()
+    agent = create_agent(server)
+
+    stub.should_exit = True
+    await stub_task
+    # The keep-alive refresh notices within its timeout
+    for _ in range(100):
+        if not server.connected:
+            break
+        await asyncio.sleep(0.1)
+    # Without the server the turn still goes through, just without its tools
+    offline = await agent.run('Turn on the lights')
+
+    stub = create_server(HOST, PORT, latency_ms)
+    stub_task = asyncio.create_task(stub.serve())
+    for _ in range(100):
+        if server.connected:
+            break
+        await asyncio.sleep(0.1)
+    online = await agent.run('Turn on the lights')
+
+    await connections.stop()
+    stub.should_exit = True
+    await stub_task
+    return 'lights' not in offline.output and 'lights' in online.output
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--turns', type=int, default=20)
+    args = parser.parse_args()
+
+    stub = create_server(HOST, PORT, args.latency_ms)
+    stub_task = asyncio.create_task(stub.serve())
+    await asyncio.sleep(0.5)
+
+    before = await per_turn_connections(args.turns)
+    after = await persistent_connection(args.turns)
+    print(f'connection per turn: {before * 1000:7.1f}ms per turn')
+    print(f'persistent, cached:  {after * 1000:7.1f}ms per turn')
+
+    stub.should_exit = True
+    await stub_task
+
+    print(f'recovers after a tool server restart: {await reconnect(args.latency_ms)}')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
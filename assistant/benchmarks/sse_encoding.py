@@ -0,0 +1,84 @@
+"""
+Tokens per second of CPU the assistant can relay as SSE, with the completion chunks built as
+pydantic models per token as it used to, and with the template encoder, with and without batching.
+Run from the assistant directory:
+
+    python -m benchmarks.sse_encoding [--tokens 20000] [--tokens-per-s 0] [--window-ms 10]
+
+The agent is replaced by a generator of text parts. With `--tokens-per-s 0` it yields as fast as
+the loop allows, otherwise it paces the tokens like a model decoding at that rate.
+"""
+import argparse
+import asyncio
+import datetime
+import time
+
+from openai.types.chat.chat_completion_chunk import ChatCompletionChunk, Choice as ChunkChoice, ChoiceDelta
+from pydantic_ai.messages import TextPart
+
+from sse import CompletionChunkEncoder, batch_deltas, text_deltas
+
+
+async def fake_gen(tokens: int, tokens_per_s: float):
+    for i in range(tokens):
+        if tokens_per_s:
+            await asyncio.sleep(1 / tokens_per_s)
+        elif i % 64 == 0:
+            await asyncio.sleep(0)
+        yield TextPart(content=f' word{i % 100}')
+
+
+def pydantic_chunk(content: str, finish_reason=None) -> str:
+    chunk = ChatCompletionChunk(
+        id="chatcmpl-4247",
+        choices=[ChunkChoice(delta=ChoiceDelta(content=content, role='assistant'), index=0, finish_reason=finish_reason)],
+        created=int(datetime.datetime.now().timestamp()),
+        model='default',
+        object='chat.completion.chunk'
+    )
+    return f"data: {chunk.model_dump_json()}\n\n"
+
+
+async def relay_pydantic(tokens: int, tokens_per_s: float, window_s: float):
+    async for content in text_deltas(fake_gen(tokens, tokens_per_s)):
+        yield pydantic_chunk(content)
+    yield pydantic_chunk(' ', 'stop')
+
+
+async def relay_template(tokens: int, tokens_per_s: float, window_s: float):
+    encoder = CompletionChunkEncoder()
+    async for content in batch_deltas(text_deltas(fake_gen(tokens, tokens_per_s)), window_s):
+        yield encoder.encode(content)
+    yield encoder.encode(' ', finish_reason='stop')
+
+
+async def measure(relay, tokens: int, tokens_per_s: float, window_s: float):
+    frames, size = 0, 0
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    async for frame in relay(tokens, tokens_per_s, window_s):
+        frames += 1
+        size += len(frame)
+    cpu = time.process_time() - cpu_start
+    return tokens / cpu, frames, size, time.perf_counter() - start
+
+
+async def main(tokens: int, tokens_per_s: float, window_ms: float):
+    print(f'{"encoder":<24} {"tokens/cpu-s":>14} {"frames":>8} {"bytes":>10} {"wall s":>8}')
+    for name, relay, window_s in (
+            ('pydantic models', relay_pydantic, 0),
+            ('template', relay_template, 0),
+            (f'template, {window_ms:g}ms batches', relay_template, window_ms / 1000),
+    ):
+        rate, frames, size, wall = await measure(relay, tokens, tokens_per_s, window_s)
+        print(f'{name:<24} {rate:>14.0f} {frames:>8} {size:>10} {wall:>8.2f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tokens', type=int, default=20000)
+    parser.add_argument('--tokens-per-s', type=float, default=0)
+    parser.add_argument('--window-ms', type=float, default=10)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.tokens, args.tokens_per_s, args.window_ms))
@@ -0,0 +1,56 @@
+"""
+A stand-in MCP server with a couple of home automation tools, for exercising the assistant's
+MCP connections without the real tool server. Run from the assistant directory:
+
+    python -m benchmarks.stub_mcp [--port 8090] [--latency-ms 50]
+
+It speaks streamable HTTP on `/mcp`, point the assistant at it with
+`MCP_SERVER_URL=http://127.0.0.1:8090/mcp`. `--latency-ms` delays every HTTP request
+to simulate the network hop to the tool server.
+"""
+import argparse
+import asyncio
+
+import uvicorn
+from mcp.server.fastmcp import FastMCP
+
+
+def create_app(latency_ms: float):
+    mcp = FastMCP('stub', log_level='WARNING')
+
+    @mcp.tool()
+    def turn_on_lights(room: str) -> str:
+        """Turns on the lights in a room."""
+        return f'The lights in the {room} are on'
+
+    @mcp.tool()
+    def get_temperature(room: str) -> str:
+        """Reads the temperature in a room."""
+        return f'It is twenty one degrees in the {room}'
+
+    app = mcp.streamable_http_app()
+
+    async def delayed(scope, receive, send):
+        if scope['type'] == 'http':
+            await asyncio.sleep(latency_ms / 1000)
+        await app(scope, receive, send)
+
+    return delayed
+
+
+def create_server(host: str, port: int, latency_ms: float) -> uvicorn.Server:
+    return uvicorn.Server(uvicorn.Config(create_app(latency_ms), host=host, port=port, log_level='warning'))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--latency-ms', type=float, default=50)
+    args = parser.parse_args()
+
+    asyncio.run(create_server(args.host, args.port, args.latency_ms).serve())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Latency of repeated knowledge questions with the tool result cache, against a knowledge agent
+whose model and web search are local stand-ins with a fixed latency. Run from the assistant directory:
+
+    python -m benchmarks.tool_cache [--model-latency-ms 800] [--search-latency-ms 600] [--questions 10]
+
+Each question is asked twice in a row, then once more rephrased (punctuation and case), which
+the normalized key catches without an embedding model.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+os.environ.setdefault('OPENAI_MODEL', 'benchmark')
+os.environ.setdefault('OPENAI_API_URL', 'http://127.0.0.1:1/v1')
+os.environ.setdefault('TAVILY_API_TOKEN', 'benchmark')
+os.environ.setdefault('LOGFIRE_TOKEN', '')
+os.environ.setdefault('SEARCH_BACKEND', 'local')
+
+from pydantic_ai.messages import ModelMessage, ModelResponse, TextPart, ToolCallPart, ToolReturnPart
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+import agents
+from search import LocalSearchBackend
+
+DOCUMENTS = [
+    {'title': f'Fact {i}', 'url': f'https://example.com/{i}', 'content': f'Topic {i} is described here in detail.'}
+    for i in range(100)
+]
+
+
+def slow_model(latency_s: float):
+    async def respond(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        await asyncio.sleep(latency_s)
+        last = messages[-1].parts[-1]
+        if isinstance(last, ToolReturnPart):
+            return ModelResponse(parts=[TextPart(f'According to the search: {last.content[0]["content"]}')])
+        return ModelResponse(parts=[ToolCallPart('web_search_tool', {'query': last.content})])
+
+    return FunctionModel(respond)
+
+
+async def ask(question: str) -> float:
+    start = time.perf_counter()
+    await agents.knowledge_agent_tool(None, question)
+    return (time.perf_counter() - start) * 1000
+
+
+async def main(model_latency_ms: float, search_latency_ms: float, questions: int):
+    agents.search_backend = LocalSearchBackend(DOCUMENTS, search_latency_ms / 1000)
+
+    first, repeated, rephrased = [], [], []
+    with agents.knowledge_agent.override(model=slow_model(model_latency_ms / 1000)):
+        for i in range(questions):
+            first.append(await ask(f'What is topic {i}?'))
+            repeated.append(await ask(f'What is topic {i}?'))
+            rephrased.append(await ask(f'what is TOPIC {i}'))
+
+        concurrent_start = time.perf_counter()
+        await asyncio.gather(*(ask(f'Tell me about topic {questions}') for _ in range(5)))
+        concurrent = (time.perf_counter() - concurrent_start) * 1000
+
+    print(f'{"question":<12} {"median ms":>10} {"max ms":>10}')
+    for name, timings in (('first', first), ('repeated', repeated), ('rephrased', rephrased)):
+        print(f'{name:<12} {statistics.median(timings):>10.2f} {max(timings):>10.2f}')
+    print(f'5 concurrent identical questions took {concurrent:.0f}ms')
+    print(f'Knowledge cache: {agents.knowledge_cache.metrics()}')
+    print(f'Search cache: {agents.search_cache.metrics()}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model-latency-ms', type=float, default=800)
+    parser.add_argument('--search-latency-ms', type=float, default=600)
+    parser.add_argument('--questions', type=int, default=10)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.model_latency_ms, args.search_latency_ms, args.questions))
@@ -0,0 +1,117 @@
+import asyncio
+import random
+from dataclasses import dataclass, field
+from typing import Any, List, Optional
+
+import logfire
+from mcp.shared.exceptions import McpError
+from pydantic_ai.exceptions import ModelRetry
+from pydantic_ai.mcp import MCPServerStreamableHTTP
+from pydantic_ai.tools import ToolDefinition
+
+RECONNECT_BACKOFF_INITIAL_S = 0.5
+RECONNECT_BACKOFF_MAX_S = 30.0
+TOOLS_REFRESH_TIMEOUT_S = 5.0
+
+
+@dataclass
+class PersistentMCPServer(MCPServerStreamableHTTP):
+    """
+    Streamable HTTP MCP server whose session is kept open by `MCPConnections` and whose tool
+    list is served from a cache.
+
+    pydantic-ai lists the tools of every MCP server before each model request and again for
+    every tool call, with the cache none of that goes over the network. While the connection
+    is down, agent runs go ahead without the server's tools.
+    """
+    tools: Optional[List[ToolDefinition]] = field(default=None, init=False, repr=False)
+    connected: bool = field(default=False, init=False, repr=False)
+    # Set by a failed call, tells the task holding the session to reconnect right away
+    lost: asyncio.Event = field(default_factory=asyncio.Event, init=False, repr=False)
+
+    # Overrides an attribute of the pinned pydantic-ai 0.2.18, recheck it when upgrading: its agent graph
+    # raises a UserError for every request while an MCP server's `is_running` is False, this lets runs go
+    # ahead without the tools instead. `__aenter__`/`__aexit__` still assign it, the setter tracks that.
+    @property
+    def is_running(self) -> bool:
+        return True
+
+    @is_running.setter
+    def is_running(self, value: bool):
+        self.connected = value
+
+    async def list_tools(self) -> List[ToolDefinition]:
+        if not self.connected:
+            return []
+        if self.tools is None:
+            await self.refresh_tools()
+        return self.tools
+
+    async def refresh_tools(self):
+        self.tools = await super().list_tools()
+
+    async def call_tool(self, tool_name: str, arguments: dict[str, Any]):
+        if not self.connected:
+            raise ModelRetry(f'The tool server for {tool_name} is unreachable right now')
+
+        try:
+            return await super().call_tool(tool_name, arguments)
+        except (ModelRetry, McpError):
+            # The tool itself failed, the session is fine
+            raise
+        except Exception as e:
+            logfire.warning(f'MCP call of {tool_name} failed: {e!r}')
+            self.connected = False
+            self.lost.set()
+            raise ModelRetry(f'The tool server for {tool_name} is unreachable right now')
+
+
+class MCPConnections:
+    """Keeps a session to every MCP server open for the lifetime of the app, reconnecting with backoff."""
+    def __init__(self, servers: List[PersistentMCPServer], tools_refresh_s: float):
+        self.servers = servers
+        self.tools_refresh_s = tools_refresh_s
+        self.tasks: List[asyncio.Task] = []
+
+    async def start(self, connect_timeout_s: float = 5.0):
+        """Starts the connections and waits a moment for them, so that the first turn already has the tools."""
+        self.tasks = [asyncio.create_task(self.maintain(server)) for server in self.servers]
+
+        deadline = asyncio.get_running_loop().time() + connect_timeout_s
+        while not all(server.connected for server in self.servers) and asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(0.05)
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    async def maintain(self, server: PersistentMCPServer):
+        # The session is entered and exited by this one task, the MCP client's task groups require that
+        backoff = RECONNECT_BACKOFF_INITIAL_S
+        while True:
+            try:
+                server.lost.clear()
+                async with server:
+                    try:
+                        await asyncio.wait_for(server.refresh_tools(), TOOLS_REFRESH_TIMEOUT_S)
+                        logfire.info(f'Connected to MCP server {server.url} with {len(server.tools)} tools')
+                        backoff = RECONNECT_BACKOFF_INITIAL_S
+
+                        while not server.lost.is_set():
+                            try:
+                                await asyncio.wait_for(server.lost.wait(), self.tools_refresh_s)
+                            except asyncio.TimeoutError:
+                                # Doubles as the keep-alive, a failing refresh means the session is gone
+                                await asyncio.wait_for(server.refresh_tools(), TOOLS_REFRESH_TIMEOUT_S)
+                        raise ConnectionError('A tool call failed')
+                    finally:
+                        # Closing the session can take a while against a dead server, runs stop using it right away
+                        server.connected = False
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                delay = backoff * (1 + random.random())
+                logfire.warning(f'MCP server {server.url} unavailable: {e!r}, reconnecting in {delay:.1f}s')
+                await asyncio.sleep(delay)
+                backoff = min(backoff * 2, RECONNECT_BACKOFF_MAX_S)
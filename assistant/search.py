@@ -0,0 +1,77 @@
+import asyncio
+import json
+import re
+from typing import List, Optional
+
+import httpx
+from pydantic_ai.common_tools.tavily import TavilySearchResult, tavily_search_ta
+
+from settings import config
+
+TAVILY_API_URL = 'https://api.tavily.com'
+SEARCH_TIMEOUT_S = 30.0
+LOCAL_SEARCH_MAX_RESULTS = 5
+
+
+class SearchBackend:
+    async def search(self, query: str) -> List[TavilySearchResult]:
+        raise NotImplementedError
+
+    async def aclose(self):
+        pass
+
+
+class TavilySearchBackend(SearchBackend):
+    """Tavily search over one pooled client, `AsyncTavilyClient` sets up a new connection for every query."""
+    def __init__(self, api_key: str):
+        self.client = httpx.AsyncClient(
+            base_url=TAVILY_API_URL,
+            headers={'Authorization': f'Bearer {api_key}'},
+            timeout=SEARCH_TIMEOUT_S
+        )
+
+    async def search(self, query: str) -> List[TavilySearchResult]:
+        resp = await self.client.post('/search', json={'query': query, 'search_depth': 'basic', 'topic': 'general'})
+        resp.raise_for_status()
+        return tavily_search_ta.validate_python(resp.json()['results'])
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+class LocalSearchBackend(SearchBackend):
+    """
+    Stand-in that ranks a fixed set of documents by the words they share with the query,
+    for running the assistant and its benchmarks without a search API.
+    """
+    def __init__(self, documents: List[dict], latency_s: float = 0.0):
+        self.documents = documents
+        self.latency_s = latency_s
+
+    @classmethod
+    def from_file(cls, path: Optional[str]) -> 'LocalSearchBackend':
+        if path is None:
+            return cls([])
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    async def search(self, query: str) -> List[TavilySearchResult]:
+        await asyncio.sleep(self.latency_s)
+
+        terms = set(re.findall(r'\w+', query.lower()))
+        results = []
+        for document in self.documents:
+            words = set(re.findall(r'\w+', f'{document["title"]} {document["content"]}'.lower()))
+            score = len(terms & words) / len(terms) if terms else 0.0
+            if score > 0:
+                results.append(TavilySearchResult(
+                    title=document['title'], url=document.get('url', ''), content=document['content'], score=score
+                ))
+
+        return sorted(results, key=lambda result: result['score'], reverse=True)[:LOCAL_SEARCH_MAX_RESULTS]
+
+
+def create_search_backend() -> SearchBackend:
+    if config.SEARCH_BACKEND == 'local':
+        return LocalSearchBackend.from_file(config.LOCAL_SEARCH_DOCUMENTS)
+    return TavilySearchBackend(config.TAVILY_API_TOKEN)
@@ -1,20 +1,36 @@
 import datetime
-from typing import List
+from contextlib import asynccontextmanager
+from typing import List, Optional
 
 import logfire
 from fastapi import FastAPI
-from openai.types.chat.chat_completion_chunk import ChatCompletionChunk, Choice as ChunkChoice, ChoiceDelta
+from openai.types.chat import ChatCompletion, ChatCompletionMessage
+from openai.types.chat.chat_completion import Choice
 from pydantic import BaseModel
-from pydantic_ai.messages import ModelRequest, UserPromptPart, ModelResponse, TextPart
+from pydantic_ai.messages import ModelRequest, UserPromptPart, ModelResponse, TextPart, SystemPromptPart, ToolCallPart
 from starlette.middleware.cors import CORSMiddleware
 from starlette.responses import StreamingResponse
 
-from agents import gen
+from agents import gen, warm_up, mcp_connections, search_backend, search_cache, knowledge_cache, \
+    tool_cache_embedder
+from settings import config
+from sse import CompletionChunkEncoder, batch_deltas, text_deltas
 
 logfire.configure(send_to_logfire="if-token-present")
 logfire.instrument_openai()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    # MCP sessions stay open between turns instead of being set up for every request
+    await mcp_connections.start()
+    yield
+    await mcp_connections.stop()
+    await search_backend.aclose()
+    if tool_cache_embedder:
+        await tool_cache_embedder.aclose()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -30,6 +46,11 @@ async def health():
     return {'status': 'healthy'}
 
 
+@app.get('/metrics/tool-cache')
+async def tool_cache_metrics():
+    return {'search': search_cache.metrics(), 'knowledge': knowledge_cache.metrics()}
+
+
 class CompletionRequest(BaseModel):
     class Message(BaseModel):
         role: str
@@ -38,45 +59,63 @@ class CompletionRequest(BaseModel):
     messages: List[Message]
     model: str
     stream: bool = False
+    max_tokens: Optional[int] = None
+    # Sent by the voice server for prompts that are not final yet, no tools are run for those
+    speculative: bool = False
 
 
-def construct_completion_chunk(content):
-    return ChatCompletionChunk(
-        id="chatcmpl-4247",
-        choices=[ChunkChoice(
-            delta=ChoiceDelta(
-                content=content,
-                role='assistant'
-            ),
-            index=0
-        )],
-        created=int(datetime.datetime.now().timestamp()),
-        model='default',
-        object='chat.completion.chunk'
-    )
+def to_model_message(msg: CompletionRequest.Message):
+    if msg.role == 'user':
+        return ModelRequest(parts=[UserPromptPart(content=msg.content)])
+    if msg.role == 'system':
+        return ModelRequest(parts=[SystemPromptPart(content=msg.content)])
+    return ModelResponse(parts=[TextPart(content=msg.content)])
 
 
 @app.post('/v1/chat/completions')
 async def chat(request: CompletionRequest):
-    message_history = [
-        ModelRequest(parts=[UserPromptPart(content=msg.content)])
-        if msg.role == 'user' else
-        ModelResponse(parts=[TextPart(content=msg.content)])
-        for msg in request.messages[:-1]
-    ]
+    if request.max_tokens is not None and not request.stream:
+        # Prefix cache warm-up, every message is history and the completion itself is thrown away
+        with logfire.span('Warm-up of {count=} messages', count=len(request.messages)):
+            await warm_up([to_model_message(msg) for msg in request.messages], request.max_tokens)
+
+        return ChatCompletion(
+            id="chatcmpl-4247",
+            choices=[Choice(
+                finish_reason='length',
+                index=0,
+                message=ChatCompletionMessage(role='assistant', content='')
+            )],
+            created=int(datetime.datetime.now().timestamp()),
+            model='default',
+            object='chat.completion'
+        )
+
+    message_history = [to_model_message(msg) for msg in request.messages[:-1]]
 
     prompt = request.messages[-1].content
 
     async def chunk_generator():
+        encoder = CompletionChunkEncoder()
+        trace = [] if config.TRACE_AGENT_EVENTS else None
+        deferred_tool_call = False
+
+        async def parts():
+            nonlocal deferred_tool_call
+            async for part in gen(prompt, message_history, trace, request.speculative):
+                if request.speculative and isinstance(part, ToolCallPart):
+                    deferred_tool_call = True
+                yield part
+
         with logfire.span('User request {msg=} at {ts=}', msg=prompt, ts=datetime.datetime.now()):
-            async for token in gen(prompt, message_history):
-                completion_chunk = construct_completion_chunk(token)
-                yield f"data: {completion_chunk.model_dump_json()}\n\n"
+            async for content in batch_deltas(text_deltas(parts()), config.SSE_BATCH_WINDOW_S):
+                yield encoder.encode(content)
 
-        completion_chunk = construct_completion_chunk(' ')
-        completion_chunk.choices[0].finish_reason = 'stop'
+            if trace is not None:
+                logfire.debug('Agent events', events=trace)
 
-        yield f"data: {completion_chunk.model_dump_json()}\n\n"
+        # Tells the voice server to ask again once the prompt is final
+        yield encoder.encode(' ', finish_reason='tool_calls' if deferred_tool_call else 'stop')
 
 
     return StreamingResponse(
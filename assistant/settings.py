@@ -1,3 +1,5 @@
+from typing import Literal, Optional
+
 from pydantic_settings import BaseSettings
 
 
@@ -9,6 +11,23 @@ class Config(BaseSettings):
 
     LOGFIRE_TOKEN: str
 
+    MCP_SERVER_URL: str = 'http://192.168.1.87:8080/mcp/'
+    MCP_TOOLS_REFRESH_S: float = 60.0
+
+    SEARCH_BACKEND: Literal['tavily', 'local'] = 'tavily'
+    LOCAL_SEARCH_DOCUMENTS: Optional[str] = None
+
+    TOOL_CACHE_TTL_S: float = 600.0
+    TOOL_CACHE_MAX_ENTRIES: int = 256
+    TOOL_CACHE_EMBEDDING_MODEL: Optional[str] = None
+    TOOL_CACHE_EMBEDDING_API_URL: Optional[str] = None
+    TOOL_CACHE_SIMILARITY: float = 0.92
+
+    KNOWLEDGE_DELEGATION: Literal['streaming', 'blocking'] = 'streaming'
+
+    SSE_BATCH_WINDOW_S: float = 0.01
+    TRACE_AGENT_EVENTS: bool = False
+
     class Config:
         case_sensitive = True
         env_file = ".env"
@@ -0,0 +1,84 @@
+import asyncio
+import json
+import time
+from typing import AsyncGenerator, AsyncIterator, Optional, Union
+
+from pydantic_ai.messages import ModelRequestPart, ModelResponsePart, TextPart
+
+COMPLETION_ID = 'chatcmpl-4247'
+
+
+class CompletionChunkEncoder:
+    """
+    Serializes chat completion chunks by filling a template, byte for byte what
+    `ChatCompletionChunk.model_dump_json()` produces, without building the pydantic models per token.
+    """
+    def __init__(self, created: Optional[int] = None):
+        created = int(time.time()) if created is None else created
+        self.prefix = f'data: {{"id":"{COMPLETION_ID}","choices":[{{"delta":{{"content":'
+        self.suffix = f',"function_call":null,"refusal":null,"role":"assistant","tool_calls":null}},"finish_reason":'
+        self.tail = f',"index":0,"logprobs":null}}],"created":{created},"model":"default","object":"chat.completion.chunk","service_tier":null,"system_fingerprint":null,"usage":null}}\n\n'
+
+    def encode(self, content: str, finish_reason: Optional[str] = None) -> str:
+        return ''.join((
+            self.prefix,
+            json.dumps(content, ensure_ascii=False),
+            self.suffix,
+            'null' if finish_reason is None else f'"{finish_reason}"',
+            self.tail
+        ))
+
+
+async def text_deltas(parts: AsyncIterator[Union[ModelRequestPart, ModelResponsePart]]) -> AsyncGenerator[str, None]:
+    # Tool calls and returns are not part of the spoken answer
+    async for part in parts:
+        if isinstance(part, TextPart) and part.content:
+            yield part.content
+
+
+async def batch_deltas(deltas: AsyncIterator[str], window_s: float) -> AsyncGenerator[str, None]:
+    """
+    Joins the deltas that arrive within `window_s` of the first one of a batch,
+    so a fast model costs one SSE frame per window instead of one per token.
+    """
+    if window_s <= 0:
+        async for delta in deltas:
+            yield delta
+        return
+
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+
+    async def read():
+        try:
+            async for delta in deltas:
+                queue.put_nowait(delta)
+        finally:
+            queue.put_nowait(done)
+
+    reader = asyncio.create_task(read())
+    try:
+        finished = False
+        while not finished:
+            delta = await queue.get()
+            if delta is done:
+                break
+
+            # One timer per batch rather than a timeout per delta, which would cost more than the frames saved
+            if not reader.done():
+                await asyncio.sleep(window_s)
+
+            batch = [delta]
+            while not queue.empty():
+                delta = queue.get_nowait()
+                if delta is done:
+                    finished = True
+                    break
+                batch.append(delta)
+
+            yield ''.join(batch)
+
+        # Surfaces an exception raised by the agent run
+        await reader
+    finally:
+        reader.cancel()
@@ -0,0 +1,154 @@
+import asyncio
+import math
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import logfire
+from openai import AsyncOpenAI
+
+
+# Given to the waiters when the caller computing a result was cancelled, they compute it themselves
+ABANDONED = object()
+
+
+def normalize_query(query: str) -> str:
+    return ' '.join(re.sub(r'[^\w\s]', ' ', query.lower()).split())
+
+
+class Embedder:
+    """Unit-length embeddings from an OpenAI spec API, None when the API is unavailable."""
+    def __init__(self, api_url: str, model: str):
+        self.client = AsyncOpenAI(api_key='none', base_url=api_url)
+        self.model = model
+
+    async def embed(self, text: str) -> Optional[List[float]]:
+        try:
+            response = await self.client.embeddings.create(model=self.model, input=text)
+        except Exception as e:
+            logfire.warning(f'Could not embed query for the tool cache: {e}')
+            return None
+
+        vector = response.data[0].embedding
+        norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+        return [x / norm for x in vector]
+
+    async def aclose(self):
+        await self.client.close()
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    expires_at: float
+    embedding: Optional[List[float]] = None
+
+
+class ToolResultCache:
+    """
+    Results of expensive tool calls keyed by normalized query, bounded by age and entry count.
+
+    With an embedder, a query that misses the exact key is also matched against the embeddings of
+    the cached queries, so a rephrased question can reuse an answer. Concurrent calls for the same
+    query share a single computation, if its caller is cancelled one of the others starts it over.
+    """
+    def __init__(
+            self,
+            name: str,
+            ttl_s: float,
+            max_entries: int,
+            embedder: Optional[Embedder] = None,
+            similarity: float = 0.92
+    ):
+        self.name = name
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.embedder = embedder
+        self.similarity = similarity
+
+        self.entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self.pending: Dict[str, asyncio.Future] = {}
+
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at < time.monotonic():
+            del self.entries[key]
+            return None
+
+        self.entries.move_to_end(key)
+        return entry
+
+    def find_similar(self, embedding: List[float]) -> Optional[CacheEntry]:
+        now = time.monotonic()
+        best, best_similarity = None, self.similarity
+        for entry in self.entries.values():
+            if entry.embedding is None or entry.expires_at < now:
+                continue
+            similarity = sum(a * b for a, b in zip(embedding, entry.embedding))
+            if similarity >= best_similarity:
+                best, best_similarity = entry, similarity
+        return best
+
+    def put(self, key: str, value: Any, embedding: Optional[List[float]] = None):
+        self.entries[key] = CacheEntry(value, time.monotonic() + self.ttl_s, embedding)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    async def get_or_compute(self, query: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        key = normalize_query(query)
+
+        entry = self.get(key)
+        if entry is not None:
+            self.hits += 1
+            return entry.value
+
+        if key in self.pending:
+            value = await asyncio.shield(self.pending[key])
+            if value is ABANDONED:
+                return await self.get_or_compute(query, compute)
+            self.hits += 1
+            return value
+
+        future = asyncio.get_running_loop().create_future()
+        self.pending[key] = future
+        try:
+            embedding = await self.embedder.embed(key) if self.embedder else None
+            if embedding is not None and (similar := self.find_similar(embedding)) is not None:
+                self.similar_hits += 1
+                logfire.debug(f'{self.name} cache: "{query}" matched a similar query')
+                value = similar.value
+            else:
+                self.misses += 1
+                value = await compute()
+                self.put(key, value, embedding)
+
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            # A barge-in or disconnect of this caller must not cancel the others waiting for the same query
+            future.set_result(ABANDONED)
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters get the exception, nobody has to retrieve it otherwise
+            future.exception()
+            raise
+        finally:
+            del self.pending[key]
+
+    def metrics(self):
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'similar_hits': self.similar_hits,
+            'misses': self.misses
+        }
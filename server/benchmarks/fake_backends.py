@@ -0,0 +1,165 @@
+"""
+Stand-ins for the LLM and TTS backends with configurable latency and throughput, for load tests
+without GPUs. Run from the server directory:
+
+    python -m benchmarks.fake_backends [--port 9100] [--whisper-port 9090] [--llm-first-token-ms 300] ...
+
+A single HTTP app serves the OpenAI spec streaming `/v1/chat/completions` and the Kokoro
+(`/v1/audio/speech`), Orpheus (`/v1/audio/speech/stream`) and Chatterbox (`/v1/audio/speech/upload`)
+speech endpoints, the fake Whisper websocket runs next to it. Point the server at them with
+
+    ASSISTANT_API_URL=http://127.0.0.1:9100/v1 KOKORO_API_URL=http://127.0.0.1:9100
+    ORPHEUS_API_URL=http://127.0.0.1:9100 CHATTERBOX_API_URL=http://127.0.0.1:9100
+    WHISPER_API_URL=127.0.0.1:9090
+"""
+import argparse
+import asyncio
+import io
+import json
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import scipy.io.wavfile as wav
+import uvicorn
+from fastapi import FastAPI
+from starlette.requests import Request
+from starlette.responses import StreamingResponse, Response
+
+from benchmarks.fake_whisper import run_server as run_whisper_server
+
+TTS_SAMPLE_RATE = 24000
+TTS_CHUNK_SAMPLES = 2000
+SPEECH_SECONDS_PER_CHAR = 0.06
+
+REPLY = (
+    "Sure, let me think about that for a second. The short answer is yes, it should work the way you "
+    "described it. The longer answer depends on how much time you want to spend on it, but a weekend "
+    "is usually enough. Let me know if you want me to go through the steps one by one."
+)
+
+
+@dataclass
+class BackendProfile:
+    llm_first_token_ms: float = 300
+    llm_tokens_per_s: float = 60
+    tts_first_chunk_ms: float = 150
+    # Synthesis time over audio duration, below 1 is faster than realtime
+    tts_realtime_factor: float = 0.2
+
+
+def create_app(profile: BackendProfile) -> FastAPI:
+    app = FastAPI()
+    tokens = [word + ' ' for word in REPLY.split(' ')]
+
+    @app.get('/health')
+    async def health():
+        return {'status': 'healthy'}
+
+    @app.post('/v1/chat/completions')
+    async def chat_completions(request: Request):
+        payload = await request.json()
+        if not payload.get('stream'):
+            # Prefix warm-ups, only the prefill is simulated
+            await asyncio.sleep(profile.llm_first_token_ms / 1000)
+            content = ''.join(tokens[:payload.get('max_tokens') or len(tokens)])
+            return {
+                'id': 'chatcmpl-fake',
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': 'fake',
+                'choices': [{
+                    'index': 0,
+                    'finish_reason': 'length',
+                    'message': {'role': 'assistant', 'content': content}
+                }]
+            }
+
+        async def stream():
+            await asyncio.sleep(profile.llm_first_token_ms / 1000)
+            for token in tokens:
+                chunk = {
+                    'id': 'chatcmpl-fake',
+                    'object': 'chat.completion.chunk',
+                    'created': int(time.time()),
+                    'model': 'fake',
+                    'choices': [{'index': 0, 'delta': {'role': 'assistant', 'content': token}}]
+                }
+                yield f'data: {json.dumps(chunk)}\n\n'
+                await asyncio.sleep(1 / profile.llm_tokens_per_s)
+            yield 'data: [DONE]\n\n'
+
+        return StreamingResponse(stream(), media_type='text/event-stream')
+
+    def speech_samples(text: str) -> np.ndarray:
+        duration = max(0.3, len(text) * SPEECH_SECONDS_PER_CHAR)
+        t = np.arange(int(duration * TTS_SAMPLE_RATE)) / TTS_SAMPLE_RATE
+        return (np.sin(2 * np.pi * 220 * t) * 8000).astype('<i2')
+
+    async def paced_pcm(text: str):
+        samples = speech_samples(text)
+        await asyncio.sleep(profile.tts_first_chunk_ms / 1000)
+        for offset in range(0, len(samples), TTS_CHUNK_SAMPLES):
+            chunk = samples[offset:offset + TTS_CHUNK_SAMPLES]
+            yield chunk.tobytes()
+            await asyncio.sleep(len(chunk) / TTS_SAMPLE_RATE * profile.tts_realtime_factor)
+
+    @app.post('/v1/audio/speech')
+    @app.post('/v1/audio/speech/stream')
+    async def speech(request: Request):
+        payload = await request.json()
+        return StreamingResponse(paced_pcm(payload['input']), media_type='audio/wav')
+
+    @app.post('/v1/audio/speech/upload')
+    async def speech_upload(request: Request):
+        form = await request.form()
+        samples = speech_samples(form['input'])
+        await asyncio.sleep(profile.tts_first_chunk_ms / 1000 + len(samples) / TTS_SAMPLE_RATE * profile.tts_realtime_factor)
+
+        buffer = io.BytesIO()
+        wav.write(buffer, TTS_SAMPLE_RATE, samples)
+        return Response(buffer.getvalue(), media_type='audio/wav')
+
+    @app.get('/v1/audio/voices')
+    async def voices():
+        return {'voices': ['bf_emma', 'tara']}
+
+    return app
+
+
+async def run_backends(host: str, port: int, whisper_port: int, profile: BackendProfile, whisper_drop_after: int = 0):
+    server = uvicorn.Server(uvicorn.Config(create_app(profile), host=host, port=port, log_level='warning'))
+    await asyncio.gather(server.serve(), run_whisper_server(host, whisper_port, whisper_drop_after))
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser):
+    defaults = BackendProfile()
+    parser.add_argument('--llm-first-token-ms', type=float, default=defaults.llm_first_token_ms)
+    parser.add_argument('--llm-tokens-per-s', type=float, default=defaults.llm_tokens_per_s)
+    parser.add_argument('--tts-first-chunk-ms', type=float, default=defaults.tts_first_chunk_ms)
+    parser.add_argument('--tts-realtime-factor', type=float, default=defaults.tts_realtime_factor)
+
+
+def profile_from_arguments(args) -> BackendProfile:
+    return BackendProfile(
+        llm_first_token_ms=args.llm_first_token_ms,
+        llm_tokens_per_s=args.llm_tokens_per_s,
+        tts_first_chunk_ms=args.tts_first_chunk_ms,
+        tts_realtime_factor=args.tts_realtime_factor
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9100)
+    parser.add_argument('--whisper-port', type=int, default=9090)
+    parser.add_argument('--whisper-drop-after', type=int, default=0)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    asyncio.run(run_backends(args.host, args.port, args.whisper_port, profile_from_arguments(args), args.whisper_drop_after))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+A stand-in for the Whisper `/transcribe` websocket, for exercising the STT connection manager
+and load tests without a GPU. Run from the server directory:
+
+    python -m benchmarks.fake_whisper [--port 9090] [--drop-after 0]
+
+It accepts base64 JSON samples, raw float32 binary frames and the multiplexed variants of both
+(`stream_id` field, 16 byte stream id prefix, on `/transcribe?multiplex=1`), answers every half second of audio with a partial
+transcription and every commit with a final one. `--drop-after N` closes each connection after
+N received messages to simulate a flaky backend.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import uuid
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qs
+
+from websockets.asyncio.server import serve, ServerConnection
+from websockets.exceptions import ConnectionClosed
+
+SAMPLE_SIZE = 4  # float32
+SAMPLES_PER_WORD = 8000
+
+
+class FakeStream:
+    def __init__(self):
+        self.samples = 0
+        self.words = 0
+        self.segment_id = 0
+
+    def add(self, sample_count: int):
+        self.samples += sample_count
+        while self.samples >= (self.words + 1) * SAMPLES_PER_WORD:
+            self.words += 1
+            yield {'words': [f'word{self.words}'], 'complete': True, 'id': self.segment_id, 'samples': self.samples}
+
+    def commit(self):
+        segment = {'words': [], 'complete': True, 'final': True, 'id': self.segment_id, 'samples': self.samples}
+        self.segment_id += 1
+        self.samples = 0
+        self.words = 0
+        return segment
+
+
+def health(connection: ServerConnection, request):
+    path = urlsplit(request.path).path
+    if path == '/health':
+        return connection.respond(HTTPStatus.OK, '{"status": "healthy"}\n')
+    if path != '/transcribe':
+        return connection.respond(HTTPStatus.NOT_FOUND, 'Not found\n')
+
+
+def make_handler(drop_after: int):
+    async def handler(connection: ServerConnection):
+        streams = {}
+        received = 0
+        multiplexed = parse_qs(urlsplit(connection.request.path).query).get('multiplex') == ['1']
+
+        async def reply(stream_id, segment):
+            if stream_id is not None:
+                segment = segment | {'stream_id': stream_id}
+            await connection.send(json.dumps(segment))
+
+        try:
+            async for message in connection:
+                received += 1
+                if drop_after and received > drop_after:
+                    await connection.close()
+                    return
+
+                if isinstance(message, bytes):
+                    stream_id = None
+                    if multiplexed:
+                        stream_id, message = str(uuid.UUID(bytes=message[:16])), message[16:]
+                    payload = {'sample_count': len(message) // SAMPLE_SIZE}
+                else:
+                    payload = json.loads(message)
+                    stream_id = payload.get('stream_id')
+                    if 'samples' in payload:
+                        payload['sample_count'] = len(base64.b64decode(payload['samples'])) // SAMPLE_SIZE
+
+                if payload.get('close'):
+                    streams.pop(stream_id, None)
+                    continue
+
+                stream = streams.setdefault(stream_id, FakeStream())
+                if payload.get('commit'):
+                    await reply(stream_id, stream.commit())
+                else:
+                    for segment in stream.add(payload['sample_count']):
+                        await reply(stream_id, segment)
+
+        except ConnectionClosed:
+            pass
+
+    return handler
+
+
+async def run_server(host: str, port: int, drop_after: int = 0):
+    async with serve(make_handler(drop_after), host, port, process_request=health, max_size=None) as server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9090)
+    parser.add_argument('--drop-after', type=int, default=0)
+    args = parser.parse_args()
+
+    asyncio.run(run_server(args.host, args.port, args.drop_after))
+
+
+if __name__ == '__main__':
+    main()
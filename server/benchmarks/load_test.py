@@ -0,0 +1,275 @@
+"""
+Swarm of scripted voice clients for finding how many concurrent sessions one server process sustains.
+Start the fake backends (`python -m benchmarks.fake_backends`) and a server pointed at them, then
+run from the server directory:
+
+    python -m benchmarks.load_test [--server 127.0.0.1:8000] [--concurrency 1,10,50,100] [--turns 3] [--server-pid PID]
+
+Every client speaks the `/ws/chat/{chat_id}` protocol like the browser UI does: it streams microphone
+frames in realtime, sends `speech_end` and `speech_prompt_end` (or a `text_prompt` with `--text`),
+plays the reply back into a simulated buffer, reports its fill level with `flow_control` (pausing
+when it runs full) and reports `finished_speaking`. Per concurrency level it prints time-to-first-audio percentiles (from
+`speech_prompt_end` to the first speech samples), the event loop lag of the server and, given its
+pid, the CPU and memory it used per session.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import httpx
+import numpy as np
+import websockets
+
+from models.frames import FRAME_HEADER, FRAME_MIC_FLOAT32, FRAME_SPEECH_FLOAT32, FRAME_SPEECH_INT16, FRAME_SPEECH_OPUS, \
+    OPUS_PACKET_LENGTH, MIC_SAMPLE_RATE
+
+MIC_FRAME_SAMPLES = 1600
+UTTERANCE_SECONDS = 1.5
+SPEECH_SAMPLE_RATE = 48000
+
+PLAYBACK_HIGH_WATER_S = 4.0
+PLAYBACK_LOW_WATER_S = 1.0
+REPORT_EVERY_TICKS = 2
+REPLY_TIMEOUT_S = 60
+OPUS_PACKET_SECONDS = 0.02
+
+
+@dataclass
+class ClientResult:
+    first_audio_latencies: List[float] = field(default_factory=list)
+    turns_completed: int = 0
+    errors: List[str] = field(default_factory=list)
+
+
+def count_opus_packets(frame: bytes) -> int:
+    count, offset = 0, FRAME_HEADER.size
+    while offset < len(frame):
+        offset += OPUS_PACKET_LENGTH.size + OPUS_PACKET_LENGTH.unpack_from(frame, offset)[0]
+        count += 1
+    return count
+
+
+class ScriptedClient:
+    def __init__(self, server: str, turns: int, text_prompts: bool):
+        self.url = f'ws://{server}/ws/chat/{uuid.uuid4()}'
+        self.turns = turns
+        self.text_prompts = text_prompts
+
+        self.result = ClientResult()
+        self.socket: Optional[websockets.ClientConnection] = None
+
+        self.prompt_sent_at: Optional[float] = None
+        self.first_audio_at: Optional[float] = None
+        self.generation_done = asyncio.Event()
+        self.buffered_s = 0.0
+        self.paused = False
+
+    async def run(self):
+        try:
+            async with websockets.connect(self.url, max_size=None) as self.socket:
+                receiver = asyncio.create_task(self.receive())
+                try:
+                    for turn in range(self.turns):
+                        await self.turn(turn)
+                finally:
+                    receiver.cancel()
+        except Exception as e:
+            self.result.errors.append(f'{type(e).__name__}: {e}')
+
+    async def turn(self, turn: int):
+        self.first_audio_at = None
+        self.generation_done.clear()
+
+        if self.text_prompts:
+            self.prompt_sent_at = time.perf_counter()
+            await self.send_json({'type': 'text_prompt', 'prompt': f'Question number {turn}, what do you think?'})
+        else:
+            frame = bytearray(FRAME_HEADER.size + MIC_FRAME_SAMPLES * 4)
+            FRAME_HEADER.pack_into(frame, 0, FRAME_MIC_FLOAT32, MIC_SAMPLE_RATE)
+            np.frombuffer(frame, dtype='<f4', offset=FRAME_HEADER.size)[:] = np.random.uniform(-0.1, 0.1, MIC_FRAME_SAMPLES)
+
+            for _ in range(int(UTTERANCE_SECONDS * MIC_SAMPLE_RATE / MIC_FRAME_SAMPLES)):
+                await self.socket.send(frame)
+                await asyncio.sleep(MIC_FRAME_SAMPLES / MIC_SAMPLE_RATE)
+
+            await self.send_json({'type': 'speech_end'})
+            await asyncio.sleep(0.3)
+            self.prompt_sent_at = time.perf_counter()
+            await self.send_json({'type': 'speech_prompt_end'})
+
+        try:
+            await asyncio.wait_for(self.generation_done.wait(), REPLY_TIMEOUT_S)
+        except asyncio.TimeoutError:
+            self.result.errors.append(f'Turn {turn} got no complete reply in {REPLY_TIMEOUT_S}s')
+            return
+
+        # Let the rest of the reply play out before the next turn
+        while self.buffered_s > 0 or self.paused:
+            await asyncio.sleep(0.1)
+        await self.send_json({'type': 'finished_speaking'})
+
+        if self.first_audio_at is not None:
+            self.result.first_audio_latencies.append(self.first_audio_at - self.prompt_sent_at)
+        self.result.turns_completed += 1
+
+    async def receive(self):
+        playback = asyncio.create_task(self.play())
+        try:
+            async for message in self.socket:
+                if isinstance(message, bytes):
+                    kind, sample_rate = FRAME_HEADER.unpack_from(message)
+                    if kind in (FRAME_SPEECH_FLOAT32, FRAME_SPEECH_INT16):
+                        sample_size = 2 if kind == FRAME_SPEECH_INT16 else 4
+                        await self.on_speech((len(message) - FRAME_HEADER.size) / sample_size / sample_rate)
+                    elif kind == FRAME_SPEECH_OPUS:
+                        await self.on_speech(count_opus_packets(message) * OPUS_PACKET_SECONDS)
+                    continue
+
+                event = json.loads(message)
+                if event['type'] == 'speech_samples':
+                    # Base64 of float32 samples
+                    await self.on_speech(len(event['samples']) * 3 / 4 / 4 / SPEECH_SAMPLE_RATE)
+                elif event['type'] == 'token' and event['token'] is None:
+                    self.generation_done.set()
+        finally:
+            playback.cancel()
+
+    async def on_speech(self, seconds: float):
+        if self.first_audio_at is None:
+            self.first_audio_at = time.perf_counter()
+
+        self.buffered_s += seconds
+        if not self.paused and self.buffered_s > PLAYBACK_HIGH_WATER_S:
+            self.paused = True
+            await self.send_json({'type': 'flow_control', 'command': 'pause_sending'})
+
+    async def play(self):
+        tick = 0.05
+        ticks = 0
+        while True:
+            await asyncio.sleep(tick)
+            had_audio = self.buffered_s > 0
+            self.buffered_s = max(0.0, self.buffered_s - tick)
+
+            if self.paused and self.buffered_s < PLAYBACK_LOW_WATER_S:
+                self.paused = False
+                await self.send_json({'type': 'flow_control', 'command': 'resume_sending'})
+
+            ticks += 1
+            if had_audio and ticks % REPORT_EVERY_TICKS == 0:
+                await self.send_json({'type': 'flow_control', 'command': 'report', 'buffered_ms': self.buffered_s * 1000})
+
+    async def send_json(self, event):
+        await self.socket.send(json.dumps(event))
+
+
+class ProcessSampler:
+    """CPU time and resident memory of the server process, read from /proc."""
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.clock_ticks = os.sysconf('SC_CLK_TCK')
+
+    def cpu_seconds(self) -> float:
+        with open(f'/proc/{self.pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / self.clock_ticks
+
+    def rss_bytes(self) -> int:
+        with open(f'/proc/{self.pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+        return 0
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else float('nan')
+
+
+async def measure_client_lag(stop: asyncio.Event, lags: List[float]):
+    """The swarm shares one event loop, its own lag tells whether the client is the bottleneck."""
+    while not stop.is_set():
+        expected = time.perf_counter() + 0.1
+        await asyncio.sleep(0.1)
+        lags.append(max(0.0, time.perf_counter() - expected))
+
+
+async def run_level(args, concurrency: int, sampler: Optional[ProcessSampler]):
+    clients = [ScriptedClient(args.server, args.turns, args.text) for _ in range(concurrency)]
+
+    cpu_before = sampler.cpu_seconds() if sampler else 0.0
+    rss_before = sampler.rss_bytes() if sampler else 0
+
+    stop, client_lags = asyncio.Event(), []
+    lag_task = asyncio.create_task(measure_client_lag(stop, client_lags))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client.run() for client in clients))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await lag_task
+
+    latencies = [latency * 1000 for client in clients for latency in client.result.first_audio_latencies]
+    turns = sum(client.result.turns_completed for client in clients)
+    errors = [error for client in clients for error in client.result.errors]
+
+    print(f'{concurrency:4d} sessions: {turns}/{concurrency * args.turns} turns in {elapsed:.1f}s, '
+          f'TTFA p50 {percentile(latencies, 0.5):.0f}ms p95 {percentile(latencies, 0.95):.0f}ms '
+          f'p99 {percentile(latencies, 0.99):.0f}ms, client loop lag max {max(client_lags, default=0) * 1000:.0f}ms')
+
+    async with httpx.AsyncClient(base_url=f'http://{args.server}') as http:
+        try:
+            lag = (await http.get('/metrics/event-loop')).json()
+            print(f'               server loop lag p50 {lag["p50_ms"]:.1f}ms p99 {lag["p99_ms"]:.1f}ms max {lag["max_ms"]:.1f}ms '
+                  f'(recent window)')
+        except httpx.HTTPError as e:
+            print(f'               server loop lag unavailable: {e}')
+
+    if sampler:
+        cpu = sampler.cpu_seconds() - cpu_before
+        rss = sampler.rss_bytes()
+        print(f'               server CPU {cpu / elapsed * 100:.0f}% ({cpu / concurrency * 1000:.0f} ms per session), '
+              f'RSS {rss / 2 ** 20:.0f} MiB ({(rss - rss_before) / concurrency / 2 ** 10:+.0f} KiB per session)')
+
+    for error in sorted(set(errors))[:5]:
+        print(f'               error: {error}')
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--server', default='127.0.0.1:8000')
+    parser.add_argument('--concurrency', default='1,10,50,100')
+    parser.add_argument('--turns', type=int, default=3)
+    parser.add_argument('--text', action='store_true', help='send text prompts instead of speech')
+    parser.add_argument('--server-pid', type=int)
+    args = parser.parse_args()
+
+    sampler = ProcessSampler(args.server_pid) if args.server_pid else None
+
+    for concurrency in map(int, args.concurrency.split(',')):
+        await run_level(args, concurrency, sampler)
+        # Let sessions of this level wind down before the next one
+        await asyncio.sleep(1)
+
+    # The server side view of the same turns, split into pipeline stages
+    async with httpx.AsyncClient(base_url=f'http://{args.server}') as http:
+        try:
+            stages = (await http.get('/metrics/latency')).json()
+        except httpx.HTTPError:
+            return
+
+    for stage, per_provider in stages.items():
+        for provider, histogram in per_provider.items():
+            print(f'{stage:>20} [{provider}]: p50 {histogram["p50_ms"]:.0f}ms p95 {histogram["p95_ms"]:.0f}ms '
+                  f'over {histogram["count"]} turns')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
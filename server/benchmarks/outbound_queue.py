@@ -0,0 +1,86 @@
+"""
+Pushes speech frames of every binary format, token and control events through a session's outbound
+queue into a recording socket. Checks that all of them arrive, audio ahead of text and the other
+events in the order they were produced, and reports the frames written per second. Run from the
+server directory:
+
+    python -m benchmarks.outbound_queue [--frames 5000]
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+os.environ.setdefault('POSTGRES_HOST', 'benchmark')
+os.environ.setdefault('POSTGRES_USER', 'benchmark')
+os.environ.setdefault('POSTGRES_PASSWORD', 'benchmark')
+os.environ.setdefault('POSTGRES_DB', 'benchmark')
+os.environ.setdefault('ASSISTANT_API_URL', 'http://127.0.0.1:1/v1')
+
+import numpy as np
+
+from models.base import Token, Message
+from models.frames import encode_speech_frame, encode_opus_frame
+from models.sent_events import WsSendTokenEvent, WsManualPromptEvent
+from utils.outbound import OutboundQueue
+
+
+class RecordingSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_bytes(self, data):
+        self.sent.append(('bytes', data))
+
+    async def send_text(self, data):
+        self.sent.append(('text', data))
+
+
+async def main(frames: int):
+    samples = np.zeros(480, dtype=np.float32)
+    payloads = [
+        encode_speech_frame(samples, 24000, 'float32'),
+        encode_speech_frame(samples, 24000, 'int16'),
+        encode_opus_frame([b'\x00' * 40], 24000),
+        b'\x01' * 64,
+    ]
+
+    socket = RecordingSocket()
+    outbound = OutboundQueue(socket)
+
+    start = time.perf_counter()
+    for i in range(frames):
+        outbound.send_bytes(payloads[i % len(payloads)])
+        outbound.send_event(WsSendTokenEvent(token=Token(message=Message(role='assistant', content=f' word{i}'))))
+    # The end of generation marker and a control event must not overtake the tokens held for coalescing
+    outbound.send_event(WsSendTokenEvent(token=None))
+    outbound.send_event(WsManualPromptEvent(text='next'))
+
+    outbound.start()
+    while not outbound.queue.empty() and not outbound.closed:
+        await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    elapsed = time.perf_counter() - start
+    outbound.stop()
+
+    binary = [data for kind, data in socket.sent if kind == 'bytes']
+    text = [data for kind, data in socket.sent if kind == 'text']
+    assert not outbound.closed or outbound.queue.empty(), 'writer stopped before the queue was drained'
+    assert len(binary) == frames, f'{len(binary)} of {frames} binary frames sent'
+    assert binary == [payloads[i % len(payloads)] for i in range(frames)]
+    assert socket.sent.index(('text', text[0])) == frames, 'text overtook audio'
+    types = [json.loads(data)['type'] for data in text]
+    assert types[-2:] == ['token', 'manual_prompt'] and json.loads(text[-2])['token'] is None, f'events reordered: {types}'
+    assert all(json.loads(data)['token'] is not None for data in text[:-2]), 'tokens sent after the end marker'
+
+    print(f'{frames} binary frames and {len(text)} text events in {elapsed * 1000:.1f}ms '
+          f'({(frames + len(text)) / elapsed:.0f} frames/s)')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', type=int, default=5000)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.frames))
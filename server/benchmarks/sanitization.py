@@ -0,0 +1,96 @@
+"""
+Compares the single-pass TTS sanitizer with the previous Markdown -> HTML -> BeautifulSoup
+implementation on a golden corpus of assistant sentences, run from the server directory:
+
+    python -m benchmarks.sanitization
+
+Needs the reference implementation's dependencies (markdown, beautifulsoup4, demoji).
+"""
+import re
+import sys
+import time
+
+import demoji
+import markdown
+from bs4 import BeautifulSoup
+
+from utils.sanitization import clean_text_for_tts, StreamingTextSanitizer, collapse_whitespace
+
+GOLDEN_CORPUS = [
+    "Sure, I can help with that!",
+    "Here's the **short** answer: it depends on the _weather_.",
+    "The `ls -la` command lists all files 😀.",
+    "Check out [the docs](https://docs.python.org/3/) for more details.",
+    "You can find it at https://example.com/page?id=42 if you want.",
+    "# Summary\nThe meeting is at ten.",
+    "## Steps\n- Open the app\n- Tap settings\n- Choose privacy",
+    "1. Preheat the oven.\n2. Mix the flour and sugar.",
+    "> Be the change you wish to see in the world.",
+    "Tom &amp; Jerry is a classic cartoon 🐱🐭.",
+    "That costs about twenty dollars, which is a steal 👍🏽!",
+    "It's *really* important to stay hydrated.",
+    "The variable is called user_name in the code.",
+    "Use the <b>bold</b> tag for emphasis.",
+    "![A cute cat](https://example.com/cat.png) Look at this cat.",
+    "Great question!\n\n\nThe answer is forty two.",
+    "   Lots    of     spaces   here.   ",
+    "---\nThat's all for today.",
+]
+
+TOKEN_RE = re.compile(r'\s*\S{1,4}|\s+')
+
+
+def reference_clean_text_for_tts(text):
+    cleaned_text = demoji.replace(text, "")
+    html_text = markdown.markdown(cleaned_text)
+    soup = BeautifulSoup(html_text, "html.parser")
+    cleaned_text = soup.get_text()
+    cleaned_text = re.sub(r'[*_`]', '', cleaned_text)
+    cleaned_text = re.sub(r'^#+\s', '', cleaned_text, flags=re.MULTILINE)
+    cleaned_text = re.sub(r'http[s]?://\S+', '', cleaned_text)
+    cleaned_text = re.sub(r'\n\s*\n', '\n', cleaned_text)
+    cleaned_text = '\n'.join(line.strip() for line in cleaned_text.split('\n'))
+    cleaned_text = cleaned_text.strip()
+    cleaned_text = re.sub(r'\s+', ' ', cleaned_text)
+    return cleaned_text
+
+
+def streaming_clean(text):
+    sanitizer = StreamingTextSanitizer()
+    cleaned = ''.join(sanitizer.feed(token) for token in TOKEN_RE.findall(text))
+    return collapse_whitespace(cleaned + sanitizer.flush())
+
+
+def measure(fn, rounds=200):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for sentence in GOLDEN_CORPUS:
+            fn(sentence)
+    return (time.perf_counter() - start) / (rounds * len(GOLDEN_CORPUS)) * 1e6
+
+
+def main():
+    mismatches = 0
+    for sentence in GOLDEN_CORPUS:
+        expected = reference_clean_text_for_tts(sentence)
+        for name, fn in (('single pass', clean_text_for_tts), ('streaming', streaming_clean)):
+            actual = fn(sentence)
+            if actual != expected:
+                mismatches += 1
+                print(f'{name} mismatch for {sentence!r}:\n  expected {expected!r}\n  got      {actual!r}')
+
+    print(f'{mismatches} mismatches on {len(GOLDEN_CORPUS)} sentences')
+
+    for name, fn in (
+        ('reference', reference_clean_text_for_tts),
+        ('single pass', clean_text_for_tts),
+        ('streaming', streaming_clean),
+    ):
+        print(f'{name:>12}: {measure(fn):8.1f} us/sentence')
+
+    if mismatches:
+        sys.exit(f'{mismatches} sanitized sentences differ from the reference')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmarks the streaming sentence segmenter against the previous per-character splitter.
+Run from the server directory:
+
+    python -m benchmarks.segmentation [token_streams.jsonl]
+
+Each line of the optional file is a JSON list of token deltas as recorded from the LLM stream,
+without it a few built-in replies split into LLM-sized tokens are used.
+"""
+import json
+import re
+import sys
+import time
+
+from utils.segmentation import SentenceSegmenter
+
+BUILTIN_REPLIES = [
+    "Sure. The forecast for tomorrow is mostly sunny with a high of 23.5 degrees, e.g. a perfect day for a walk. "
+    "Dr. Smith's clinic opens at 8 a.m. and closes at 5 p.m., so you have plenty of time. Anything else?",
+    "Here are the three options:\n1. Take the train at 10:30.\n2. Drive, which takes about 2.5 hours.\n"
+    "3. Fly, though that is the most expensive one. I'd go with the train, honestly!",
+    "Hmm, good question. Version 3.12 of Python introduced better error messages, faster startup, "
+    "and a lot of typing improvements, i.e. the kind of changes that make day-to-day work nicer. "
+    "Would you like me to go through them one by one?",
+]
+
+TOKEN_RE = re.compile(r'\s*\S{1,5}|\s+')
+
+
+def legacy_segments(tokens, flush=True):
+    sentence_buffer = ""
+    for msg in tokens:
+        msg = re.sub(r'\n+', '\n', msg)
+        for char in msg:
+            sentence_buffer += char
+            if char in ('.', ':', '\n', '?', '!'):
+                yield sentence_buffer.strip() + " "
+                sentence_buffer = ""
+    if flush and sentence_buffer:
+        yield sentence_buffer
+
+
+def segmenter_segments(tokens, flush=True):
+    segmenter = SentenceSegmenter()
+    for msg in tokens:
+        yield from segmenter.feed(msg)
+    if flush:
+        yield from segmenter.flush()
+
+
+def load_streams():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+    return [TOKEN_RE.findall(reply) for reply in BUILTIN_REPLIES]
+
+
+def first_chunk_tokens(segment_fn, tokens):
+    """Number of tokens consumed before the first TTS-worthy chunk is released."""
+    for i in range(len(tokens)):
+        if any(len(c.strip()) > 2 for c in segment_fn(tokens[:i + 1], flush=False)):
+            return i + 1
+    return len(tokens)
+
+
+def main():
+    streams = load_streams()
+
+    for name, fn in (('legacy', legacy_segments), ('segmenter', segmenter_segments)):
+        chunks = [[c for c in fn(tokens) if len(c.strip()) > 2] for tokens in streams]
+        total_tokens = sum(len(tokens) for tokens in streams)
+
+        start = time.perf_counter()
+        rounds = 200
+        for _ in range(rounds):
+            for tokens in streams:
+                for _chunk in fn(tokens):
+                    pass
+        per_token_us = (time.perf_counter() - start) / (rounds * total_tokens) * 1e6
+
+        print(f'{name:>10}: {sum(map(len, chunks)):3d} TTS requests, '
+              f'first chunk after {sum(first_chunk_tokens(fn, t) for t in streams) / len(streams):5.1f} tokens on average, '
+              f'shortest chunk {min(len(c) for cs in chunks for c in cs):3d} chars, '
+              f'{per_token_us:.2f} us/token')
+
+        for stream_chunks in chunks:
+            print('            ' + ' | '.join(c.strip() for c in stream_chunks))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Micro-benchmark of the speech output stage, run from the server directory:
+
+    python -m benchmarks.speech_output
+
+Reports TTS input samples processed per second on a single core for the previous
+per-sample Python loop and for each of the vectorized output formats (Opus when libopus is
+installed), and the bytes one second of speech takes in each format.
+"""
+import base64
+import os
+import time
+
+import numpy as np
+
+for variable in ('ASSISTANT_API_URL', 'POSTGRES_USER', 'POSTGRES_PASSWORD', 'POSTGRES_DB', 'POSTGRES_HOST'):
+    os.environ.setdefault(variable, 'benchmark')
+
+from models.frames import encode_speech_frame
+from utils.opus import OPUS_AVAILABLE, OpusSpeechEncoder
+from utils.sound import resample_to_output, encode_samples_base64, OUTPUT_SAMPLE_RATE
+
+CHUNK_SAMPLES = 2000
+ROUNDS = 200
+
+
+def legacy_sender(samples):
+    resampled = [0.0 for _ in range(len(samples) * 2)]
+    for i in range(len(samples)):
+        resampled[i * 2] = samples[i]
+        resampled[i * 2 + 1] = samples[i]
+    return base64.b64encode(np.array(resampled, dtype=np.float32).tobytes()).decode('ascii')
+
+
+def json_sender(samples):
+    return encode_samples_base64(resample_to_output(samples, 24000))
+
+
+def float32_sender(samples):
+    return encode_speech_frame(resample_to_output(samples, 24000), OUTPUT_SAMPLE_RATE, 'float32')
+
+
+def int16_sender(samples):
+    return encode_speech_frame(resample_to_output(samples, 24000), OUTPUT_SAMPLE_RATE, 'int16')
+
+
+def measure(fn, chunk, rounds):
+    start = time.process_time()
+    for _ in range(rounds):
+        fn(chunk)
+    elapsed = time.process_time() - start
+    return rounds * len(chunk) / elapsed
+
+
+def main():
+    chunk = (np.random.default_rng(0).standard_normal(CHUNK_SAMPLES) * 0.1).astype(np.float32)
+
+    senders = [
+        ('legacy loop', legacy_sender, ROUNDS // 10),
+        ('json (base64)', json_sender, ROUNDS),
+        ('binary float32', float32_sender, ROUNDS),
+        ('binary int16', int16_sender, ROUNDS),
+    ]
+    if OPUS_AVAILABLE:
+        opus_encoder = OpusSpeechEncoder()
+        senders.append(('opus', lambda samples: opus_encoder.encode_packets(resample_to_output(samples, 24000), False), ROUNDS // 10))
+
+    for name, fn, rounds in senders:
+        rate = measure(fn, chunk, rounds)
+        print(f'{name:>16}: {rate / 1e6:8.2f} M samples/s/core ({rate / 24000:8.0f}x realtime at 24 kHz)')
+
+    one_second = resample_to_output(np.tile(chunk, 12), 24000)
+    print(f'bytes per second of speech: json {len(json_sender(np.tile(chunk, 12)))}, '
+          f'int16 {len(encode_speech_frame(one_second, OUTPUT_SAMPLE_RATE, "int16"))}'
+          + (f', opus {sum(map(len, OpusSpeechEncoder().encode_packets(one_second, True)))}' if OPUS_AVAILABLE else ''))
+
+
+if __name__ == '__main__':
+    main()
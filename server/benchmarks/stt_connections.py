@@ -0,0 +1,101 @@
+"""
+Checks the STT connection manager against the fake Whisper server and measures time to first
+transcription. Run from the server directory:
+
+    python -m benchmarks.stt_connections [--sessions 200] [--multiplex] [--drop-after 50]
+
+Every simulated session streams a few utterances of 16 kHz float32 audio and verifies that all
+partial and final transcriptions come back, also while the fake server keeps dropping connections.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault('ASSISTANT_API_URL', 'http://localhost')
+for name in ('POSTGRES_USER', 'POSTGRES_PASSWORD', 'POSTGRES_DB', 'POSTGRES_HOST'):
+    os.environ.setdefault(name, 'benchmark')
+
+import numpy as np
+
+from benchmarks.fake_whisper import run_server, SAMPLES_PER_WORD
+from providers.whisper import WhisperProvider
+
+FRAME_SAMPLES = 1600
+UTTERANCES = 3
+UTTERANCE_SAMPLES = 4 * SAMPLES_PER_WORD
+
+
+async def simulate_session(provider: WhisperProvider, first_result_latencies: list) -> bool:
+    queue = asyncio.Queue()
+    frame = np.zeros(FRAME_SAMPLES, dtype=np.float32).tobytes()
+
+    async def speak():
+        for _ in range(UTTERANCES):
+            for _ in range(UTTERANCE_SAMPLES // FRAME_SAMPLES):
+                queue.put_nowait(memoryview(frame))
+                await asyncio.sleep(0.01)
+            queue.put_nowait(None)
+
+    started = time.perf_counter()
+    speaker = asyncio.create_task(speak())
+
+    words, finals = 0, 0
+    transcription = provider.continuous_transcription(queue)
+    try:
+        async with asyncio.timeout(30):
+            async for segment in transcription:
+                if words == 0 and finals == 0:
+                    first_result_latencies.append(time.perf_counter() - started)
+                words += len(segment.words)
+                finals += bool(segment.final)
+                if finals == UTTERANCES:
+                    break
+    except TimeoutError:
+        pass
+    finally:
+        speaker.cancel()
+        await transcription.aclose()
+
+    return finals == UTTERANCES and words == UTTERANCES * (UTTERANCE_SAMPLES // SAMPLES_PER_WORD)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sessions', type=int, default=200)
+    parser.add_argument('--multiplex', action='store_true')
+    parser.add_argument('--drop-after', type=int, default=0, help='has to exceed the frames of an utterance, times sessions when multiplexed')
+    parser.add_argument('--port', type=int, default=9191)
+    args = parser.parse_args()
+
+    server = asyncio.create_task(run_server('127.0.0.1', args.port, args.drop_after))
+    await asyncio.sleep(0.2)
+
+    provider = WhisperProvider(f'127.0.0.1:{args.port}', multiplex=args.multiplex)
+    await provider.startup()
+
+    latencies = []
+    start = time.perf_counter()
+    results = await asyncio.gather(*(simulate_session(provider, latencies) for _ in range(args.sessions)))
+    elapsed = time.perf_counter() - start
+
+    sockets = len(provider.connections.shared) if args.multiplex else args.sessions
+    first_result = f'{statistics.median(latencies) * 1000:.1f} ms median' if latencies else 'never'
+    print(f'{sum(results)}/{len(results)} sessions transcribed completely in {elapsed:.2f}s over {sockets} sockets, '
+          f'first transcription after {first_result}')
+
+    await provider.shutdown()
+    server.cancel()
+    await asyncio.sleep(0.1)
+
+    leaked = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    print(f'{len(leaked)} tasks still running after shutdown')
+
+    if sum(results) != len(results) or leaked:
+        sys.exit(f'{len(results) - sum(results)} incomplete sessions, {len(leaked)} leaked tasks')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,105 @@
+"""
+Compares end-to-end playout time of a multi-sentence reply with and without TTS look-ahead,
+using a fake non-streaming provider (Chatterbox-like: the whole sentence arrives at once).
+Fails when speech is lost or look-ahead does not overlap the synthesis. Run from the server directory:
+
+    python -m benchmarks.tts_pipeline
+"""
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+for variable in ('ASSISTANT_API_URL', 'POSTGRES_USER', 'POSTGRES_PASSWORD', 'POSTGRES_DB', 'POSTGRES_HOST'):
+    os.environ.setdefault(variable, 'benchmark')
+
+from models.frames import FRAME_HEADER
+from providers import providers
+from providers.base import TextToSpeechProvider
+from providers.cache import speech_cache
+from tasks.tts import tts_task
+from utils.flow_control import PlayoutFlowControl
+from utils.perf import TurnTimeline
+from utils.sound import resample_to_output
+
+SENTENCES = 6
+SYNTHESIS_SECONDS = 0.6
+AUDIO_SECONDS = 0.5
+
+
+class FakeProvider(TextToSpeechProvider):
+    SAMPLE_RATE = 24000
+
+    def __init__(self):
+        super().__init__('http://fake')
+
+    async def generate_audio_stream(self, text: str, voice: str):
+        await asyncio.sleep(SYNTHESIS_SECONDS)
+        yield np.zeros(int(self.SAMPLE_RATE * AUDIO_SECONDS), dtype=np.float32)
+
+
+class FakeSession:
+    def __init__(self, lookahead: int):
+        self.config = SimpleNamespace(
+            tts=SimpleNamespace(provider='fake', voice='fake'),
+            app=SimpleNamespace(speech_output_format='float32', tts_lookahead=lookahead, playback_lead_ms=500)
+        )
+        self.flow_control = PlayoutFlowControl()
+        self.samples_sent = 0
+
+    def speech_output_format(self):
+        return self.config.app.speech_output_format
+
+    async def send_event(self, event):
+        pass
+
+    async def send_bytes(self, data):
+        # float32 speech frames
+        self.samples_sent += (len(data) - FRAME_HEADER.size) // 4
+
+
+async def playout_time(lookahead: int) -> tuple[float, float, int]:
+    llm_response_queue = asyncio.Queue()
+    for i in range(SENTENCES):
+        llm_response_queue.put_nowait(f'Sentence number {i}.')
+    llm_response_queue.put_nowait(None)
+
+    timeline = TurnTimeline()
+    timeline.mark('first_sentence')
+
+    session = FakeSession(lookahead)
+    start = time.perf_counter()
+    await tts_task(session, llm_response_queue, timeline)
+    # tts_task returns once everything is queued, wait for the sender to drain it
+    while len(asyncio.all_tasks()) > 1:
+        await asyncio.sleep(0.01)
+    return (
+        time.perf_counter() - start,
+        timeline.marks['first_sample_sent'] - timeline.marks['first_sentence'],
+        session.samples_sent
+    )
+
+
+async def main():
+    providers['tts']['fake'] = FakeProvider()
+    # Every run synthesizes the same sentences, cache hits would hide the pipelining
+    speech_cache.max_bytes = 0
+
+    sentence_samples = len(resample_to_output(np.zeros(int(FakeProvider.SAMPLE_RATE * AUDIO_SECONDS), dtype=np.float32), FakeProvider.SAMPLE_RATE))
+
+    for lookahead in (1, 2, 3):
+        elapsed, first_audio, samples_sent = await playout_time(lookahead)
+        print(f'look-ahead {lookahead}: {SENTENCES} sentences played out in {elapsed:.2f}s, '
+              f'first audio after {first_audio * 1000:.0f}ms')
+
+        if samples_sent != SENTENCES * sentence_samples:
+            sys.exit(f'look-ahead {lookahead}: {samples_sent} of {SENTENCES * sentence_samples} samples sent')
+        if lookahead > 1 and elapsed >= SENTENCES * SYNTHESIS_SECONDS:
+            sys.exit(f'look-ahead {lookahead} took as long as synthesizing one sentence after another')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
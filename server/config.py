@@ -11,10 +11,37 @@ class Config(BaseSettings):
     POSTGRES_PORT: int = 5432
 
     WHISPER_API_URL: str | None = None
+    WHISPER_BINARY_AUDIO: bool = False
+    WHISPER_WARM_CONNECTIONS: int = 2
+    WHISPER_MULTIPLEX: bool = False
+    WHISPER_MULTIPLEX_STREAMS_PER_CONNECTION: int = 64
     KOKORO_API_URL: str | None = None
     ORPHEUS_API_URL: str | None = None
     CHATTERBOX_API_URL: str | None = None
 
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY_S: float = 60.0
+    HTTP2_ENABLED: bool = True
+
+    HEALTH_POLL_INTERVAL_S: float = 5.0
+    HEALTH_PROBE_TIMEOUT_S: float = 2.0
+
+    VOICES_TTL_S: float = 300.0
+    VOICES_WATCH_INTERVAL_S: float = 2.0
+
+    TTS_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    TTS_CACHE_MAX_TEXT_LENGTH: int = 200
+    TTS_CACHE_DIRECTORY: str | None = None
+
+    OPUS_BITRATE: int = 32000
+    OPUS_ENCODER_THREADS: int = 2
+
+    LLM_CONTEXT_TOKEN_BUDGET: int = 6000
+    LLM_CONTEXT_MIN_RECENT_MESSAGES: int = 4
+    LLM_SUMMARY_API_URL: str | None = None
+    LLM_SUMMARY_MODEL: str = 'anything'
+
     class Config:
         env_file = ".env"
 
@@ -0,0 +1,69 @@
+"""messages table
+
+Revision ID: 3b1f9c2d7e4a
+Revises: f68a56f8c2d5
+Create Date: 2026-10-18 09:30:12.418207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b1f9c2d7e4a'
+down_revision: Union[str, None] = 'f68a56f8c2d5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('messages',
+    sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+    sa.Column('chat_id', sa.UUID(), nullable=False),
+    sa.Column('role', sa.String(), nullable=False),
+    sa.Column('content', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['chat_id'], ['chats.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_messages_chat_id'), 'messages', ['chat_id'], unique=False)
+
+    # Unpack the JSON blobs in their original order, ids follow the insertion order
+    op.execute("""
+        INSERT INTO messages (chat_id, role, content, created_at)
+        SELECT
+            chats.id,
+            message.value ->> 'role',
+            message.value ->> 'content',
+            COALESCE(to_timestamp((message.value ->> 'time')::double precision)::timestamp, chats.started_at)
+        FROM chats
+        CROSS JOIN LATERAL json_array_elements(chats.messages) WITH ORDINALITY AS message(value, position)
+        ORDER BY chats.started_at, chats.id, message.position
+    """)
+
+    op.drop_column('chats', 'messages')
+
+
+def downgrade() -> None:
+    op.add_column('chats', sa.Column('messages', sa.JSON(), nullable=False, server_default='[]'))
+
+    op.execute("""
+        UPDATE chats SET messages = aggregated.messages
+        FROM (
+            SELECT
+                chat_id,
+                json_agg(
+                    json_build_object('role', role, 'content', content, 'time', extract(epoch FROM created_at))
+                    ORDER BY id
+                ) AS messages
+            FROM messages
+            GROUP BY chat_id
+        ) AS aggregated
+        WHERE chats.id = aggregated.chat_id
+    """)
+    op.alter_column('chats', 'messages', server_default=None)
+
+    op.drop_index(op.f('ix_messages_chat_id'), table_name='messages')
+    op.drop_table('messages')
@@ -0,0 +1,36 @@
+"""history indexes
+
+Revision ID: 8c4e71a0b5d3
+Revises: 3b1f9c2d7e4a
+Create Date: 2026-10-18 14:15:47.902311
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c4e71a0b5d3'
+down_revision: Union[str, None] = '3b1f9c2d7e4a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Keyset pagination of the chat list, newest first with the id as a tie breaker
+    op.create_index('ix_chats_started_at_id', 'chats', [sa.text('started_at DESC'), sa.text('id DESC')], unique=False)
+    op.drop_index(op.f('ix_chats_started_at'), table_name='chats')
+
+    # Message ranges of a single chat, also serves the plain chat_id lookups
+    op.create_index('ix_messages_chat_id_id', 'messages', ['chat_id', 'id'], unique=False)
+    op.drop_index(op.f('ix_messages_chat_id'), table_name='messages')
+
+
+def downgrade() -> None:
+    op.create_index(op.f('ix_messages_chat_id'), 'messages', ['chat_id'], unique=False)
+    op.drop_index('ix_messages_chat_id_id', table_name='messages')
+
+    op.create_index(op.f('ix_chats_started_at'), 'chats', ['started_at'], unique=False)
+    op.drop_index('ix_chats_started_at_id', table_name='chats')
@@ -0,0 +1,28 @@
+"""chat summary
+
+Revision ID: d27f0b9e4c61
+Revises: 8c4e71a0b5d3
+Create Date: 2026-10-18 16:20:05.113468
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd27f0b9e4c61'
+down_revision: Union[str, None] = '8c4e71a0b5d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('chats', sa.Column('summary', sa.Text(), nullable=True))
+    op.add_column('chats', sa.Column('summarized_messages', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade() -> None:
+    op.drop_column('chats', 'summarized_messages')
+    op.drop_column('chats', 'summary')
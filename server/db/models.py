@@ -1,4 +1,4 @@
-from sqlalchemy import Column, UUID, JSON, DateTime, String
+from sqlalchemy import Column, UUID, DateTime, String, BigInteger, ForeignKey, Text, Index, Integer
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -8,13 +8,31 @@ class Chat(Base):
     __tablename__ = 'chats'
 
     id = Column(UUID(as_uuid=True), primary_key=True, index=True)
-    started_at = Column(DateTime, nullable=False, index=True)
+    started_at = Column(DateTime, nullable=False)
     header = Column(String, nullable=True)
+    summary = Column(Text, nullable=True)
+    summarized_messages = Column(Integer, nullable=False, default=0, server_default='0')
 
-    messages = Column(JSON, nullable=False, default=list)
+    __table_args__ = (
+        Index('ix_chats_started_at_id', started_at.desc(), id.desc()),
+    )
 
     def __str__(self):
-        return f'{self.id}, {len(self.messages)} msgs'
+        return f'{self.id}, {self.header}'
 
-    def __len__(self):
-        return len(self.messages)
+
+class ChatMessage(Base):
+    __tablename__ = 'messages'
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    chat_id = Column(UUID(as_uuid=True), ForeignKey('chats.id', ondelete='CASCADE'), nullable=False)
+    role = Column(String, nullable=False)
+    content = Column(Text, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index('ix_messages_chat_id_id', chat_id, id),
+    )
+
+    def __str__(self):
+        return f'{self.chat_id}, {self.role}: {self.content[:30]}'
@@ -0,0 +1,130 @@
+import asyncio
+from typing import Optional, Any, Dict, List, Tuple, Literal
+
+import logfire
+from sqlalchemy import insert, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from db.models import Chat, ChatMessage
+from db.session import SessionLocal
+
+WriteOperation = Tuple[Literal['chat', 'message', 'summary'], Dict[str, Any]]
+
+
+class ChatWriter:
+    """
+    Write-behind persistence of chats and their messages.
+
+    Writes are queued without waiting for the database and flushed by a single background task
+    in batches, so a new turn never waits on a commit before the LLM request goes out.
+
+    A batch that fails to commit is retried with backoff before the next one, so a short database
+    outage delays the history instead of losing it. Only after `max_retries` or once `max_queued`
+    writes pile up are writes dropped, and that is logged as an error.
+    """
+    def __init__(
+            self,
+            flush_interval_s: float = 0.05,
+            max_batch_size: int = 200,
+            max_retries: int = 5,
+            retry_backoff_s: float = 0.5,
+            max_queued: int = 10000
+    ):
+        self.flush_interval_s = flush_interval_s
+        self.max_batch_size = max_batch_size
+        self.max_retries = max_retries
+        self.retry_backoff_s = retry_backoff_s
+        self.max_queued = max_queued
+
+        self.queue: asyncio.Queue[Optional[WriteOperation]] = asyncio.Queue()
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Flushes everything queued so far and stops the background task."""
+        if self.task:
+            self.queue.put_nowait(None)
+            await self.task
+            self.task = None
+
+    def enqueue(self, operation: WriteOperation):
+        if self.queue.qsize() >= self.max_queued:
+            logfire.error(f'Write queue full, dropping {operation[0]} write of {operation[1].get("id")}')
+            return
+        self.queue.put_nowait(operation)
+
+    def save_chat(self, chat: Chat):
+        self.enqueue(('chat', {
+            'id': chat.id,
+            'started_at': chat.started_at,
+            'header': chat.header
+        }))
+
+    def save_message(self, message: Dict[str, Any]):
+        self.enqueue(('message', message))
+
+    def save_summary(self, chat: Chat):
+        self.enqueue(('summary', {
+            'id': chat.id,
+            'summary': chat.summary,
+            'summarized_messages': chat.summarized_messages
+        }))
+
+    async def run(self):
+        stopping = False
+        while not stopping:
+            batch = [await self.queue.get()]
+
+            deadline = asyncio.get_running_loop().time() + self.flush_interval_s
+            while len(batch) < self.max_batch_size and batch[-1] is not None:
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            if batch[-1] is None:
+                stopping = True
+                batch.pop()
+
+            if batch:
+                await self.flush_with_retries(batch)
+
+    async def flush_with_retries(self, batch: List[WriteOperation]):
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self.flush(batch)
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logfire.error(f'Dropping {len(batch)} writes after {attempt + 1} attempts: {e}', _exc_info=True)
+                    return
+
+                delay = self.retry_backoff_s * 2 ** attempt
+                logfire.warning(f'Failed to persist {len(batch)} writes: {e}, retrying in {delay:.1f}s')
+                await asyncio.sleep(delay)
+
+    async def flush(self, batch: List[WriteOperation]):
+        chats = [values for kind, values in batch if kind == 'chat']
+        messages = [values for kind, values in batch if kind == 'message']
+        summaries = [values for kind, values in batch if kind == 'summary']
+
+        async with SessionLocal() as db:
+            if chats:
+                await db.execute(pg_insert(Chat).values(chats).on_conflict_do_nothing(index_elements=['id']))
+            if messages:
+                await db.execute(insert(ChatMessage).values(messages))
+            for values in summaries:
+                # The batch is kept intact for a retry
+                columns = {key: value for key, value in values.items() if key != 'id'}
+                await db.execute(update(Chat).where(Chat.id == values['id']).values(columns))
+            await db.commit()
+
+        logfire.debug(f'Persisted {len(chats)} chats and {len(messages)} messages')
+
+
+chat_writer = ChatWriter()
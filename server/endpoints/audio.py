@@ -1,18 +1,24 @@
 from fastapi import APIRouter, HTTPException
+from starlette.requests import Request
+from starlette.responses import Response, JSONResponse
 
-from providers import providers
-from providers.base import TextToSpeechProvider
+from providers.voices import voice_registry
 
 audio_router = APIRouter()
 
 
 @audio_router.get('/voices/{provider}')
-async def get_voices(provider: str):
+async def get_voices(provider: str, request: Request):
     try:
-        tts_provider: TextToSpeechProvider = providers["tts"][provider]
-        voices = await tts_provider.get_voices()
-
-        return voices
-
+        catalog = await voice_registry.get(provider)
     except KeyError:
         raise HTTPException(status_code=404)
+
+    if catalog is None:
+        raise HTTPException(status_code=503)
+
+    headers = {'ETag': catalog.etag, 'Cache-Control': 'no-cache'}
+    if request.headers.get('if-none-match') == catalog.etag:
+        return Response(status_code=304, headers=headers)
+
+    return JSONResponse(catalog.voices, headers=headers)
@@ -1,34 +1,109 @@
+import json
 import os.path
 import shutil
-from uuid import uuid4
+from datetime import datetime
+from typing import Optional, Tuple, AsyncGenerator
+from uuid import uuid4, UUID
 
-from fastapi import Depends, APIRouter
+from fastapi import Depends, APIRouter, Query, HTTPException
 from fastapi.encoders import jsonable_encoder
-from sqlalchemy import select, desc, delete
+from sqlalchemy import select, delete, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import load_only
+from starlette.responses import StreamingResponse
 
-from db.models import Chat
-from db.session import get_db
+from db.models import Chat, ChatMessage
+from db.session import get_db, SessionLocal
+
+MESSAGES_STREAM_BATCH = 500
 
 chat_router = APIRouter()
 
 
+def encode_chat_cursor(started_at: datetime, chat_id: UUID) -> str:
+    return f'{started_at.isoformat()}_{chat_id}'
+
+
+def decode_chat_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    try:
+        started_at, chat_id = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(started_at), UUID(chat_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+
+
 @chat_router.get('/chats')
-async def get_chats(db: AsyncSession = Depends(get_db)):
-    query = select(Chat).options(load_only(Chat.id, Chat.started_at, Chat.header)).order_by(desc('started_at'))
+async def get_chats(
+        limit: int = Query(50, ge=1, le=500),
+        before: Optional[str] = None,
+        db: AsyncSession = Depends(get_db)
+):
+    """Keyset pagination over chats, newest first. Pass `next_cursor` as `before` to get the next page."""
+    query = select(Chat.id, Chat.started_at, Chat.header).order_by(Chat.started_at.desc(), Chat.id.desc()).limit(limit + 1)
+    if before is not None:
+        query = query.filter(tuple_(Chat.started_at, Chat.id) < decode_chat_cursor(before))
+
+    result = await db.execute(query)
+    rows = result.all()
+
+    chats = [{'id': chat_id, 'started_at': started_at, 'header': header} for chat_id, started_at, header in rows[:limit]]
+    next_cursor = encode_chat_cursor(rows[limit - 1].started_at, rows[limit - 1].id) if len(rows) > limit else None
+
+    return jsonable_encoder({'chats': chats, 'next_cursor': next_cursor})
+
+
+@chat_router.get('/chat/{chat_id}/messages')
+async def get_chat_messages(
+        chat_id: UUID,
+        limit: int = Query(50, ge=1, le=500),
+        before: Optional[int] = None,
+        db: AsyncSession = Depends(get_db)
+):
+    """The last `limit` messages before the `before` message id, in chronological order."""
+    query = select(ChatMessage.id, ChatMessage.role, ChatMessage.content).filter(
+        ChatMessage.chat_id == chat_id
+    ).order_by(ChatMessage.id.desc()).limit(limit + 1)
+    if before is not None:
+        query = query.filter(ChatMessage.id < before)
 
     result = await db.execute(query)
-    result = result.scalars()
+    rows = result.all()
+
+    messages = [
+        {'id': message_id, 'role': role, 'content': content}
+        for message_id, role, content in reversed(rows[:limit])
+    ]
+    next_cursor = rows[limit - 1].id if len(rows) > limit else None
+
+    return {'messages': messages, 'next_cursor': next_cursor}
+
 
-    return jsonable_encoder(list(result))
+async def stream_chat(chat: Chat) -> AsyncGenerator[str, None]:
+    header = json.dumps(jsonable_encoder(chat))
+    yield header[:-1] + ', "messages": ['
+
+    # The request scoped session is already closed once the response body is streamed
+    async with SessionLocal() as db:
+        query = select(ChatMessage.role, ChatMessage.content).filter(
+            ChatMessage.chat_id == chat.id
+        ).order_by(ChatMessage.id).execution_options(yield_per=MESSAGES_STREAM_BATCH)
+
+        separator = ''
+        async for role, content in await db.stream(query):
+            yield separator + json.dumps({'role': role, 'content': content})
+            separator = ', '
+
+    yield ']}'
 
 
 @chat_router.get('/chat/{chat_id}')
-async def get_chat(chat_id: str, db: AsyncSession = Depends(get_db)):
+async def get_chat(chat_id: UUID, db: AsyncSession = Depends(get_db)):
     query = select(Chat).filter(Chat.id == chat_id)
     result = await db.execute(query)
-    return jsonable_encoder(result.scalar())
+    chat = result.scalar()
+    if chat is None:
+        return None
+
+    return StreamingResponse(stream_chat(chat), media_type='application/json')
 
 
 @chat_router.post('/chat/new')
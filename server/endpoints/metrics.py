@@ -0,0 +1,32 @@
+from fastapi import APIRouter
+
+from providers.cache import speech_cache
+from providers.health import health_monitor
+from utils.perf import latency_metrics, event_loop_monitor, speculation_metrics
+
+metrics_router = APIRouter()
+
+
+@metrics_router.get('/metrics/tts-cache')
+async def get_tts_cache_metrics():
+    return speech_cache.metrics()
+
+
+@metrics_router.get('/metrics/latency')
+async def get_latency_metrics():
+    return latency_metrics.metrics()
+
+
+@metrics_router.get('/metrics/event-loop')
+async def get_event_loop_metrics():
+    return event_loop_monitor.metrics()
+
+
+@metrics_router.get('/metrics/speculation')
+async def get_speculation_metrics():
+    return speculation_metrics.metrics()
+
+
+@metrics_router.get('/metrics/health')
+async def get_health_metrics():
+    return health_monitor.metrics()
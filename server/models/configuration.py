@@ -1,14 +1,19 @@
+import asyncio
 import os.path
 import shutil
-from typing import Literal, Union
+from typing import Literal, Union, Optional, Set, Callable, Any
 
 import aiofiles
+import logfire
 from pydantic import BaseModel
 
+from models.frames import SpeechOutputFormat
 from providers.chatterbox import ChatterBoxConfig
 from providers.kokoro import KokoroConfig
 from providers.orpheus import OrpheusConfig
 
+CONFIG_WRITE_DEBOUNCE_S = 1.0
+
 
 class STTConfig(BaseModel):
     provider: Literal['whisper'] = 'whisper'
@@ -22,6 +27,14 @@ class AppConfig(BaseModel):
     after_user_speech_confirmation_delay_ms: int = 500
     prevalidate_prompt: bool = False
     inactivity_timeout_ms: int | None = None
+    speech_output_format: SpeechOutputFormat = 'json'
+    tts_lookahead: int = 2
+    playback_lead_ms: int = 500
+    speculative_llm_enabled: bool = False
+    speculative_stability_ms: int = 300
+    speculative_tts_enabled: bool = False
+    prefix_warmup_enabled: bool = False
+    prefix_warmup_interval_ms: int = 10000
 
 
 class SessionConfig(BaseModel):
@@ -30,9 +43,72 @@ class SessionConfig(BaseModel):
     app: AppConfig
 
 
-async def load_config():
-    if not os.path.exists('/config.json'):
-        shutil.copy('config.template.json', '/config.json')
+class ConfigStore:
+    """
+    The configuration shared by all sessions, read from disk once at startup.
+
+    Updates are applied in memory and handed to every subscriber right away, the file is
+    rewritten at most once per `debounce_s` with whatever the configuration is by then.
+    """
+    def __init__(self, path: str, debounce_s: float):
+        self.path = path
+        self.debounce_s = debounce_s
+
+        self.config: Optional[SessionConfig] = None
+        self.subscribers: Set[Callable[[SessionConfig], None]] = set()
+        self.write_task: Optional[asyncio.Task] = None
+
+    async def load(self):
+        if not os.path.exists(self.path):
+            shutil.copy('config.template.json', self.path)
+
+        async with aiofiles.open(self.path, mode='r', encoding='utf-8') as file:
+            self.config = SessionConfig.model_validate_json(await file.read())
+
+    def update(self, field: str, value: Any) -> SessionConfig:
+        cfg_json = self.config.model_dump()
+        curr = cfg_json
+        spl = field.split('.')
+        for part in spl[:-1]:
+            curr = curr[part]
+
+        curr[spl[-1]] = value
+
+        self.config = SessionConfig.model_validate(cfg_json)
+        logfire.info(f'Changed config field {field} -> {value}')
+
+        for callback in list(self.subscribers):
+            callback(self.config)
+
+        if self.write_task is None or self.write_task.done():
+            self.write_task = asyncio.create_task(self.write_later())
+
+        return self.config
+
+    def subscribe(self, callback: Callable[[SessionConfig], None]):
+        self.subscribers.add(callback)
+
+    def unsubscribe(self, callback: Callable[[SessionConfig], None]):
+        self.subscribers.discard(callback)
+
+    async def write_later(self):
+        await asyncio.sleep(self.debounce_s)
+        await self.write()
+
+    async def write(self):
+        try:
+            # Written next to the file and renamed, a crash mid-write never leaves a truncated config behind
+            async with aiofiles.open(f'{self.path}.tmp', 'w', encoding='utf-8') as f:
+                await f.write(self.config.model_dump_json())
+            await asyncio.to_thread(os.replace, f'{self.path}.tmp', self.path)
+        except Exception as e:
+            logfire.error(f'Could not persist configuration: {e}', _exc_info=True)
+
+    async def flush(self):
+        """Writes a pending change right away, on shutdown."""
+        if self.write_task and not self.write_task.done():
+            self.write_task.cancel()
+            await self.write()
+
 
-    async with aiofiles.open('/config.json', mode='r', encoding='utf-8') as file:
-        return SessionConfig.model_validate_json(await file.read())
+config_store = ConfigStore('/config.json', CONFIG_WRITE_DEBOUNCE_S)
@@ -0,0 +1,70 @@
+import struct
+from typing import Literal, List
+
+import numpy as np
+
+# Every binary WebSocket message starts with an 8 byte header: frame kind, 3 bytes of padding
+# (keeping the payload 4-byte aligned for typed array views on the client) and the sample rate.
+FRAME_HEADER = struct.Struct('<B3xI')
+
+FRAME_SPEECH_FLOAT32 = 0x01
+FRAME_SPEECH_INT16 = 0x02
+# Payload is a sequence of Opus packets, each prefixed with its uint16 length
+FRAME_SPEECH_OPUS = 0x03
+OPUS_PACKET_LENGTH = struct.Struct('<H')
+
+FRAME_MIC_FLOAT32 = 0x10
+# The client resamples microphone audio for the VAD, Whisper expects the same rate
+MIC_SAMPLE_RATE = 16000
+
+SpeechOutputFormat = Literal['json', 'float32', 'int16', 'opus']
+
+
+def encode_speech_frame(samples: np.ndarray, sample_rate: int, sample_format: Literal['float32', 'int16']) -> bytearray:
+    """Packs float32 samples into a single preallocated frame, converting straight into the payload."""
+    dtype = np.dtype('<i2') if sample_format == 'int16' else np.dtype('<f4')
+    frame = bytearray(FRAME_HEADER.size + samples.size * dtype.itemsize)
+    FRAME_HEADER.pack_into(
+        frame, 0,
+        FRAME_SPEECH_INT16 if sample_format == 'int16' else FRAME_SPEECH_FLOAT32,
+        sample_rate
+    )
+
+    payload = np.frombuffer(frame, dtype=dtype, offset=FRAME_HEADER.size)
+    if sample_format == 'int16':
+        np.multiply(np.clip(samples, -1.0, 1.0), 32767.0, out=payload, casting='unsafe')
+    else:
+        payload[:] = samples
+
+    return frame
+
+
+def encode_opus_frame(packets: List[bytes], sample_rate: int) -> bytearray:
+    frame = bytearray(FRAME_HEADER.size + sum(OPUS_PACKET_LENGTH.size + len(packet) for packet in packets))
+    FRAME_HEADER.pack_into(frame, 0, FRAME_SPEECH_OPUS, sample_rate)
+
+    offset = FRAME_HEADER.size
+    for packet in packets:
+        OPUS_PACKET_LENGTH.pack_into(frame, offset, len(packet))
+        offset += OPUS_PACKET_LENGTH.size
+        frame[offset:offset + len(packet)] = packet
+        offset += len(packet)
+
+    return frame
+
+
+def decode_mic_frame(data: bytes) -> memoryview | None:
+    """
+    Returns a view of the raw float32 PCM payload of a microphone frame, without copying it.
+    None for frames of another kind or sample rate, or whose payload is not whole samples.
+    """
+    if len(data) < FRAME_HEADER.size:
+        return None
+
+    kind, sample_rate = FRAME_HEADER.unpack_from(data)
+    if kind != FRAME_MIC_FLOAT32 or sample_rate != MIC_SAMPLE_RATE:
+        return None
+    if (len(data) - FRAME_HEADER.size) % 4:
+        return None
+
+    return memoryview(data)[FRAME_HEADER.size:]
@@ -1,7 +1,9 @@
-from typing import Union, Literal, Any
+from typing import Union, Literal, Any, Optional, List
 
 from pydantic import BaseModel, Field
 
+from models.frames import SpeechOutputFormat
+
 
 class WsReceiveSamplesEvent(BaseModel):
     type: Literal['samples']
@@ -33,7 +35,13 @@ class WsReceiveConfigChange(BaseModel):
 
 class WsReceiveFlowControl(BaseModel):
     type: Literal['flow_control']
-    command: Literal['pause_sending', 'resume_sending']
+    command: Literal['pause_sending', 'resume_sending', 'report']
+    buffered_ms: Optional[float] = None
+
+
+class WsReceiveSpeechOutputFormats(BaseModel):
+    type: Literal['speech_output_formats']
+    formats: List[SpeechOutputFormat]
 
 
 class WsReceiveEvent(BaseModel):
@@ -44,5 +52,6 @@ class WsReceiveEvent(BaseModel):
         WsReceiveTextPrompt,
         WsReceiveAgentSpeechEnd,
         WsReceiveConfigChange,
-        WsReceiveFlowControl
+        WsReceiveFlowControl,
+        WsReceiveSpeechOutputFormats
     ] = Field(discriminator='type')
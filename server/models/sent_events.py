@@ -1,9 +1,11 @@
-from typing import Literal, Union
+from typing import Literal, Union, List
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from models.base import Token, TranscriptionSegment
 from models.configuration import SessionConfig
+from models.frames import SpeechOutputFormat
+from utils.opus import OPUS_AVAILABLE
 
 
 class WsManualPromptEvent(BaseModel):
@@ -39,6 +41,10 @@ class WsSendSpeechSamplesEvent(BaseModel):
 
 class WsSendConfigurationEvent(BaseModel):
     configuration: SessionConfig
+    # Formats the server can encode speech in, the client answers with the ones it can decode
+    speech_output_formats: List[SpeechOutputFormat] = Field(
+        default_factory=lambda: ['json', 'float32', 'int16'] + (['opus'] if OPUS_AVAILABLE else [])
+    )
     type: Literal['configuration'] = 'configuration'
 
     model_config = dict(arbitrary_types_allowed=True)
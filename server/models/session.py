@@ -1,43 +1,82 @@
 import asyncio
 import datetime
-import json
-from dataclasses import dataclass
-from typing import Optional, Any
-from uuid import uuid4
-
-import aiofiles
-import logfire
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm.attributes import flag_modified
+import time
+from dataclasses import dataclass, field
+from typing import Optional, List, Dict
+
 from starlette.websockets import WebSocket
 
 from db.models import Chat
+from db.writer import chat_writer
 from models.configuration import SessionConfig
-from models.sent_events import WsSendEvent
+from models.frames import SpeechOutputFormat
+from models.sent_events import WsSendEvent, WsSendConfigurationEvent
+from utils.flow_control import PlayoutFlowControl
+from utils.opus import OPUS_AVAILABLE
+from utils.outbound import OutboundQueue
+from utils.perf import TurnTimeline
+
+
+@dataclass
+class Speculation:
+    """A reply generated from a stable partial transcript, held back from the client until committed."""
+    prompt: str
+    timeline: TurnTimeline
+    committed: asyncio.Event = field(default_factory=asyncio.Event)
+    started_at: float = field(default_factory=time.perf_counter)
+    tokens: int = 0
+
+    llm_task: Optional[asyncio.Task] = None
+    tts_task: Optional[asyncio.Task] = None
 
 
 @dataclass
 class Session:
     id: str
-    db: AsyncSession
     chat: Chat
+    messages: List[Dict[str, str]]
     config: SessionConfig
 
     client_socket: WebSocket = None
+    outbound: Optional[OutboundQueue] = None
     stt_task: Optional[asyncio.Task] = None
     llm_task: Optional[asyncio.Task] = None
     tts_task: Optional[asyncio.Task] = None
+    summary_task: Optional[asyncio.Task] = None
+    warmup_task: Optional[asyncio.Task] = None
 
     prompt: Optional[str] = None
+    user_speaking: bool = False
+    last_warmup_at: float = 0.0
 
     last_interaction: Optional[datetime.datetime] = None
 
-    speech_sending_lock = asyncio.Lock()
+    timeline: Optional[TurnTimeline] = None
+    speculation: Optional[Speculation] = None
+
+    flow_control: PlayoutFlowControl = field(default_factory=PlayoutFlowControl)
+    # Speech formats the client announced it can decode, None for clients that never announce
+    client_speech_formats: Optional[List[SpeechOutputFormat]] = None
+
+    def attach(self, socket: WebSocket):
+        self.client_socket = socket
+        self.outbound = OutboundQueue(socket)
+        self.outbound.start()
 
     async def send_event(self, event: WsSendEvent):
-        return await self.client_socket.send_json(event.model_dump())
+        self.outbound.send_event(event)
+
+    async def send_bytes(self, data: bytes):
+        self.outbound.send_bytes(data)
 
     def terminate(self):
+        if self.outbound:
+            self.outbound.stop()
+        if self.speculation:
+            if self.speculation.llm_task:
+                self.speculation.llm_task.cancel()
+            if self.speculation.tts_task:
+                self.speculation.tts_task.cancel()
         if self.stt_task:
             self.stt_task.cancel()
         if self.tts_task:
@@ -45,36 +84,38 @@ class Session:
         if self.llm_task:
             self.llm_task.cancel()
 
-    async def append_message(self, message):
-        if self.chat.id is None:
-            self.chat.id = self.chat._id or uuid4()
-            self.chat.header = message['content'][:30]
-            self.chat.started_at = datetime.datetime.now()
-
-            self.db.add(self.chat)
-            await self.db.commit()
-            await self.db.refresh(self.chat)
+    def speech_output_format(self) -> SpeechOutputFormat:
+        """The configured format, unless the server cannot encode it or the client cannot decode it."""
+        configured = self.config.app.speech_output_format
+        if configured == 'opus' and not OPUS_AVAILABLE:
+            configured = 'int16'
 
+        if self.client_speech_formats is None or configured in self.client_speech_formats:
+            return configured
+        return 'int16' if 'int16' in self.client_speech_formats else 'json'
 
-        self.chat.messages.append(message | {
-            'time': datetime.datetime.now().timestamp()
-        })
-        flag_modified(self.chat, 'messages')
-        await self.db.commit()
-        await self.db.refresh(self.chat)
-
-    async def set_config_field_from_event(self, field: str, value: Any):
-        cfg_json = self.config.model_dump()
-        curr = cfg_json
-        spl = field.split('.')
-        for part in spl[:-1]:
-            curr = curr[part]
+    def pending_timeline(self) -> TurnTimeline:
+        """Timeline of the turn being spoken, a new one is started once the previous turn reached the LLM."""
+        if self.timeline is None or 'llm_request' in self.timeline.marks:
+            self.timeline = TurnTimeline()
+        return self.timeline
 
-        curr[spl[-1]] = value
+    def append_message(self, message):
+        """Appends to the in-memory history right away, the database write happens behind it."""
+        now = datetime.datetime.now()
 
-        logfire.info(f'Changed config field {field} -> {value}')
+        if self.chat.started_at is None:
+            self.chat.header = message['content'][:30]
+            self.chat.started_at = now
+            chat_writer.save_chat(self.chat)
 
-        async with aiofiles.open('/config.json', 'w', encoding='utf-8') as f:
-            await f.write(json.dumps(cfg_json))
+        self.messages.append(message)
+        chat_writer.save_message(message | {
+            'chat_id': self.chat.id,
+            'created_at': now
+        })
 
-        self.config = SessionConfig.model_validate(cfg_json)
+    def apply_config(self, config: SessionConfig):
+        """Called by the config store whenever any session changes the configuration."""
+        self.config = config
+        self.outbound.send_event(WsSendConfigurationEvent(configuration=config))
@@ -1,4 +1,5 @@
-from typing import Dict, TypedDict
+import asyncio
+from typing import Dict, TypedDict, Iterator, Tuple
 
 from providers.base import BaseProvider, TextToSpeechProvider
 from providers.chatterbox import ChatterBoxAudioProvider
@@ -27,9 +28,28 @@ def initialize_providers() -> ProviderDict:
         p['tts']['chatterbox'] = ChatterBoxAudioProvider(config.CHATTERBOX_API_URL)
 
     if config.WHISPER_API_URL:
-        p['stt']['whisper'] = WhisperProvider(config.WHISPER_API_URL)
+        p['stt']['whisper'] = WhisperProvider(
+            config.WHISPER_API_URL,
+            binary_audio=config.WHISPER_BINARY_AUDIO,
+            warm_connections=config.WHISPER_WARM_CONNECTIONS,
+            multiplex=config.WHISPER_MULTIPLEX,
+            streams_per_connection=config.WHISPER_MULTIPLEX_STREAMS_PER_CONNECTION
+        )
 
     return p
 
 
 providers = initialize_providers()
+
+
+def iter_providers() -> Iterator[Tuple[str, BaseProvider]]:
+    for providers_of_type in providers.values():
+        yield from providers_of_type.items()
+
+
+async def startup_providers():
+    await asyncio.gather(*(provider.startup() for _, provider in iter_providers()))
+
+
+async def shutdown_providers():
+    await asyncio.gather(*(provider.shutdown() for _, provider in iter_providers()))
@@ -1,25 +1,93 @@
 from typing import AsyncGenerator
 
+import httpx
+import logfire
 import numpy as np
 from pydantic import BaseModel
 
+from config import config
+from providers.cache import speech_cache
+
+CACHED_CHUNK_SAMPLES = 4000
+
 
 class ProviderConfig(BaseModel):
     provider: str
 
 
+def create_http_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=config.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=config.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=config.HTTP_KEEPALIVE_EXPIRY_S
+        ),
+        # Only negotiated over TLS (ALPN), plain http:// backends keep using HTTP/1.1 keep-alive
+        http2=config.HTTP2_ENABLED
+    )
+
+
 class BaseProvider:
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.client = create_http_client()
+
+    async def startup(self):
+        """Opens the first pooled connection so that the first request of a session skips the handshake."""
+        try:
+            await self.health_status()
+        except Exception as e:
+            logfire.warning(f'Could not pre-warm {type(self).__name__}: {e}')
+
+    async def shutdown(self):
+        await self.client.aclose()
+
     async def health_status(self):
         raise NotImplementedError
 
 
-
 class TextToSpeechProvider(BaseProvider):
+    SAMPLE_RATE: int | None = None
+    # Local directory the voices are read from, watched for changes by the voice registry
+    VOICES_DIRECTORY: str | None = None
+
     async def get_voices(self):
         raise NotImplementedError
 
+    def voices_changed(self):
+        pass
+
+    async def voice_fingerprint(self, voice: str) -> str:
+        """Identifies the content of a voice for the speech cache, for voices that can change under the same name."""
+        return ''
+
     async def generate_audio(self, text: str, voice: str) -> bytearray:
         raise NotImplementedError
 
     async def generate_audio_stream(self, text: str, voice: str) -> AsyncGenerator[np.ndarray, None]:
         raise NotImplementedError
+
+    async def synthesize(self, text: str, voice: str) -> AsyncGenerator[np.ndarray, None]:
+        """Streams speech for the text, serving repeated sentences from the speech cache."""
+        if not speech_cache.cacheable(text):
+            async for samples in self.generate_audio_stream(text, voice):
+                yield samples
+            return
+
+        key = speech_cache.key(type(self).__name__, voice, text, await self.voice_fingerprint(voice))
+        cached = speech_cache.get(key)
+        if cached is not None:
+            for offset in range(0, len(cached), CACHED_CHUNK_SAMPLES):
+                yield cached[offset:offset + CACHED_CHUNK_SAMPLES]
+            return
+
+        chunks = []
+        async for samples in self.generate_audio_stream(text, voice):
+            chunks.append(samples)
+            yield samples
+
+        # Only reached by a stream that ran to its end, failed or interrupted ones are not cached
+        if chunks:
+            speech = np.concatenate(chunks).astype(np.float32, copy=False)
+            if speech.size:
+                await speech_cache.put(key, speech)
@@ -0,0 +1,150 @@
+import asyncio
+import hashlib
+import os
+import re
+import tempfile
+import unicodedata
+from collections import OrderedDict
+
+import logfire
+import numpy as np
+
+from config import config
+
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_text(text: str) -> str:
+    return WHITESPACE_RE.sub(' ', unicodedata.normalize('NFC', text)).strip()
+
+
+class SpeechCache:
+    """
+    Content-addressed LRU cache of synthesized float32 PCM with a byte budget.
+
+    With a directory configured the samples are stored as .npy files and served as
+    memory maps, so the budget then bounds disk usage rather than resident memory.
+    """
+    def __init__(self, max_bytes: int, directory: str | None = None, max_text_length: int = 200):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_text_length = max_text_length
+
+        self.entries: OrderedDict[str, np.ndarray] = OrderedDict()
+        self.size_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            self.load_directory()
+
+    def load_directory(self):
+        """Counts the files left by earlier runs against the budget, least recently written first."""
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith('.tmp'):
+                # A write that never got renamed into place
+                os.remove(entry.path)
+            elif entry.is_file() and entry.name.endswith('.npy'):
+                files.append((entry.stat().st_mtime, entry.name[:-len('.npy')]))
+
+        for _, key in sorted(files):
+            try:
+                samples = np.load(self.path(key), mmap_mode='r')
+            except (OSError, ValueError) as e:
+                # Most likely cut short by a shutdown during the write
+                logfire.warning(f'Removing unreadable cached speech {key}: {e}')
+                os.remove(self.path(key))
+                continue
+            self.insert(key, samples)
+
+    @staticmethod
+    def key(provider: str, voice: str, text: str, voice_fingerprint: str = '') -> str:
+        # The fingerprint of a voice's content keeps speech of a replaced voice file from being served
+        return hashlib.sha256(
+            f'{provider}\0{voice}\0{voice_fingerprint}\0{normalize_text(text)}'.encode('utf-8')
+        ).hexdigest()
+
+    def cacheable(self, text: str) -> bool:
+        return self.max_bytes > 0 and len(text) <= self.max_text_length
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.npy')
+
+    def get(self, key: str) -> np.ndarray | None:
+        samples = self.entries.get(key)
+
+        if samples is None and self.directory and os.path.exists(self.path(key)):
+            try:
+                samples = np.load(self.path(key), mmap_mode='r')
+                self.insert(key, samples)
+            except (OSError, ValueError) as e:
+                logfire.warning(f'Could not load cached speech {key}: {e}')
+                samples = None
+
+        if samples is None:
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return samples
+
+    async def put(self, key: str, samples: np.ndarray):
+        if samples.nbytes > self.max_bytes:
+            return
+
+        if self.directory:
+            await asyncio.to_thread(self.save, key, samples)
+            samples = np.load(self.path(key), mmap_mode='r')
+
+        self.insert(key, samples)
+
+    def save(self, key: str, samples: np.ndarray):
+        # Written next to the final path and renamed, a concurrent lookup never sees a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, samples)
+            os.replace(tmp_path, self.path(key))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def insert(self, key: str, samples: np.ndarray):
+        if key in self.entries:
+            self.size_bytes -= self.entries.pop(key).nbytes
+
+        self.entries[key] = samples
+        self.size_bytes += samples.nbytes
+
+        while self.size_bytes > self.max_bytes:
+            evicted_key, evicted = self.entries.popitem(last=False)
+            self.size_bytes -= evicted.nbytes
+            self.evictions += 1
+
+            if self.directory:
+                try:
+                    os.remove(self.path(evicted_key))
+                except FileNotFoundError:
+                    pass
+
+        logfire.debug(f'Speech cache holds {len(self.entries)} entries, {self.size_bytes} bytes')
+
+    def metrics(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'size_bytes': self.size_bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+
+speech_cache = SpeechCache(config.TTS_CACHE_MAX_BYTES, config.TTS_CACHE_DIRECTORY, config.TTS_CACHE_MAX_TEXT_LENGTH)
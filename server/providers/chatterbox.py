@@ -1,6 +1,7 @@
+import asyncio
+import hashlib
 import io
 import os
-from functools import lru_cache
 from typing import Literal
 
 import aiofiles
@@ -9,6 +10,7 @@ import numpy as np
 import scipy.io.wavfile as wav
 from pydantic import BaseModel
 
+from config import config
 from providers.base import TextToSpeechProvider
 
 
@@ -22,76 +24,87 @@ class ChatterBoxConfig(BaseModel):
 
 class ChatterBoxAudioProvider(TextToSpeechProvider):
     SAMPLE_RATE = 24000
+    VOICES_DIRECTORY = '/voices'
 
     def __init__(self, base_url):
-        self.base_url = base_url
+        super().__init__(base_url)
         self.voice_file_cache = {}
+        self.voice_fingerprints = {}
 
     async def get_voice_content(self, voice: str) -> bytes:
         if voice not in self.voice_file_cache:
-            async with aiofiles.open(f'/voices/{voice}.wav', mode='rb') as f:
+            async with aiofiles.open(f'{self.VOICES_DIRECTORY}/{voice}.wav', mode='rb') as f:
                 contents = await f.read()
 
             self.voice_file_cache[voice] = contents
 
         return self.voice_file_cache[voice]
 
+    async def voice_fingerprint(self, voice: str) -> str:
+        if voice not in self.voice_fingerprints:
+            self.voice_fingerprints[voice] = hashlib.sha256(await self.get_voice_content(voice)).hexdigest()
+
+        return self.voice_fingerprints[voice]
+
     async def generate_audio(self, text: str, voice: str) -> bytearray:
         voice_bytes = await self.get_voice_content(voice)
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f'{self.base_url}/v1/audio/speech/upload',
-                data=dict(
-                    input=text,
-                    exaggeration=0.6,
-                    speed=0.5,
-                    cfg_weight=0.5,
-                    temperature=0.7,
-                    response_format='wav'
-                ),
-                files={
-                    'voice_file': (f'{voice}.wav', voice_bytes, 'audio/wav')
-                },
-                timeout=10000
-            )
-            response.raise_for_status()
-            return bytearray(response.content)
+        response = await self.client.post(
+            f'{self.base_url}/v1/audio/speech/upload',
+            data=dict(
+                input=text,
+                exaggeration=0.6,
+                speed=0.5,
+                cfg_weight=0.5,
+                temperature=0.7,
+                response_format='wav'
+            ),
+            files={
+                'voice_file': (f'{voice}.wav', voice_bytes, 'audio/wav')
+            },
+            timeout=10000
+        )
+        response.raise_for_status()
+        return bytearray(response.content)
 
     async def generate_audio_stream(self, text: str, voice: str):
         voice_bytes = await self.get_voice_content(voice)
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(
-                f'{self.base_url}/v1/audio/speech/upload',
-                data=dict(
-                    input=text,
-                    exaggeration=0.6,
-                    speed=0.5,
-                    cfg_weight=0.5,
-                    temperature=0.7,
-                    response_format='wav'
-                ),
-                files={
-                    'voice_file': (f'{voice}.wav', voice_bytes, 'audio/wav')
-                },
-                timeout=10000
-            )
-            sample_rate, audio_data = wav.read(io.BytesIO(resp.content))
-            total_samples = audio_data.shape[0]
-
-            chunk_size = 4000
-            for prefix_len in range(0, total_samples, chunk_size):
-                samples: np.ndarray = audio_data[prefix_len:prefix_len + chunk_size]
-
-                yield samples  / 32768.0
-
-    @lru_cache
+        resp = await self.client.post(
+            f'{self.base_url}/v1/audio/speech/upload',
+            data=dict(
+                input=text,
+                exaggeration=0.6,
+                speed=0.5,
+                cfg_weight=0.5,
+                temperature=0.7,
+                response_format='wav'
+            ),
+            files={
+                'voice_file': (f'{voice}.wav', voice_bytes, 'audio/wav')
+            },
+            timeout=10000
+        )
+        resp.raise_for_status()
+        sample_rate, audio_data = wav.read(io.BytesIO(resp.content))
+        total_samples = audio_data.shape[0]
+
+        chunk_size = 4000
+        for prefix_len in range(0, total_samples, chunk_size):
+            samples: np.ndarray = audio_data[prefix_len:prefix_len + chunk_size]
+
+            yield samples.astype(np.float32) / 32768.0
+
     async def get_voices(self):
-        return [os.path.splitext(voice)[0] for voice in os.listdir('/voices') if voice.endswith('.wav')]
+        files = await asyncio.to_thread(os.listdir, self.VOICES_DIRECTORY)
+        return sorted(os.path.splitext(voice)[0] for voice in files if voice.endswith('.wav'))
+
+    def voices_changed(self):
+        # A voice file may have been replaced under the same name
+        self.voice_file_cache.clear()
+        self.voice_fingerprints.clear()
 
     async def health_status(self):
-        async with httpx.AsyncClient() as client:
-            try:
-                resp = await client.get(f'{self.base_url}/health', timeout=500)
-                return resp.json()['status']
-            except httpx.ConnectError:
-                return 'unhealthy'
+        try:
+            resp = await self.client.get(f'{self.base_url}/health', timeout=config.HEALTH_PROBE_TIMEOUT_S)
+            return resp.json()['status']
+        except httpx.HTTPError:
+            return 'unhealthy'
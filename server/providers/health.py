@@ -0,0 +1,114 @@
+import asyncio
+import time
+from collections import deque
+from typing import Dict, Deque, Optional, Set
+
+import logfire
+
+from config import config
+from providers import iter_providers
+from providers.base import BaseProvider
+from utils.perf import LatencyHistogram
+
+HEALTH_WINDOW = 20
+
+
+class ProviderHealth:
+    """Outcomes and latencies of the recent probes of one provider."""
+    def __init__(self, window: int = HEALTH_WINDOW):
+        self.status = 'unhealthy'
+        self.outcomes: Deque[bool] = deque(maxlen=window)
+        self.latency = LatencyHistogram(window=window)
+        self.checked_at: Optional[float] = None
+
+    def observe(self, status: str, latency_ms: float):
+        self.status = status
+        self.outcomes.append(status == 'healthy')
+        self.latency.observe(latency_ms)
+        self.checked_at = time.time()
+
+    def metrics(self):
+        return {
+            'status': self.status,
+            'availability': sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0,
+            'p50_ms': self.latency.percentile(0.5),
+            'p95_ms': self.latency.percentile(0.95),
+            'checked_at': self.checked_at
+        }
+
+
+class HealthMonitor:
+    """
+    Probes all providers concurrently on an interval and keeps their last status.
+
+    Clients read the cached snapshot or subscribe to changes of it, so however many of them
+    are connected, the backends only ever see one probe per interval.
+    """
+    def __init__(self, interval_s: float, timeout_s: float):
+        self.interval_s = interval_s
+        self.timeout_s = timeout_s
+
+        self.health: Dict[str, ProviderHealth] = {}
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+
+    async def run(self):
+        while True:
+            try:
+                await self.poll()
+            except Exception as e:
+                logfire.error(f'Error polling provider health: {e}', _exc_info=True)
+            await asyncio.sleep(self.interval_s)
+
+    async def probe(self, provider: BaseProvider) -> tuple[str, float]:
+        start = time.perf_counter()
+        try:
+            status = await asyncio.wait_for(provider.health_status(), self.timeout_s)
+        except Exception:
+            status = 'unhealthy'
+        return status, (time.perf_counter() - start) * 1000
+
+    async def poll(self):
+        named_providers = list(iter_providers())
+        results = await asyncio.gather(*(self.probe(provider) for _, provider in named_providers))
+
+        previous = self.snapshot()
+        for (name, _), (status, latency_ms) in zip(named_providers, results):
+            self.health.setdefault(name, ProviderHealth()).observe(status, latency_ms)
+
+        current = self.snapshot()
+        if current != previous:
+            logfire.info(f'Provider health changed: {current}')
+            for queue in self.subscribers:
+                self.publish(queue, current)
+
+    def snapshot(self) -> Dict[str, str]:
+        return {name: health.status for name, health in self.health.items()}
+
+    @staticmethod
+    def publish(queue: asyncio.Queue, snapshot: Dict[str, str]):
+        # Subscribers only care about the latest state, a slow one skips the ones in between
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(snapshot)
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=1)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+
+    def metrics(self):
+        return {name: health.metrics() for name, health in self.health.items()}
+
+
+health_monitor = HealthMonitor(config.HEALTH_POLL_INTERVAL_S, config.HEALTH_PROBE_TIMEOUT_S)
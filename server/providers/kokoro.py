@@ -4,7 +4,9 @@ import httpx
 import numpy as np
 from pydantic import BaseModel
 
+from config import config
 from providers.base import TextToSpeechProvider
+from utils.sound import pcm16_to_float32
 
 
 class KokoroConfig(BaseModel):
@@ -83,59 +85,54 @@ class KokoroConfig(BaseModel):
 class KokoroAudioProvider(TextToSpeechProvider):
     SAMPLE_RATE = 24000
 
-    def __init__(self, base_url):
-        self.base_url = base_url
-
     async def generate_audio(self, text: str, voice: str) -> bytearray:
         content = bytearray()
 
-        async with httpx.AsyncClient() as client:
-            async with client.stream(
-                    'POST',
-                    f'{self.base_url}/v1/audio/speech',
-                    json={
-                        "model": "kokoro",
-                        "input": text,
-                        "voice": voice,
-                        "response_format": "mp3",
-                        "stream": True,
-                    }
-            ) as resp:
-                chunk: bytes
-                async for chunk in resp.aiter_bytes(chunk_size=4096):
-                    content.extend(chunk)
+        async with self.client.stream(
+            'POST',
+            f'{self.base_url}/v1/audio/speech',
+            json={
+                "model": "kokoro",
+                "input": text,
+                "voice": voice,
+                "response_format": "mp3",
+                "stream": True,
+            }
+        ) as resp:
+            chunk: bytes
+            async for chunk in resp.aiter_bytes(chunk_size=4096):
+                content.extend(chunk)
 
         return content
 
 
     async def generate_audio_stream(self, text: str, voice: str) -> AsyncGenerator[np.ndarray, None]:
-        async with httpx.AsyncClient() as client:
-            async with client.stream(
-                'POST',
-                f'{self.base_url}/v1/audio/speech',
-                json={
-                    "model": "kokoro",
-                    "input": text,
-                    "voice": voice,
-                    "response_format": "wav",
-                    "stream": True,
-                }
-            ) as resp:
-                chunk: bytes
-                async for chunk in resp.aiter_bytes(chunk_size=4096):
-                    yield np.frombuffer(chunk, dtype=np.int16) / 32768.0
+        async with self.client.stream(
+            'POST',
+            f'{self.base_url}/v1/audio/speech',
+            json={
+                "model": "kokoro",
+                "input": text,
+                "voice": voice,
+                "response_format": "wav",
+                "stream": True,
+            }
+        ) as resp:
+            # An error body would otherwise be decoded as speech, and cached
+            resp.raise_for_status()
+            chunk: bytes
+            async for chunk in resp.aiter_bytes(chunk_size=4096):
+                yield pcm16_to_float32(chunk)
 
 
     async def get_voices(self):
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(f'{self.base_url}/v1/audio/voices')
-            return sorted(resp.json()['voices'])
+        resp = await self.client.get(f'{self.base_url}/v1/audio/voices')
+        return sorted(resp.json()['voices'])
 
 
     async def health_status(self):
-        async with httpx.AsyncClient() as client:
-            try:
-                resp = await client.get(f'{self.base_url}/health', timeout=500)
-                return resp.json()['status']
-            except httpx.ConnectError:
-                return 'unhealthy'
+        try:
+            resp = await self.client.get(f'{self.base_url}/health', timeout=config.HEALTH_PROBE_TIMEOUT_S)
+            return resp.json()['status']
+        except httpx.HTTPError:
+            return 'unhealthy'
@@ -0,0 +1,305 @@
+import asyncio
+import base64
+import json
+import random
+import uuid
+from typing import Dict, List, Optional, Set
+
+import logfire
+import websockets
+from websockets.exceptions import ConnectionClosed, InvalidHandshake
+
+from models.base import TranscriptionSegment
+
+RECONNECT_BACKOFF_INITIAL_S = 0.1
+RECONNECT_BACKOFF_MAX_S = 5.0
+# Bounds the audio kept for replays when a backend never answers a commit (~60s of client frames)
+MAX_REPLAY_ITEMS = 2000
+
+
+class WhisperChannel:
+    """
+    One websocket to the Whisper `/transcribe` endpoint that reconnects with exponential backoff.
+
+    A dedicated channel carries a single stream. A multiplexed one (opened with `?multiplex=1`)
+    carries many, the stream id is then sent with every message (JSON field, or a 16 byte prefix
+    of binary frames) and the transcriptions coming back are routed to the stream they belong to.
+    """
+    def __init__(self, url: str, multiplexed: bool):
+        self.url = url
+        self.multiplexed = multiplexed
+
+        self.socket: Optional[websockets.ClientConnection] = None
+        # Incremented with every new socket, streams use it to find out their audio has to be replayed
+        self.generation = 0
+        self.connected = asyncio.Event()
+        self.closed = False
+
+        self.streams: Dict[str, 'WhisperStream'] = {}
+        self.task: Optional[asyncio.Task] = None
+        self.replays: Set[asyncio.Task] = set()
+
+    async def open(self):
+        """Connects right away (raising on failure) and keeps the connection up from then on."""
+        await self.connect()
+        self.task = asyncio.create_task(self.run())
+
+    async def connect(self):
+        self.socket = await websockets.connect(self.url, max_size=None)
+        self.generation += 1
+        self.connected.set()
+
+    async def run(self):
+        backoff = RECONNECT_BACKOFF_INITIAL_S
+        while not self.closed:
+            if not self.connected.is_set():
+                try:
+                    await self.connect()
+                    logfire.info(f'Reconnected to {self.url}')
+
+                    # Streams waiting for a transcription would otherwise not send anything to trigger their replay
+                    for stream in self.streams.values():
+                        if stream.uncommitted:
+                            replay = asyncio.create_task(self.send(stream, []))
+                            self.replays.add(replay)
+                            replay.add_done_callback(self.replays.discard)
+                except (OSError, InvalidHandshake, asyncio.TimeoutError) as e:
+                    delay = backoff * (1 + random.random())
+                    logfire.warning(f'Could not connect to {self.url}: {e}, retrying in {delay:.2f}s')
+                    await asyncio.sleep(delay)
+                    backoff = min(backoff * 2, RECONNECT_BACKOFF_MAX_S)
+                    continue
+
+            try:
+                async for message in self.socket:
+                    try:
+                        self.dispatch(message)
+                        # Reset only once the backend works, a socket that fails right away keeps backing off
+                        backoff = RECONNECT_BACKOFF_INITIAL_S
+                    except ValueError as e:
+                        # Malformed JSON or a message that is not a transcription, the ones after it may be fine
+                        logfire.warning(f'Skipping unexpected message from {self.url}: {e}')
+            except ConnectionClosed:
+                pass
+            except Exception as e:
+                # Without a reader the streams on this socket would wait forever, start over on a new one
+                logfire.error(f'Error reading from {self.url}: {e}', _exc_info=True)
+                self.connected.clear()
+                try:
+                    await self.socket.close()
+                except Exception:
+                    pass
+                await asyncio.sleep(backoff * (1 + random.random()))
+                backoff = min(backoff * 2, RECONNECT_BACKOFF_MAX_S)
+
+            self.connected.clear()
+            if not self.closed:
+                logfire.warning(f'Connection to {self.url} lost')
+
+    def dispatch(self, message):
+        if not self.multiplexed:
+            for stream in self.streams.values():
+                stream.deliver(TranscriptionSegment.model_validate_json(message))
+            return
+
+        payload = json.loads(message)
+        if not isinstance(payload, dict):
+            raise ValueError(f'Expected a JSON object, got {type(payload).__name__}')
+        stream = self.streams.get(payload.pop('stream_id', None))
+        if stream is not None:
+            stream.deliver(TranscriptionSegment.model_validate(payload))
+
+    async def send(self, stream: 'WhisperStream', items: List):
+        """Sends the items, replaying the audio in progress first if the socket changed since the stream last used it."""
+        async with stream.lock:
+            while True:
+                await self.connected.wait()
+                generation = self.generation
+
+                try:
+                    if stream.generation not in (None, generation):
+                        # The socket was replaced, the new one has not seen the current utterance yet
+                        stream.skip_words = stream.delivered_words
+                        for replayed in stream.uncommitted:
+                            await self.socket.send(self.encode(stream, replayed))
+                    stream.generation = generation
+
+                    for samples in items:
+                        await self.socket.send(self.encode(stream, samples))
+                    return
+                except ConnectionClosed:
+                    self.connected.clear()
+
+    def encode(self, stream: 'WhisperStream', samples):
+        if samples is None:
+            payload = {'commit': True}
+        elif isinstance(samples, str):
+            payload = {'samples': samples}
+        elif stream.binary_audio:
+            # Raw float32 PCM straight from the client frame
+            return stream.id_bytes + samples if self.multiplexed else samples
+        else:
+            payload = {'samples': base64.b64encode(samples).decode('ascii')}
+
+        if self.multiplexed:
+            payload['stream_id'] = stream.id
+        return json.dumps(payload)
+
+    async def close_stream(self, stream: 'WhisperStream'):
+        self.streams.pop(stream.id, None)
+
+        if self.multiplexed and self.connected.is_set():
+            try:
+                await self.socket.send(json.dumps({'stream_id': stream.id, 'close': True}))
+            except ConnectionClosed:
+                pass
+
+    async def close(self):
+        self.closed = True
+        if self.task:
+            self.task.cancel()
+        for replay in list(self.replays):
+            replay.cancel()
+        if self.socket:
+            await self.socket.close()
+
+
+class WhisperStream:
+    """Transcription of a single session, audio is kept until its final transcription arrives for replays."""
+    def __init__(self, channel: WhisperChannel, binary_audio: bool):
+        self.channel = channel
+        self.binary_audio = binary_audio
+
+        self.id = str(uuid.uuid4())
+        self.id_bytes = uuid.UUID(self.id).bytes
+
+        self.results: asyncio.Queue[TranscriptionSegment] = asyncio.Queue()
+        self.lock = asyncio.Lock()
+        self.uncommitted: List = []
+        self.generation: Optional[int] = None
+
+        # Words of the current utterance already handed out, the replayed audio transcribes them again
+        self.delivered_words = 0
+        self.skip_words = 0
+
+    def deliver(self, segment: TranscriptionSegment):
+        if segment.final:
+            self.delivered_words = self.skip_words = 0
+            if None in self.uncommitted:
+                del self.uncommitted[:self.uncommitted.index(None) + 1]
+        elif segment.complete:
+            if self.skip_words > 0:
+                self.skip_words -= len(segment.words)
+                return
+            self.delivered_words += len(segment.words)
+
+        self.results.put_nowait(segment)
+
+    async def sender_task(self, received_speech_queue: asyncio.Queue):
+        try:
+            while True:
+                samples = await received_speech_queue.get()
+                await self.channel.send(self, [samples])
+                self.uncommitted.append(samples)
+                if len(self.uncommitted) > MAX_REPLAY_ITEMS:
+                    del self.uncommitted[:len(self.uncommitted) - MAX_REPLAY_ITEMS]
+
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logfire.error(f'Error sending audio to STT: {e}', _exc_info=True)
+
+
+class WhisperConnectionManager:
+    """
+    Hands out transcription streams over pre-opened sockets.
+
+    Without multiplexing every session gets a dedicated socket from a pool of `warm_connections`
+    that is refilled in the background, so the first utterance does not wait for a handshake.
+    With multiplexing sessions share up to `streams_per_connection` per socket.
+    """
+    def __init__(
+            self,
+            url: str,
+            binary_audio: bool = True,
+            warm_connections: int = 2,
+            multiplex: bool = False,
+            streams_per_connection: int = 64
+    ):
+        self.url = url
+        self.binary_audio = binary_audio
+        self.warm_connections = warm_connections
+        self.multiplex = multiplex
+        self.streams_per_connection = streams_per_connection
+
+        self.warm: List[WhisperChannel] = []
+        self.shared: List[WhisperChannel] = []
+        self.refill_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self.multiplex:
+            await self.acquire_shared()
+        else:
+            await self.refill()
+
+    async def stop(self):
+        if self.refill_task:
+            self.refill_task.cancel()
+
+        await asyncio.gather(*(channel.close() for channel in self.warm + self.shared), return_exceptions=True)
+        self.warm.clear()
+        self.shared.clear()
+
+    async def refill(self):
+        while len(self.warm) < self.warm_connections:
+            channel = WhisperChannel(self.url, multiplexed=False)
+            await channel.open()
+            self.warm.append(channel)
+
+    def schedule_refill(self):
+        if self.refill_task and not self.refill_task.done():
+            return
+
+        async def refill_quietly():
+            try:
+                await self.refill()
+            except Exception as e:
+                logfire.warning(f'Could not pre-open STT connections: {e}')
+
+        self.refill_task = asyncio.create_task(refill_quietly())
+
+    async def acquire_dedicated(self) -> WhisperChannel:
+        while self.warm:
+            channel = self.warm.pop()
+            if channel.connected.is_set():
+                self.schedule_refill()
+                return channel
+            await channel.close()
+
+        self.schedule_refill()
+        channel = WhisperChannel(self.url, multiplexed=False)
+        await channel.open()
+        return channel
+
+    async def acquire_shared(self) -> WhisperChannel:
+        available = [c for c in self.shared if len(c.streams) < self.streams_per_connection]
+        if available:
+            return min(available, key=lambda c: len(c.streams))
+
+        channel = WhisperChannel(f'{self.url}?multiplex=1', multiplexed=True)
+        await channel.open()
+        self.shared.append(channel)
+        return channel
+
+    async def open_stream(self) -> WhisperStream:
+        channel = await (self.acquire_shared() if self.multiplex else self.acquire_dedicated())
+
+        stream = WhisperStream(channel, self.binary_audio)
+        channel.streams[stream.id] = stream
+        return stream
+
+    async def close_stream(self, stream: WhisperStream):
+        await stream.channel.close_stream(stream)
+
+        if not stream.channel.multiplexed:
+            await stream.channel.close()
@@ -0,0 +1,104 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import logfire
+
+from config import config
+from providers import providers
+from providers.base import TextToSpeechProvider
+
+
+@dataclass
+class VoiceCatalog:
+    voices: List[str]
+    etag: str
+    fetched_at: float
+
+
+class VoiceRegistry:
+    """
+    Voices of every TTS provider, held in memory.
+
+    Catalogs are fetched at startup and refreshed every `ttl_s` in the background. Providers with
+    a local voices directory are also refreshed as soon as a file in it is added, removed or
+    modified, overwriting a file in place does not change the directory's own modification time.
+    """
+    def __init__(self, ttl_s: float, watch_interval_s: float):
+        self.ttl_s = ttl_s
+        self.watch_interval_s = watch_interval_s
+
+        self.catalogs: Dict[str, VoiceCatalog] = {}
+        self.attempted_at: Dict[str, float] = {}
+        self.directory_snapshots: Dict[str, Optional[Dict[str, Tuple[float, int]]]] = {}
+        self.task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        await asyncio.gather(*(self.refresh(name) for name in providers['tts']))
+        self.task = asyncio.create_task(self.run())
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.watch_interval_s)
+
+            for name, provider in providers['tts'].items():
+                if time.monotonic() - self.attempted_at.get(name, 0.0) > self.ttl_s:
+                    await self.refresh(name)
+                elif provider.VOICES_DIRECTORY and await self.directory_changed(provider.VOICES_DIRECTORY):
+                    logfire.info(f'Voices of {name} changed on disk')
+                    provider.voices_changed()
+                    await self.refresh(name)
+
+    @staticmethod
+    def snapshot(directory: str) -> Optional[Dict[str, Tuple[float, int]]]:
+        try:
+            with os.scandir(directory) as entries:
+                return {
+                    entry.name: (stat.st_mtime, stat.st_size)
+                    for entry in entries if entry.is_file() and (stat := entry.stat())
+                }
+        except OSError:
+            return None
+
+    async def directory_changed(self, directory: str) -> bool:
+        snapshot = await asyncio.to_thread(self.snapshot, directory)
+
+        previous = self.directory_snapshots.get(directory)
+        self.directory_snapshots[directory] = snapshot
+        return previous != snapshot
+
+    async def refresh(self, name: str) -> Optional[VoiceCatalog]:
+        provider: TextToSpeechProvider = providers['tts'][name]
+        self.attempted_at[name] = time.monotonic()
+        if provider.VOICES_DIRECTORY and provider.VOICES_DIRECTORY not in self.directory_snapshots:
+            # Changes are detected against the state the catalog was first read from
+            await self.directory_changed(provider.VOICES_DIRECTORY)
+
+        try:
+            voices = await provider.get_voices()
+        except Exception as e:
+            # Keep serving the last known catalog, the next round tries again
+            logfire.warning(f'Could not fetch voices of {name}: {e}')
+            return self.catalogs.get(name)
+
+        etag = hashlib.sha1(json.dumps(voices).encode()).hexdigest()
+        self.catalogs[name] = VoiceCatalog(voices, f'"{etag}"', time.monotonic())
+        return self.catalogs[name]
+
+    async def get(self, name: str) -> Optional[VoiceCatalog]:
+        """Raises KeyError for unknown providers, None when the voices could not be fetched yet."""
+        if name not in providers['tts']:
+            raise KeyError(name)
+
+        return self.catalogs.get(name) or await self.refresh(name)
+
+
+voice_registry = VoiceRegistry(config.VOICES_TTL_S, config.VOICES_WATCH_INTERVAL_S)
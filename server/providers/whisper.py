@@ -1,47 +1,58 @@
 import asyncio
-import json
 from typing import AsyncGenerator
 
 import httpx
-import websockets
+import logfire
 
+from config import config
 from models.base import TranscriptionSegment
 from providers.base import BaseProvider
+from providers.stt_connections import WhisperConnectionManager
 
 
 class WhisperProvider(BaseProvider):
-    def __init__(self, base_url):
-        self.base_url = base_url
+    def __init__(
+            self,
+            base_url,
+            binary_audio: bool = True,
+            warm_connections: int = 2,
+            multiplex: bool = False,
+            streams_per_connection: int = 64
+    ):
+        super().__init__(base_url)
+        self.connections = WhisperConnectionManager(
+            f'ws://{base_url}/transcribe',
+            binary_audio=binary_audio,
+            warm_connections=warm_connections,
+            multiplex=multiplex,
+            streams_per_connection=streams_per_connection
+        )
+
+    async def startup(self):
+        await super().startup()
+        try:
+            await self.connections.start()
+        except Exception as e:
+            logfire.warning(f'Could not pre-open STT connections: {e}')
+
+    async def shutdown(self):
+        await self.connections.stop()
+        await super().shutdown()
 
     async def health_status(self):
         try:
-            async with httpx.AsyncClient() as client:
-                resp = await client.get(f'http://{self.base_url}/health', timeout=500)
-                return resp.json()['status']
-        except httpx.ConnectError:
+            resp = await self.client.get(f'http://{self.base_url}/health', timeout=config.HEALTH_PROBE_TIMEOUT_S)
+            return resp.json()['status']
+        except httpx.HTTPError:
             return 'unhealthy'
 
-    @staticmethod
-    async def sender_task(stt_socket, received_speech_queue):
-        while True:
-            samples = await received_speech_queue.get()
-            if samples is None:
-                await stt_socket.send(json.dumps({
-                    'commit': True
-                }))
-            else:
-                await stt_socket.send(json.dumps({
-                    'samples': samples
-                }))
-
-
     async def continuous_transcription(self, received_speech_queue: asyncio.Queue) -> AsyncGenerator[TranscriptionSegment, None]:
-        async for stt_socket in websockets.connect(f'ws://{self.base_url}/transcribe'):
-            sender = asyncio.create_task(WhisperProvider.sender_task(stt_socket, received_speech_queue))
-
-            try:
-                async for message in stt_socket:
-                    yield TranscriptionSegment.model_validate_json(message)
+        stream = await self.connections.open_stream()
+        sender = asyncio.create_task(stream.sender_task(received_speech_queue))
 
-            except websockets.exceptions.ConnectionClosedError:
-                sender.cancel()
+        try:
+            while True:
+                yield await stream.results.get()
+        finally:
+            sender.cancel()
+            await self.connections.close_stream(stream)
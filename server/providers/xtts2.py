@@ -5,6 +5,7 @@ import httpx
 import numpy as np
 import scipy
 
+from config import config
 from providers.base import TextToSpeechProvider
 
 
@@ -12,8 +13,7 @@ XTTS_OUTPUT_SAMPLING_RATE = 24000
 
 
 class XTTSProvider(TextToSpeechProvider):
-    def __init__(self, base_url):
-        self.base_url = base_url
+    SAMPLE_RATE = XTTS_OUTPUT_SAMPLING_RATE
 
     async def generate_audio(self, text, voice) -> bytearray:
         all_samples = np.array([], np.float32)
@@ -27,20 +27,19 @@ class XTTSProvider(TextToSpeechProvider):
             'output_file': 'whatever.wav'
         }
 
-        async with httpx.AsyncClient() as client:
-            async with client.stream(
-                    'GET',
-                    f'{self.base_url}/api/tts-generate-streaming?{urlencode(params)}'
-            ) as resp:
-                # buffer = []
-                async for chunk in resp.aiter_bytes(XTTS_OUTPUT_SAMPLING_RATE):
-                    samples = np.frombuffer(chunk, dtype=np.int16)
-                    samples = samples / np.iinfo(np.int16).max
-                    samples = scipy.signal.resample(
-                        samples,
-                        round(samples.shape[0] * (48000 / XTTS_OUTPUT_SAMPLING_RATE))
-                    )
-                    all_samples = np.concatenate((all_samples, samples), axis=0)
+        async with self.client.stream(
+                'GET',
+                f'{self.base_url}/api/tts-generate-streaming?{urlencode(params)}'
+        ) as resp:
+            # buffer = []
+            async for chunk in resp.aiter_bytes(XTTS_OUTPUT_SAMPLING_RATE):
+                samples = np.frombuffer(chunk, dtype=np.int16)
+                samples = samples / np.iinfo(np.int16).max
+                samples = scipy.signal.resample(
+                    samples,
+                    round(samples.shape[0] * (48000 / XTTS_OUTPUT_SAMPLING_RATE))
+                )
+                all_samples = np.concatenate((all_samples, samples), axis=0)
 
         filename = f'/tts_output/{_id}.wav'
         scipy.io.wavfile.write(filename, 48000, all_samples.astype(np.float32))
@@ -48,12 +47,13 @@ class XTTSProvider(TextToSpeechProvider):
         return f'{_id}.wav'
 
     async def health_status(self):
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(f'{self.base_url}/api/health', timeout=500)
-            return sorted(resp.json()['voices'])
+        try:
+            resp = await self.client.get(f'{self.base_url}/api/health', timeout=config.HEALTH_PROBE_TIMEOUT_S)
+            return 'healthy' if resp.is_success else 'unhealthy'
+        except httpx.HTTPError:
+            return 'unhealthy'
 
 
     async def get_voices(self):
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(f'{self.base_url}/api/voices')
-            return sorted(resp.json()['voices'])
+        resp = await self.client.get(f'{self.base_url}/api/voices')
+        return sorted(resp.json()['voices'])
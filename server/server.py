@@ -1,5 +1,7 @@
 import asyncio
+import json
 import logging
+from contextlib import asynccontextmanager
 from datetime import datetime
 from uuid import uuid4, UUID
 
@@ -12,23 +14,47 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.middleware.cors import CORSMiddleware
 from starlette.staticfiles import StaticFiles
 
-from db.models import Chat
+from db.models import Chat, ChatMessage
 from db.session import get_db
+from db.writer import chat_writer
 from endpoints.audio import audio_router
 from endpoints.chat import chat_router
-from models.configuration import load_config
+from endpoints.metrics import metrics_router
+from models.configuration import config_store
+from models.frames import decode_mic_frame
 from models.received_events import WsReceiveSamplesEvent, WsReceiveEvent, WsReceiveSpeechEndEvent, \
     WsReceiveTextPrompt, WsReceiveSpeechPromptEvent, WsReceiveAgentSpeechEnd, WsReceiveConfigChange, \
-    WsReceiveFlowControl
+    WsReceiveFlowControl, WsReceiveSpeechOutputFormats
 from models.sent_events import WsManualPromptEvent, WsSendConfigurationEvent
 from models.session import Session
-from providers import providers
-from tasks.coordination import trigger_agent_response
+from providers import startup_providers, shutdown_providers
+from providers.health import health_monitor
+from providers.voices import voice_registry
+from tasks.coordination import trigger_agent_response, discard_speculation
+from tasks.llm import schedule_prefix_warmup
 from tasks.stt import stt_task
+from utils.perf import event_loop_monitor
 from utils.validation import should_agent_respond
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    await config_store.load()
+    chat_writer.start()
+    event_loop_monitor.start()
+    await startup_providers()
+    health_monitor.start()
+    await voice_registry.start()
+    yield
+    voice_registry.stop()
+    health_monitor.stop()
+    await shutdown_providers()
+    event_loop_monitor.stop()
+    await chat_writer.stop()
+    await config_store.flush()
+
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -42,6 +68,7 @@ logfire.instrument_fastapi(app)
 
 app.include_router(chat_router)
 app.include_router(audio_router)
+app.include_router(metrics_router)
 
 app.mount('/audio', StaticFiles(directory='/tts_output'), name='tts-output')
 
@@ -50,16 +77,28 @@ app.mount('/audio', StaticFiles(directory='/tts_output'), name='tts-output')
 async def health_endpoint(websocket: WebSocket):
     await websocket.accept()
 
+    changes = health_monitor.subscribe()
+
+    async def push_changes():
+        try:
+            while True:
+                await websocket.send_json(await changes.get())
+        except starlette.websockets.WebSocketDisconnect:
+            pass
+        except Exception as e:
+            logfire.error(f'Could not push provider health: {e}', _exc_info=True)
+
+    # The only writer of the socket, replies to requests for the snapshot are queued for it as well
+    pusher = asyncio.create_task(push_changes())
     try:
-        while True:
+        while not pusher.done():
             await websocket.receive_json()
-            await websocket.send_json({
-                provider_name: await provider.health_status()
-                for provider_type, providers_of_type in providers.items()
-                for provider_name, provider in providers_of_type.items()
-            })
+            health_monitor.publish(changes, health_monitor.snapshot())
     except starlette.websockets.WebSocketDisconnect:
         pass
+    finally:
+        pusher.cancel()
+        health_monitor.unsubscribe(changes)
 
 
 @app.websocket("/ws/chat/{chat_id}")
@@ -74,20 +113,27 @@ async def chat_endpoint(chat_id: str, websocket: WebSocket, db: AsyncSession = D
     results = await db.execute(query)
     chat = results.scalar()
 
+    messages = []
     if chat is None:
         logfire.info(f"New chat initiated")
-        chat = Chat()
-        chat._id = UUID(chat_id)
+        chat = Chat(id=UUID(chat_id), summarized_messages=0)
+    else:
+        query = select(ChatMessage.role, ChatMessage.content).filter(ChatMessage.chat_id == chat.id).order_by(ChatMessage.id)
+        results = await db.execute(query)
+        messages = [{'role': role, 'content': content} for role, content in results]
+
+    # The websocket lives for the whole conversation, do not hold a pooled connection for it
+    await db.close()
 
-    config = await load_config()
     session = Session(
         session_id,
-        db,
         chat,
-        config
+        messages,
+        config_store.config
     )
 
-    session.client_socket = websocket
+    session.attach(websocket)
+    config_store.subscribe(session.apply_config)
 
     await session.send_event(
         WsSendConfigurationEvent(configuration=session.config)
@@ -97,7 +143,27 @@ async def chat_endpoint(chat_id: str, websocket: WebSocket, db: AsyncSession = D
         received_speech_queue = asyncio.Queue()
 
         while True:
-            event_data = await websocket.receive_json()
+            message = await websocket.receive()
+            if message['type'] == 'websocket.disconnect':
+                raise starlette.websockets.WebSocketDisconnect(message.get('code', 1000))
+
+            if message.get('bytes') is not None:
+                # Binary frames carry microphone PCM and skip event validation entirely
+                samples = decode_mic_frame(message['bytes'])
+                if samples is None:
+                    logfire.warning('Received invalid binary frame')
+                    continue
+
+                if session.stt_task is None:
+                    session.stt_task = asyncio.create_task(stt_task(session, received_speech_queue))
+                received_speech_queue.put_nowait(samples)
+
+                if not session.user_speaking:
+                    session.user_speaking = True
+                    schedule_prefix_warmup(session)
+                continue
+
+            event_data = json.loads(message['text'])
 
             try:
                 event = WsReceiveEvent.model_validate({'event': event_data}).event
@@ -107,7 +173,13 @@ async def chat_endpoint(chat_id: str, websocket: WebSocket, db: AsyncSession = D
                         session.stt_task = asyncio.create_task(stt_task(session, received_speech_queue))
                     await received_speech_queue.put(event.data)
 
+                    if not session.user_speaking:
+                        session.user_speaking = True
+                        schedule_prefix_warmup(session)
+
                 elif isinstance(event, WsReceiveSpeechEndEvent):
+                    session.user_speaking = False
+                    session.pending_timeline().mark('speech_end', overwrite=True)
                     await received_speech_queue.put(None)
 
                 elif isinstance(event, WsReceiveTextPrompt):
@@ -130,6 +202,7 @@ async def chat_endpoint(chat_id: str, websocket: WebSocket, db: AsyncSession = D
                             trigger_agent_response(session)
                         else:
                             session.prompt = None
+                            discard_speculation(session)
                             # await session.send_event({
                             #     'type': 'user_speech_transcription_invalidation'
                             # })
@@ -138,18 +211,22 @@ async def chat_endpoint(chat_id: str, websocket: WebSocket, db: AsyncSession = D
                     session.last_interaction = datetime.now()
 
                 elif isinstance(event, WsReceiveConfigChange):
-                    await session.set_config_field_from_event(event.path, event.value)
-                    await session.send_event(
-                        WsSendConfigurationEvent(configuration=session.config)
-                    )
+                    # Every live session, this one included, gets the new configuration sent
+                    config_store.update(event.path, event.value)
+
+                elif isinstance(event, WsReceiveSpeechOutputFormats):
+                    session.client_speech_formats = event.formats
 
                 elif isinstance(event, WsReceiveFlowControl):
+                    if event.buffered_ms is not None:
+                        session.flow_control.report(event.buffered_ms)
+
                     if event.command == 'pause_sending':
                         logfire.debug('Pausing sending')
-                        await session.speech_sending_lock.acquire()
+                        session.flow_control.pause()
                     elif event.command == 'resume_sending':
                         logfire.debug('Resuming sending')
-                        session.speech_sending_lock.release()
+                        session.flow_control.resume()
 
             except pydantic.ValidationError:
                 logfire.warning(f'Received invalid socket event: {event_data}')
@@ -163,4 +240,5 @@ async def chat_endpoint(chat_id: str, websocket: WebSocket, db: AsyncSession = D
 
     finally:
         logfire.info(f'Terminating client')
+        config_store.unsubscribe(session.apply_config)
         session.terminate()
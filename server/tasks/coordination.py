@@ -1,10 +1,18 @@
 import asyncio
+import re
+import time
 
 import logfire
 
 from tasks.llm import llm_query_task
-from models.session import Session
+from models.session import Session, Speculation
+from utils.perf import TurnTimeline, speculation_metrics
 
+PUNCTUATION_RE = re.compile(r'[^\w\s]')
+
+
+def normalize_prompt(prompt: str | None) -> str:
+    return ' '.join(PUNCTUATION_RE.sub('', (prompt or '').lower()).split())
 
 
 def trigger_agent_response(session: Session):
@@ -21,4 +29,62 @@ def trigger_agent_response(session: Session):
 
     logfire.info(f'Accepted prompt {prompt}')
 
-    session.llm_task = asyncio.create_task(llm_query_task(session, prompt))
+    speculation = session.speculation
+    if speculation is not None and normalize_prompt(speculation.prompt) == normalize_prompt(prompt):
+        speculation.prompt = prompt
+        commit_speculation(session, speculation)
+        return
+
+    discard_speculation(session)
+    session.llm_task = asyncio.create_task(llm_query_task(session, prompt, session.pending_timeline()))
+
+
+def commit_speculation(session: Session, speculation: Speculation):
+    session.speculation = None
+
+    # The speculative reply started before the speech side of the turn was over
+    pending = session.pending_timeline()
+    speculation.timeline.marks.update(pending.marks)
+    speculation.timeline.providers.update(pending.providers)
+    speculation.timeline.mark('llm_request')
+    session.timeline = speculation.timeline
+
+    speculation.committed.set()
+    session.llm_task = speculation.llm_task
+    session.tts_task = speculation.tts_task
+
+    saved = time.perf_counter() - speculation.started_at
+    speculation_metrics.record_commit(saved)
+    logfire.info(f'Committed speculative reply to "{speculation.prompt}", {saved * 1000:.0f}ms ahead')
+
+
+def discard_speculation(session: Session):
+    speculation = session.speculation
+    if speculation is None:
+        return
+    session.speculation = None
+
+    if speculation.llm_task:
+        speculation.llm_task.cancel()
+    if speculation.tts_task:
+        speculation.tts_task.cancel()
+
+    speculation_metrics.record_discard(speculation.tokens)
+    logfire.info(f'Discarded speculative reply to "{speculation.prompt}" after {speculation.tokens} tokens')
+
+
+def start_speculation(session: Session, prompt: str):
+    discard_speculation(session)
+
+    speculation = Speculation(prompt, TurnTimeline())
+    speculation.llm_task = asyncio.create_task(llm_query_task(session, prompt, speculation.timeline, speculation))
+    session.speculation = speculation
+
+    speculation_metrics.started += 1
+    logfire.info(f'Speculatively answering "{prompt}"')
+
+
+async def speculate_when_stable(session: Session, prompt: str):
+    """Starts a speculative reply once the transcript has not changed for the configured window."""
+    await asyncio.sleep(session.config.app.speculative_stability_ms / 1000)
+    start_speculation(session, prompt)
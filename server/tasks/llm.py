@@ -1,7 +1,7 @@
 import asyncio
-import re
+import time
 from datetime import datetime
-from typing import Tuple, Literal, Union, AsyncGenerator, Iterable
+from typing import Tuple, Literal, Union, AsyncGenerator, Iterable, Optional
 
 import logfire
 from openai import AsyncClient
@@ -9,57 +9,148 @@ from openai.types.chat import ChatCompletionMessageParam
 from openai.types.chat.chat_completion_chunk import Choice
 
 from config import config
+from db.writer import chat_writer
 from models.base import Token, Message
 from models.sent_events import WsSendTokenEvent
-from models.session import Session
+from models.session import Session, Speculation
 from tasks.tts import tts_task
-from utils.sanitization import clean_text_for_tts
+from utils.context import ContextBuilder
+from utils.perf import TurnTimeline, latency_metrics, speculation_metrics, ElapsedTime
+from utils.sanitization import StreamingTextSanitizer, collapse_whitespace
+from utils.segmentation import SentenceSegmenter
 
 TokenTuple = Tuple[Literal['token'], Choice]
 SentenceTuple = Tuple[Literal['sentence'], str]
 
 client = AsyncClient(base_url=config.ASSISTANT_API_URL, api_key='none')
+summary_client = AsyncClient(base_url=config.LLM_SUMMARY_API_URL or config.ASSISTANT_API_URL, api_key='none')
 
+context_builder = ContextBuilder(config.LLM_CONTEXT_TOKEN_BUDGET, config.LLM_CONTEXT_MIN_RECENT_MESSAGES)
 
-async def llm_query_task(session: Session, prompt: str):
+SUMMARY_INSTRUCTIONS = (
+    'You maintain a running summary of a voice conversation between a user and an AI assistant. '
+    'Merge the previous summary with the new part of the conversation into a single updated summary. '
+    'Keep facts about the user, their requests, decisions and open questions, drop small talk. '
+    'Answer with the summary only, in at most 200 words.'
+)
+
+
+async def llm_query_task(session: Session, prompt: str, timeline: TurnTimeline, speculation: Optional[Speculation] = None):
+    """
+    With a speculation the reply is generated before the prompt is final. Tokens are then held back
+    and the history is left untouched until the speculation gets committed.
+    """
     try:
-        await session.append_message({
+        user_message = {
             'role': 'user',
             'content': prompt
-        })
-
+        }
         llm_response_queue = asyncio.Queue()
+        voice_output = session.config.app.voice_output_enabled
+
+        def start_tts():
+            task = asyncio.create_task(tts_task(session, llm_response_queue, timeline, speculation and speculation.committed))
+            if speculation and not speculation.committed.is_set():
+                speculation.tts_task = task
+            else:
+                session.tts_task = task
+
+        async def send_token(token: str):
+            await session.send_event(WsSendTokenEvent(
+                token=Token(
+                    message=Message(
+                        role='assistant',
+                        content=token
+                    )
+                )
+            ))
+
+        held_tokens = []
+        released = speculation is None
+
+        async def release():
+            nonlocal released
+            released = True
 
-        if session.config.app.voice_output_enabled:
-            session.tts_task = asyncio.create_task(tts_task(session, llm_response_queue))
+            # The committed prompt can differ from the speculative one in punctuation and casing
+            session.append_message(user_message | {'content': speculation.prompt})
+            if voice_output and speculation.tts_task is None:
+                start_tts()
+            for held_token in held_tokens:
+                await send_token(held_token)
+            held_tokens.clear()
+
+        if speculation is None:
+            session.append_message(user_message)
+            context = context_builder.build(session.messages, session.chat.summary, session.chat.summarized_messages or 0)
+        else:
+            context = context_builder.build(
+                session.messages + [user_message], session.chat.summary, session.chat.summarized_messages or 0
+            )
+
+        if voice_output and (speculation is None or session.config.app.speculative_tts_enabled):
+            start_tts()
 
         complete_response = ""
 
-        async for resp_type, content in generate_llm_response(session.chat.messages):
-            if resp_type == 'token':
-                content: Choice
+        timeline.providers['llm'] = 'assistant'
+        if speculation is None:
+            timeline.mark('llm_request')
 
-                complete_response += content.delta.content
+        # Speculative requests stop before running any tool, tools can have side effects the user never asked for
+        speculative = speculation is not None
+        while True:
+            deferred = False
+            async for resp_type, content in generate_llm_response(context, speculative):
+                if resp_type == 'token':
+                    content: Choice
 
-                await session.send_event(WsSendTokenEvent(
-                    token=Token(
-                        message=Message(
-                            role='assistant',
-                            content=content.delta.content
-                        )
-                    )
-                ))
+                    if content.finish_reason == 'tool_calls':
+                        deferred = True
 
-            elif resp_type == 'sentence':
-                content: str
+                    timeline.mark('llm_first_token')
+                    complete_response += content.delta.content
 
-                cleaned = clean_text_for_tts(content)
+                    if speculation is not None:
+                        speculation.tokens += 1
+                        speculation_metrics.tokens_generated += 1
 
-                if len(cleaned.strip()) > 2:
-                    logfire.info(f'Adding to TTS queue {cleaned}')
-                    await llm_response_queue.put(cleaned)
+                    if not released and speculation.committed.is_set():
+                        await release()
 
-        await session.append_message({
+                    if released:
+                        await send_token(content.delta.content)
+                    else:
+                        held_tokens.append(content.delta.content)
+
+                elif resp_type == 'sentence':
+                    content: str
+
+                    cleaned = collapse_whitespace(content)
+
+                    if len(cleaned) > 2:
+                        logfire.info(f'Adding to TTS queue {cleaned}')
+                        timeline.mark('first_sentence')
+                        await llm_response_queue.put(cleaned)
+
+            if not deferred:
+                break
+
+            # Runs the request again with tools once the prompt is final, a discard cancels this task meanwhile
+            logfire.info(f'Speculative reply to "{speculation.prompt}" needs a tool, waiting for the final prompt')
+            speculation_metrics.tool_deferrals += 1
+            await speculation.committed.wait()
+            speculative = False
+            if not released:
+                # Text leading up to the tool call is generated again
+                held_tokens.clear()
+                complete_response = ""
+
+        if not released:
+            await speculation.committed.wait()
+            await release()
+
+        session.append_message({
             'role': 'assistant',
             'content': ''.join(complete_response)
         })
@@ -73,31 +164,116 @@ async def llm_query_task(session: Session, prompt: str):
 
         await llm_response_queue.put(None)
 
+        if not session.config.app.voice_output_enabled:
+            latency_metrics.record_turn(timeline)
+
+        schedule_summary(session)
+
     except asyncio.CancelledError:
         logfire.info('LLM task cancelled')
     except Exception as e:
         logfire.error(f'Error in LLM task: {e}', _exc_info=True)
 
 
-async def generate_llm_response(messages: Iterable[ChatCompletionMessageParam]) -> AsyncGenerator[Union[TokenTuple, SentenceTuple], None]:
-    sentence_buffer = ""
+def schedule_prefix_warmup(session: Session):
+    """Warms the LLM prefix cache with the history of the upcoming turn, at most once per configured interval."""
+    if not session.config.app.prefix_warmup_enabled:
+        return
+    if session.llm_task and not session.llm_task.done():
+        return
+    if session.warmup_task and not session.warmup_task.done():
+        return
+
+    now = time.monotonic()
+    if (now - session.last_warmup_at) * 1000 < session.config.app.prefix_warmup_interval_ms:
+        return
+
+    session.last_warmup_at = now
+    session.warmup_task = asyncio.create_task(prefix_warmup_task(session))
+
+
+async def prefix_warmup_task(session: Session):
+    # The same prefix llm_query_task builds, only the upcoming user message is missing
+    context = context_builder.build(session.messages, session.chat.summary, session.chat.summarized_messages or 0)
+
+    try:
+        with ElapsedTime('LLM prefix warm-up'):
+            await client.chat.completions.create(
+                model='anything',
+                messages=context,
+                max_tokens=1,
+                stream=False
+            )
+    except asyncio.CancelledError:
+        pass
+    except Exception as e:
+        logfire.warning(f'LLM prefix warm-up failed: {e}')
+
+
+def schedule_summary(session: Session):
+    if session.summary_task and not session.summary_task.done():
+        return
+
+    cutoff = context_builder.summarization_cutoff(session.messages, session.chat.summarized_messages or 0)
+    if cutoff is not None:
+        session.summary_task = asyncio.create_task(summarize_history_task(session, cutoff))
+
+
+async def summarize_history_task(session: Session, cutoff: int):
+    """Folds the messages up to `cutoff` into the rolling summary of the chat, off the response path."""
+    chat = session.chat
+    start = chat.summarized_messages or 0
+
+    transcript = '\n'.join(f'{m["role"]}: {m["content"]}' for m in session.messages[start:cutoff])
+    previous = chat.summary or 'None yet.'
+
+    try:
+        summary = ''
+        async for part in await summary_client.chat.completions.create(
+                model=config.LLM_SUMMARY_MODEL,
+                messages=[
+                    {'role': 'system', 'content': SUMMARY_INSTRUCTIONS},
+                    {'role': 'user', 'content': f'Previous summary:\n{previous}\n\nNew part of the conversation:\n{transcript}'}
+                ],
+                stream=True
+        ):
+            summary += part.choices[0].delta.content or ''
+
+        summary = summary.strip()
+        if not summary:
+            return
+
+        chat.summary, chat.summarized_messages = summary, cutoff
+        chat_writer.save_summary(chat)
+
+        logfire.info(f'Summarized {cutoff - start} messages of chat {chat.id}, {cutoff} summarized in total')
+
+    except asyncio.CancelledError:
+        logfire.info('Summary task cancelled')
+    except Exception as e:
+        logfire.error(f'Error in summary task: {e}', _exc_info=True)
+
+
+async def generate_llm_response(
+        messages: Iterable[ChatCompletionMessageParam],
+        speculative: bool = False
+) -> AsyncGenerator[Union[TokenTuple, SentenceTuple], None]:
+    """A speculative reply ends with finish reason `tool_calls` where the assistant would call a tool."""
+    sanitizer = StreamingTextSanitizer()
+    segmenter = SentenceSegmenter()
     async for part in await client.chat.completions.create(
             model='anything',
             messages=messages,
-            stream=True
+            stream=True,
+            extra_body={'speculative': True} if speculative else None
     ):
         msg = part.choices[0].delta.content
 
         yield "token", part.choices[0]
 
-        msg = re.sub(r'\n+', '\n', msg)
-
-        for char in msg:
-            sentence_buffer += char
-            if char in ('.', ':', '\n', '?', '!'):
-                yield 'sentence', sentence_buffer.strip() + " "
-
-                sentence_buffer = ""
+        if msg:
+            for sentence in segmenter.feed(sanitizer.feed(msg)):
+                yield 'sentence', sentence
 
-    if sentence_buffer:
-        yield 'sentence', sentence_buffer
+    for sentence in segmenter.feed(sanitizer.flush()) + segmenter.flush():
+        yield 'sentence', sentence
@@ -6,9 +6,12 @@ import logfire
 from models.sent_events import WsSendTranscriptionEvent
 from models.session import Session
 from providers import providers, WhisperProvider
+from tasks.coordination import speculate_when_stable, discard_speculation, normalize_prompt
 
 
 async def stt_task(session: Session, received_speech_queue: asyncio.Queue):
+    speculation_timer = None
+    candidate = ''
     try:
         stt_provider: WhisperProvider = providers['stt']['whisper']
 
@@ -24,7 +27,27 @@ async def stt_task(session: Session, received_speech_queue: asyncio.Queue):
             if transcribed_segment.complete:
                 prompt_words.extend(transcribed_segment.words)
 
+            transcript = ' '.join(prompt_words + ([] if transcribed_segment.complete else transcribed_segment.words))
+            if session.config.app.speculative_llm_enabled and normalize_prompt(transcript) != normalize_prompt(candidate):
+                # The stability window restarts only when the words change
+                candidate = transcript
+
+                if speculation_timer:
+                    speculation_timer.cancel()
+                    speculation_timer = None
+
+                speculation = session.speculation
+                if speculation and normalize_prompt(speculation.prompt) != normalize_prompt(candidate):
+                    discard_speculation(session)
+
+                if session.speculation is None and normalize_prompt(candidate):
+                    speculation_timer = asyncio.create_task(speculate_when_stable(session, candidate))
+
             if transcribed_segment.final:
+                timeline = session.pending_timeline()
+                timeline.providers['stt'] = 'whisper'
+                timeline.mark('transcription_final', overwrite=True)
+
                 session.prompt = ' '.join(prompt_words)
                 logfire.info(f'Setting prompt to {session.prompt}')
 
@@ -35,3 +58,7 @@ async def stt_task(session: Session, received_speech_queue: asyncio.Queue):
 
     except Exception as e:
         logfire.error(f'Exception in STT task: {e}', _exc_info=True)
+
+    finally:
+        if speculation_timer:
+            speculation_timer.cancel()
@@ -1,64 +1,161 @@
 import asyncio
-import base64
 
 import logfire
 import numpy as np
 
+from models.frames import encode_speech_frame
 from models.sent_events import WsSendSpeechSamplesEvent
 from models.session import Session
 from providers import providers
 from providers.base import TextToSpeechProvider
+from utils.opus import OpusSpeechEncoder
+from utils.perf import TurnTimeline, latency_metrics
+from utils.sound import resample_to_output, encode_samples_base64, OUTPUT_SAMPLE_RATE
 
 
-async def samples_sender_task(session: Session, outgoing_samples_queue: asyncio.Queue):
+async def samples_sender_task(
+        session: Session,
+        outgoing_samples_queue: asyncio.Queue,
+        sample_rate: int | None,
+        timeline: TurnTimeline,
+        commit: asyncio.Event | None = None
+):
     try:
+        if commit is not None:
+            # Speculative speech stays in the queue until the reply is committed
+            await commit.wait()
+
+        opus_encoder = None
+
         while True:
             samples = await outgoing_samples_queue.get()
             if samples is None:
+                if opus_encoder is not None:
+                    # The tail of the reply shorter than an Opus frame
+                    frame = await opus_encoder.encode(np.zeros(0, dtype=np.float32), flush=True)
+                    if frame is not None:
+                        await session.send_bytes(frame)
                 logfire.debug('Sent all the samples, exiting...')
                 break
 
-            async with session.speech_sending_lock:
-                resampled = [0.0 for _ in range(len(samples) * 2)]
-                for i in range(len(samples)):
-                    resampled[i * 2] = samples[i]
-                    resampled[i * 2 + 1] = samples[i]
+            resampled = resample_to_output(samples, sample_rate)
 
-                logfire.debug(f'Sent {len(samples)} samples')
+            await session.flow_control.wait_for_credit(session.config.app.playback_lead_ms / 1000)
 
+            sample_format = session.speech_output_format()
+            if sample_format == 'json':
                 await session.send_event(
-                    WsSendSpeechSamplesEvent(
-                        samples=base64.b64encode(np.array(resampled, dtype=np.float32).tobytes()).decode('ascii')
-                    )
+                    WsSendSpeechSamplesEvent(samples=encode_samples_base64(resampled))
                 )
-                await asyncio.sleep(len(resampled) / 48000 * 2 / 3)
+            elif sample_format == 'opus':
+                opus_encoder = opus_encoder or OpusSpeechEncoder()
+                frame = await opus_encoder.encode(resampled)
+                if frame is not None:
+                    await session.send_bytes(frame)
+            else:
+                await session.send_bytes(encode_speech_frame(resampled, OUTPUT_SAMPLE_RATE, sample_format))
+
+            session.flow_control.sent(len(resampled) / OUTPUT_SAMPLE_RATE)
+            logfire.debug(f'Sent {len(samples)} samples')
+
+            if not timeline.recorded:
+                timeline.mark('first_sample_sent')
+                latency_metrics.record_turn(timeline)
     except asyncio.CancelledError:
         logfire.info('TTS sender task cancelled.')
     except Exception as e:
         logfire.error(f'Exception in sample sender: {e}', _exc_info=True)
 
 
-async def tts_task(session: Session, llm_response_queue: asyncio.Queue):
+async def synthesize_sentence(
+        tts_provider: TextToSpeechProvider,
+        sentence: str,
+        voice: str,
+        chunks_queue: asyncio.Queue,
+        synthesis_slots: asyncio.Semaphore
+):
+    try:
+        async for samples in tts_provider.synthesize(sentence, voice):
+            await chunks_queue.put(samples)
+    except Exception as e:
+        logfire.error(f'Exception while synthesizing "{sentence}": {e}', _exc_info=True)
+    finally:
+        synthesis_slots.release()
+        chunks_queue.put_nowait(None)
+
+
+async def synthesis_scheduler(
+        tts_provider: TextToSpeechProvider,
+        voice: str,
+        llm_response_queue: asyncio.Queue,
+        synthesized_queue: asyncio.Queue,
+        synthesis_tasks: set[asyncio.Task],
+        lookahead: int
+):
+    """
+    Starts synthesis of up to `lookahead` sentences at once, handing their chunk queues
+    over in sentence order so that playback stays strictly ordered.
+    """
+    synthesis_slots = asyncio.Semaphore(max(1, lookahead))
+
+    while True:
+        sentence = await llm_response_queue.get()
+        if sentence is None:
+            await synthesized_queue.put(None)
+            break
+
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+
+        await synthesis_slots.acquire()
+
+        chunks_queue = asyncio.Queue()
+        task = asyncio.create_task(synthesize_sentence(tts_provider, sentence, voice, chunks_queue, synthesis_slots))
+        synthesis_tasks.add(task)
+        task.add_done_callback(synthesis_tasks.discard)
+
+        await synthesized_queue.put(chunks_queue)
+
+
+async def tts_task(
+        session: Session,
+        llm_response_queue: asyncio.Queue,
+        timeline: TurnTimeline,
+        commit: asyncio.Event | None = None
+):
     tts_provider: TextToSpeechProvider = providers['tts'][session.config.tts.provider]
+    timeline.providers['tts'] = session.config.tts.provider
 
     sender_task = None
+    scheduler_task = None
+    synthesis_tasks: set[asyncio.Task] = set()
     try:
         voice = session.config.tts.voice
 
         outgoing_samples_queue = asyncio.Queue()
-        sender_task = asyncio.create_task(samples_sender_task(session, outgoing_samples_queue))
+        sender_task = asyncio.create_task(
+            samples_sender_task(session, outgoing_samples_queue, tts_provider.SAMPLE_RATE, timeline, commit)
+        )
+
+        synthesized_queue = asyncio.Queue()
+        scheduler_task = asyncio.create_task(synthesis_scheduler(
+            tts_provider,
+            voice,
+            llm_response_queue,
+            synthesized_queue,
+            synthesis_tasks,
+            session.config.app.tts_lookahead
+        ))
 
         while True:
-            sentence = await llm_response_queue.get()
-            if sentence is None:
+            chunks_queue = await synthesized_queue.get()
+            if chunks_queue is None:
                 await outgoing_samples_queue.put(None)
                 break
 
-            sentence = sentence.strip()
-            if not sentence:
-                continue
-
-            async for samples in tts_provider.generate_audio_stream(sentence, voice):
+            while (samples := await chunks_queue.get()) is not None:
+                timeline.mark('tts_first_chunk')
                 await outgoing_samples_queue.put(samples)
 
     except asyncio.CancelledError:
@@ -67,3 +164,8 @@ async def tts_task(session: Session, llm_response_queue: asyncio.Queue):
         logfire.info('TTS task cancelled')
     except Exception as e:
         logfire.error(f'Exception in TTS task {e}', exc_info=True)
+    finally:
+        if scheduler_task:
+            scheduler_task.cancel()
+        for task in list(synthesis_tasks):
+            task.cancel()
@@ -0,0 +1,75 @@
+from typing import List, Dict, Optional
+
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PREFIX = 'Summary of the earlier part of this conversation:\n'
+
+
+def estimate_tokens(message: Dict[str, str]) -> int:
+    return len(message['content']) // CHARS_PER_TOKEN + MESSAGE_OVERHEAD_TOKENS
+
+
+class ContextBuilder:
+    """
+    Assembles the LLM context from the rolling summary and the messages after it.
+
+    The summary covers `messages[:summarized_count]` and only moves forward when a new one is
+    computed, so between summaries the prompt grows append-only and the backend can keep reusing
+    its cached prefix. Once the unsummarized tail passes `summarize_ratio` of the budget a new
+    summary is due, which leaves only about `keep_ratio` of the budget as raw recent messages.
+    """
+    def __init__(
+            self,
+            token_budget: int,
+            min_recent_messages: int = 4,
+            summarize_ratio: float = 0.75,
+            keep_ratio: float = 0.35
+    ):
+        self.token_budget = token_budget
+        self.min_recent_messages = min_recent_messages
+        self.summarize_ratio = summarize_ratio
+        self.keep_ratio = keep_ratio
+
+    def build(self, messages: List[Dict[str, str]], summary: Optional[str], summarized_count: int) -> List[Dict[str, str]]:
+        context = []
+        budget = self.token_budget
+
+        if summary:
+            context.append({'role': 'system', 'content': SUMMARY_PREFIX + summary})
+            budget -= estimate_tokens(context[0])
+
+        window = messages[summarized_count:]
+
+        # Only when a summary is overdue (e.g. it failed) the window slides, dropping the oldest messages
+        start = 0
+        used = sum(estimate_tokens(m) for m in window)
+        while used > budget and len(window) - start > self.min_recent_messages:
+            used -= estimate_tokens(window[start])
+            start += 1
+
+        # Conversations handed to the LLM start with a user turn
+        while start < len(window) - 1 and window[start]['role'] != 'user':
+            start += 1
+
+        context.extend({'role': m['role'], 'content': m['content']} for m in window[start:])
+        return context
+
+    def summarization_cutoff(self, messages: List[Dict[str, str]], summarized_count: int) -> Optional[int]:
+        """Index up to which the messages should be folded into the summary, None while it is not needed."""
+        window = messages[summarized_count:]
+        if sum(estimate_tokens(m) for m in window) <= self.token_budget * self.summarize_ratio:
+            return None
+
+        keep_budget = self.token_budget * self.keep_ratio
+        cutoff = len(messages) - min(self.min_recent_messages, len(window))
+        kept = sum(estimate_tokens(m) for m in messages[cutoff:])
+        while cutoff > summarized_count and kept + estimate_tokens(messages[cutoff - 1]) <= keep_budget:
+            cutoff -= 1
+            kept += estimate_tokens(messages[cutoff])
+
+        # The kept part should start with a user turn
+        while cutoff < len(messages) and messages[cutoff]['role'] != 'user':
+            cutoff += 1
+
+        return cutoff if cutoff > summarized_count else None
@@ -0,0 +1,54 @@
+import asyncio
+import time
+
+
+class PlayoutFlowControl:
+    """
+    Paces speech output of a single session so that it arrives just ahead of client playback.
+
+    The client buffer is estimated from its last `buffered_ms` report plus everything sent since,
+    drained in realtime. Audio goes out while the estimate is below the lead, so little is queued
+    on the client and a barge-in goes silent quickly. Clients that never report are paced by the
+    estimate alone, the legacy `pause_sending` / `resume_sending` commands still hold output entirely.
+    """
+    def __init__(self):
+        self.buffered_s = 0.0
+        self.updated_at = time.monotonic()
+
+        self.resumed = asyncio.Event()
+        self.resumed.set()
+        self.reported = asyncio.Event()
+
+    def estimate(self) -> float:
+        return max(0.0, self.buffered_s - (time.monotonic() - self.updated_at))
+
+    def report(self, buffered_ms: float):
+        self.buffered_s = buffered_ms / 1000
+        self.updated_at = time.monotonic()
+
+        self.reported.set()
+        self.reported.clear()
+
+    def sent(self, duration_s: float):
+        self.buffered_s = self.estimate() + duration_s
+        self.updated_at = time.monotonic()
+
+    def pause(self):
+        self.resumed.clear()
+
+    def resume(self):
+        self.resumed.set()
+
+    async def wait_for_credit(self, lead_s: float):
+        while True:
+            await self.resumed.wait()
+
+            ahead = self.estimate() - lead_s
+            if ahead <= 0:
+                return
+
+            # Sleep until the estimate drains to the lead, a report in the meantime corrects the estimate
+            try:
+                await asyncio.wait_for(self.reported.wait(), ahead)
+            except asyncio.TimeoutError:
+                pass
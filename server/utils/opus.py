@@ -0,0 +1,57 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import numpy as np
+
+from config import config
+from models.frames import encode_opus_frame
+from utils.sound import OUTPUT_SAMPLE_RATE
+
+try:
+    import opuslib
+except Exception:
+    # opuslib raises on import when the libopus shared library is missing, sessions then fall back to int16
+    opuslib = None
+
+OPUS_AVAILABLE = opuslib is not None
+OPUS_FRAME_MS = 20
+
+# The ctypes calls into libopus release the GIL, so encoding runs in parallel with the event loop
+opus_executor = ThreadPoolExecutor(max_workers=config.OPUS_ENCODER_THREADS, thread_name_prefix='opus')
+
+
+class OpusSpeechEncoder:
+    """
+    Encodes the speech of one reply into 20 ms Opus packets.
+
+    Opus only takes whole frames, the remainder of a chunk is carried over to the next one
+    and padded with silence on flush. The encoder is stateful, so a single reply has to be
+    encoded chunk after chunk, different sessions encode concurrently in the pool.
+    """
+    def __init__(self, sample_rate: int = OUTPUT_SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self.frame_samples = sample_rate * OPUS_FRAME_MS // 1000
+
+        self.encoder = opuslib.Encoder(sample_rate, 1, opuslib.APPLICATION_VOIP)
+        self.encoder.bitrate = config.OPUS_BITRATE
+        self.pending = np.zeros(0, dtype=np.float32)
+
+    def encode_packets(self, samples: np.ndarray, flush: bool) -> List[bytes]:
+        samples = np.concatenate((self.pending, samples.astype(np.float32, copy=False)))
+
+        if flush and samples.size % self.frame_samples:
+            samples = np.pad(samples, (0, self.frame_samples - samples.size % self.frame_samples))
+
+        whole = samples.size - samples.size % self.frame_samples
+        self.pending = samples[whole:]
+
+        return [
+            self.encoder.encode_float(samples[offset:offset + self.frame_samples].tobytes(), self.frame_samples)
+            for offset in range(0, whole, self.frame_samples)
+        ]
+
+    async def encode(self, samples: np.ndarray, flush: bool = False) -> bytearray | None:
+        """A binary speech frame of the packets completed by `samples`, None when there are none yet."""
+        packets = await asyncio.get_running_loop().run_in_executor(opus_executor, self.encode_packets, samples, flush)
+        return encode_opus_frame(packets, self.sample_rate) if packets else None
@@ -0,0 +1,111 @@
+import asyncio
+import itertools
+from typing import List, Optional, Union
+
+import logfire
+from starlette.websockets import WebSocket
+
+from models.base import Token, Message
+from models.sent_events import WsSendEvent, WsSendTokenEvent, WsSendSpeechSamplesEvent
+
+PRIORITY_AUDIO = 0
+# Control and text events share a priority, they go out strictly in the order they were produced
+PRIORITY_EVENT = 1
+
+# Tokens generated within one tick go out as a single event
+TOKEN_COALESCE_TICK_S = 0.02
+
+
+def event_priority(event: WsSendEvent) -> int:
+    if isinstance(event, WsSendSpeechSamplesEvent):
+        return PRIORITY_AUDIO
+    return PRIORITY_EVENT
+
+
+class OutboundQueue:
+    """
+    Single writer of a session websocket.
+
+    Tasks of the session enqueue frames without waiting for the socket, one writer task sends them
+    out, speech audio ahead of everything else and all other events in the order they were produced.
+    Tokens are accumulated for a short tick and merged into one token event, the client
+    concatenates token contents anyway.
+    """
+    def __init__(self, socket: WebSocket):
+        self.socket = socket
+
+        self.queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        # Keeps frames of the same priority in order, the payloads themselves are not comparable
+        self.sequence = itertools.count()
+
+        self.pending_tokens: List[str] = []
+        self.flush_handle: Optional[asyncio.TimerHandle] = None
+
+        self.task: Optional[asyncio.Task] = None
+        self.closed = False
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    def stop(self):
+        self.closed = True
+        if self.flush_handle:
+            self.flush_handle.cancel()
+        if self.task:
+            self.task.cancel()
+
+    def put(self, priority: int, payload: Union[bytes, bytearray, WsSendEvent]):
+        if not self.closed:
+            self.queue.put_nowait((priority, next(self.sequence), payload))
+
+    def send_event(self, event: WsSendEvent):
+        if isinstance(event, WsSendTokenEvent) and event.token is not None:
+            self.pending_tokens.append(event.token.message.content)
+            if self.flush_handle is None:
+                self.flush_handle = asyncio.get_running_loop().call_later(TOKEN_COALESCE_TICK_S, self.flush_tokens)
+            return
+
+        priority = event_priority(event)
+        if priority != PRIORITY_AUDIO:
+            # Tokens held for coalescing must not be overtaken, the end of generation marker comes after them
+            self.flush_tokens()
+        self.put(priority, event)
+
+    def send_bytes(self, data: Union[bytes, bytearray]):
+        self.put(PRIORITY_AUDIO, data)
+
+    def flush_tokens(self):
+        if self.flush_handle:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+
+        if not self.pending_tokens:
+            return
+
+        content = ''.join(self.pending_tokens)
+        self.pending_tokens.clear()
+        self.put(PRIORITY_EVENT, WsSendTokenEvent(
+            token=Token(
+                message=Message(
+                    role='assistant',
+                    content=content
+                )
+            )
+        ))
+
+    async def run(self):
+        try:
+            while True:
+                _, _, payload = await self.queue.get()
+                # Speech frames are built in place as bytearrays
+                if isinstance(payload, (bytes, bytearray, memoryview)):
+                    await self.socket.send_bytes(payload)
+                else:
+                    await self.socket.send_text(payload.model_dump_json())
+
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            # The socket is gone, the main loop notices the disconnect and terminates the session
+            logfire.warning(f'Stopped sending to client: {e}')
+            self.closed = True
@@ -1,5 +1,9 @@
+import asyncio
+import bisect
+import itertools
 import time
-from typing import Optional
+from collections import deque, defaultdict
+from typing import Optional, Dict, Tuple, Deque
 
 import logfire
 
@@ -23,3 +27,166 @@ class ElapsedTime:
 
         self.duration = end_time - self.start_time
         logfire.debug(f'{self.code_block_name or "Execution"} took {self.duration:.2f}s')
+
+
+TURN_STAGES = (
+    # (stage, start mark, end mark, provider kind)
+    ('stt_finalization', 'speech_end', 'transcription_final', 'stt'),
+    ('turn_acceptance', 'transcription_final', 'llm_request', None),
+    ('llm_first_token', 'llm_request', 'llm_first_token', 'llm'),
+    ('first_sentence', 'llm_first_token', 'first_sentence', 'llm'),
+    ('tts_first_chunk', 'first_sentence', 'tts_first_chunk', 'tts'),
+    ('audio_output', 'tts_first_chunk', 'first_sample_sent', None),
+    ('llm_to_first_audio', 'llm_request', 'first_sample_sent', 'tts'),
+    ('time_to_first_audio', 'speech_end', 'first_sample_sent', 'tts'),
+)
+
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float('inf'))
+
+
+class TurnTimeline:
+    """Monotonic timestamps of the milestones of one conversational turn, from speech end to first audio."""
+    def __init__(self):
+        self.marks: Dict[str, float] = {}
+        self.providers: Dict[str, str] = {}
+        self.recorded = False
+
+    def mark(self, name: str, overwrite: bool = False):
+        if overwrite or name not in self.marks:
+            self.marks[name] = time.perf_counter()
+
+    def stages(self) -> Dict[str, float]:
+        # Speculative turns can get ahead of the request they end up committed to, such a stage took no time
+        return {
+            stage: max(0.0, self.marks[end] - self.marks[start])
+            for stage, start, end, _ in TURN_STAGES
+            if start in self.marks and end in self.marks
+        }
+
+
+class LatencyHistogram:
+    """Cumulative bucket counts plus a window of recent samples for percentiles."""
+    def __init__(self, window: int = 1024):
+        self.counts = [0] * len(LATENCY_BUCKETS_MS)
+        self.count = 0
+        self.total_ms = 0.0
+        self.recent: Deque[float] = deque(maxlen=window)
+
+    def observe(self, value_ms: float):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, value_ms)] += 1
+        self.count += 1
+        self.total_ms += value_ms
+        self.recent.append(value_ms)
+
+    def percentile(self, q: float) -> float:
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean_ms': self.total_ms / self.count if self.count else 0.0,
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'buckets': {
+                str(bound): count for bound, count in zip(LATENCY_BUCKETS_MS, itertools.accumulate(self.counts))
+            }
+        }
+
+
+class LatencyMetrics:
+    def __init__(self):
+        self.histograms: Dict[Tuple[str, str], LatencyHistogram] = defaultdict(LatencyHistogram)
+
+    def record_turn(self, timeline: TurnTimeline):
+        """Adds the stages of a finished turn to the histograms, a timeline is only recorded once."""
+        if timeline.recorded:
+            return
+        timeline.recorded = True
+
+        stages = timeline.stages()
+        for stage, _, _, provider_kind in TURN_STAGES:
+            if stage in stages:
+                provider = timeline.providers.get(provider_kind, 'all') if provider_kind else 'all'
+                self.histograms[(stage, provider)].observe(stages[stage] * 1000)
+
+        logfire.info(
+            'Turn latency ' + ', '.join(f'{stage} {duration * 1000:.0f}ms' for stage, duration in stages.items()),
+            providers=timeline.providers
+        )
+
+    def metrics(self):
+        result = defaultdict(dict)
+        for (stage, provider), histogram in self.histograms.items():
+            result[stage][provider] = histogram.summary()
+        return result
+
+
+latency_metrics = LatencyMetrics()
+
+
+class SpeculationMetrics:
+    def __init__(self):
+        self.started = 0
+        self.committed = 0
+        self.discarded = 0
+        self.tokens_generated = 0
+        self.tokens_wasted = 0
+        # Speculative replies that stopped at a tool call and waited for the final prompt
+        self.tool_deferrals = 0
+        self.saved_latency = LatencyHistogram()
+
+    def record_commit(self, saved_s: float):
+        self.committed += 1
+        self.saved_latency.observe(saved_s * 1000)
+
+    def record_discard(self, tokens: int):
+        self.discarded += 1
+        self.tokens_wasted += tokens
+
+    def metrics(self):
+        return {
+            'started': self.started,
+            'committed': self.committed,
+            'discarded': self.discarded,
+            'tokens_generated': self.tokens_generated,
+            'tokens_wasted': self.tokens_wasted,
+            'wasted_token_ratio': self.tokens_wasted / self.tokens_generated if self.tokens_generated else 0.0,
+            'tool_deferrals': self.tool_deferrals,
+            'saved_latency': self.saved_latency.summary()
+        }
+
+
+speculation_metrics = SpeculationMetrics()
+
+
+class EventLoopLagMonitor:
+    """Measures how late a periodic wake-up fires, i.e. how long callbacks keep the event loop busy."""
+    def __init__(self, interval_s: float = 0.1):
+        self.interval_s = interval_s
+        self.lag = LatencyHistogram()
+        self.max_lag_ms = 0.0
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+
+    async def run(self):
+        while True:
+            expected = time.perf_counter() + self.interval_s
+            await asyncio.sleep(self.interval_s)
+            lag_ms = max(0.0, time.perf_counter() - expected) * 1000
+
+            self.lag.observe(lag_ms)
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+
+    def metrics(self):
+        return self.lag.summary() | {'max_ms': self.max_lag_ms}
+
+
+event_loop_monitor = EventLoopLagMonitor()
@@ -1,44 +1,104 @@
+import html
 import re
 
-import markdown
-import demoji
-from bs4 import BeautifulSoup
+EMOJI_PATTERN = (
+    '\U0001F000-\U0001FAFF'  # pictographs, emoticons, transport, flags, supplemental symbols
+    '\u2600-\u27BF'  # miscellaneous symbols and dingbats
+    '\u231A\u231B\u23E9-\u23F3\u23F8-\u23FA\u2B05-\u2B07\u2B1B\u2B1C\u2B50\u2B55'
+    '\uFE0F\u200D\u20E3'  # variation selector, zero width joiner, keycap
+    '\U000E0020-\U000E007F'  # tag sequences
+)
+
+LINK_RE = re.compile(r'!?\[[^\]\n]*\]\([^)\n]*\)')
+
+# One alternation applied in a single pass, the replacement depends on which group matched.
+# Images are dropped entirely, the rendered alt text was never spoken either.
+SANITIZE_RE = re.compile(
+    r'(?P<image>!\[[^\]\n]*\]\([^)\n]*\))'
+    r'|(?P<link>\[(?P<link_text>[^\]\n]*)\]\([^)\n]*\))'
+    r'|(?P<url>https?://\S+)'
+    r'|(?P<tag></?[A-Za-z][^<>\n]*>)'
+    r'|(?P<rule>^[ \t]*(?P<rule_char>[-*_])(?:[ \t]*(?P=rule_char)){2,}[ \t]*$)'
+    r'|(?P<line_marker>^[ \t]*(?:#{1,6}[ \t]+|>[ \t]?|[-*+][ \t]+|\d+\.[ \t]+))'
+    r'|(?P<entity>&(?:#\d+|#x[0-9a-fA-F]+|[A-Za-z]+);)'
+    r'|(?P<escape>\\(?P<escaped>[\\`*_{}\[\]()#+\-.!]))'
+    r'|(?P<drop>[*_`' + EMOJI_PATTERN + r']+)',
+    flags=re.MULTILINE
+)
+
+NEWLINES_RE = re.compile(r'[ \t]*\n\s*')
+SPACES_RE = re.compile(r'[^\S\n]+')
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+def _replace(match: re.Match) -> str:
+    kind = match.lastgroup
+    if kind == 'link':
+        return match.group('link_text')
+    if kind == 'entity':
+        return html.unescape(match.group('entity'))
+    if kind == 'escape':
+        return match.group('escaped')
+    return ''
 
 
 def clean_text_for_tts(text):
     """
-    Removes Markdown, specific content (links, tables, etc.), and emojis
+    Removes Markdown, specific content (links, URLs, HTML tags), and emojis
     from a string for text-to-speech.
     """
-    # 1. Remove Emojis
-    cleaned_text = demoji.replace(text, "")
+    return WHITESPACE_RE.sub(' ', SANITIZE_RE.sub(_replace, text)).strip()
+
+
+def collapse_whitespace(text: str) -> str:
+    return WHITESPACE_RE.sub(' ', text).strip()
+
+
+class StreamingTextSanitizer:
+    """
+    Cleans LLM output as token deltas arrive, so sentences reach TTS already sanitized.
+
+    Anything that could still turn into a link, URL, tag, entity or line marker with the next
+    delta is held back. Newlines are kept (collapsed) so the sentence segmenter can still use them.
+    """
+    HOLD_BACK_RE = re.compile(
+        r'(?:!?\[[^\]\n]{0,200}(?:\](?:\([^)\n]{0,500})?)?'
+        r'|h(?:t(?:t(?:p(?:s?(?::(?:/(?:/\S*)?)?)?)?)?)?)?'
+        r'|https?://\S*'
+        r'|</?(?:[A-Za-z][^<>\n]{0,100})?'
+        r'|&#?[A-Za-z0-9]{0,10}'
+        r'|\\'
+        r'|(?:^|\n)[ \t]*(?:#{0,6}|>|[-*+_]|[-*_ \t]{0,8}|\d{0,3}\.?))$'
+    )
 
-    # 2. Convert Markdown to HTML (helps handle links, tables, etc.)
-    #    We use a liberal approach here, letting markdown convert as much as possible
-    #    before stripping HTML.
-    html_text = markdown.markdown(cleaned_text)
+    def __init__(self):
+        self.pending = ''
+        self.at_line_start = True
 
-    # 3. Remove HTML Tags and Extract Text using BeautifulSoup
-    soup = BeautifulSoup(html_text, "html.parser")
-    cleaned_text = soup.get_text()
+    def feed(self, delta: str) -> str:
+        self.pending += delta
 
-    # 4. Clean up remaining simple Markdown artifacts and excessive whitespace
-    # Remove common Markdown symbols that might persist
-    cleaned_text = re.sub(r'[*_`]', '', cleaned_text) # Bold, italics, inline code
-    cleaned_text = re.sub(r'^#+\s', '', cleaned_text, flags=re.MULTILINE) # Headers
+        # A URL inside an already complete link must not hold the link back
+        complete_links_end = max((m.end() for m in LINK_RE.finditer(self.pending)), default=0)
+        held = self.HOLD_BACK_RE.search(self.pending, complete_links_end)
+        cut = held.start() if held else len(self.pending)
+        ready, self.pending = self.pending[:cut], self.pending[cut:]
 
-    # Remove URLs that might not have been in Markdown link format
-    cleaned_text = re.sub(r'http[s]?://\S+', '', cleaned_text)
+        return self.clean(ready)
 
-    # Replace multiple newlines with a single newline
-    cleaned_text = re.sub(r'\n\s*\n', '\n', cleaned_text)
+    def flush(self) -> str:
+        ready, self.pending = self.pending, ''
+        return self.clean(ready)
 
-    # Remove leading/trailing whitespace from each line and the whole text
-    cleaned_text = '\n'.join(line.strip() for line in cleaned_text.split('\n'))
-    cleaned_text = cleaned_text.strip()
+    def clean(self, text: str) -> str:
+        if not text:
+            return ''
 
-    # Replace multiple spaces with a single space
-    cleaned_text = re.sub(r'\s+', ' ', cleaned_text)
+        if not self.at_line_start:
+            # Markers are only valid at the beginning of a line, which this chunk does not start
+            text = '\0' + text
+        cleaned = SANITIZE_RE.sub(_replace, text).lstrip('\0')
 
+        self.at_line_start = text.endswith('\n')
 
-    return cleaned_text
+        return SPACES_RE.sub(' ', NEWLINES_RE.sub('\n', cleaned))
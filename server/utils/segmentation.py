@@ -0,0 +1,143 @@
+from typing import List
+
+SENTENCE_END = '.!?'
+CLAUSE_END = ',;:'
+CLOSERS = '"\')]»”’'
+
+ABBREVIATIONS = frozenset({
+    'mr', 'mrs', 'ms', 'dr', 'prof', 'sr', 'jr', 'st', 'mt', 'ft', 'vs', 'etc', 'approx', 'no', 'nr', 'fig',
+    'inc', 'ltd', 'co', 'corp', 'dept', 'est', 'min', 'max', 'e.g', 'i.e', 'a.m', 'p.m', 'u.s', 'u.k',
+    'jan', 'feb', 'mar', 'apr', 'jun', 'jul', 'aug', 'sep', 'sept', 'oct', 'nov', 'dec',
+})
+
+
+class SentenceSegmenter:
+    """
+    Incrementally splits streamed LLM text into chunks suitable for TTS requests.
+
+    Periods inside numbers ("3.5"), abbreviations ("Dr.", "e.g.") and initials do not end a sentence.
+    The first chunk is released as early as possible (clause boundaries count once it is at least
+    `first_chunk_min_length` long) to cut time-to-first-audio. The required length then doubles with
+    every chunk up to `min_length`, so the reply needs fewer TTS calls while the first ones are
+    still playing. Nothing is held much past `max_length`.
+    """
+    def __init__(self, first_chunk_min_length: int = 5, min_length: int = 60, max_length: int = 250):
+        self.first_chunk_min_length = first_chunk_min_length
+        self.min_length = min_length
+        self.max_length = max_length
+
+        self.buffer = ''
+        self.scan_position = 0
+        self.last_soft_boundary = 0
+        self.chunks_emitted = 0
+
+    def feed(self, delta: str) -> List[str]:
+        self.buffer += delta
+        chunks = []
+
+        while (chunk := self.next_chunk()) is not None:
+            if chunk:
+                chunks.append(chunk)
+
+        return chunks
+
+    def flush(self) -> List[str]:
+        chunk = self.buffer.strip()
+        self.buffer = ''
+        self.scan_position = 0
+        self.last_soft_boundary = 0
+
+        if not chunk:
+            return []
+
+        self.chunks_emitted += 1
+        return [chunk]
+
+    def next_chunk(self) -> str | None:
+        buffer = self.buffer
+        first_chunk = self.chunks_emitted == 0
+        required_length = min(self.min_length, self.first_chunk_min_length * 2 ** self.chunks_emitted)
+
+        i = self.scan_position
+        while i < len(buffer):
+            char = buffer[i]
+
+            if char == '\n':
+                end = i + 1
+            elif char in SENTENCE_END or char in CLAUSE_END:
+                if i + 1 >= len(buffer):
+                    # Cannot tell "3." from "3.5" or "e." from "e.g." before the next character arrives
+                    break
+
+                end = self.boundary_end(buffer, i)
+                if end is None:
+                    i += 1
+                    continue
+                if end >= len(buffer):
+                    break
+
+                if char in CLAUSE_END and not first_chunk:
+                    self.last_soft_boundary = end
+                    i += 1
+                    continue
+            else:
+                if char.isspace() and i <= self.max_length:
+                    self.last_soft_boundary = i
+                i += 1
+                continue
+
+            if len(buffer[:end].strip()) >= required_length:
+                return self.emit(end)
+
+            self.last_soft_boundary = end
+            i = end
+
+        self.scan_position = i
+
+        if len(buffer) > self.max_length:
+            return self.emit(self.last_soft_boundary or self.max_length)
+
+        return None
+
+    @staticmethod
+    def boundary_end(buffer: str, i: int) -> int | None:
+        char = buffer[i]
+
+        if char == '.':
+            if buffer[i + 1] == '.' or (i > 0 and buffer[i - 1].isdigit() and buffer[i + 1].isdigit()):
+                return None
+
+            start = i
+            while start > 0 and (buffer[start - 1].isalpha() or buffer[start - 1] == '.'):
+                start -= 1
+            word = buffer[start:i].lower()
+            if word in ABBREVIATIONS or (len(word) == 1 and word.isalpha()):
+                return None
+
+            # Numbered list markers ("\n2. Second item")
+            start = i
+            while start > 0 and buffer[start - 1].isdigit():
+                start -= 1
+            if start < i and buffer[:start].rstrip(' ')[-1:] in ('', '\n'):
+                return None
+
+        end = i + 1
+        while end < len(buffer) and buffer[end] in CLOSERS:
+            end += 1
+
+        # Returning the buffer length means the character following the closers has not arrived yet
+        if end < len(buffer) and not buffer[end].isspace():
+            return None
+
+        return end
+
+    def emit(self, end: int) -> str:
+        chunk = self.buffer[:end].strip()
+
+        self.buffer = self.buffer[end:]
+        self.scan_position = 0
+        self.last_soft_boundary = 0
+
+        if chunk:
+            self.chunks_emitted += 1
+        return chunk
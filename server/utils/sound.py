@@ -1,6 +1,11 @@
+import base64
+
 import numpy as np
 from scipy import signal
 
+OUTPUT_SAMPLE_RATE = 48000
+DEFAULT_TTS_SAMPLE_RATE = 24000
+
 
 def resample_chunk(audio_chunk_np, original_sr, target_sr):
     num_samples_original = len(audio_chunk_np)
@@ -9,3 +14,35 @@ def resample_chunk(audio_chunk_np, original_sr, target_sr):
     if num_samples_target <= 0: return np.array([], dtype=np.float32)
     resampled_chunk = signal.resample(audio_chunk_np, num_samples_target)
     return resampled_chunk.astype(np.float32)
+
+
+def pcm16_to_float32(buffer: bytes) -> np.ndarray:
+    samples = np.frombuffer(buffer, dtype=np.int16).astype(np.float32)
+    samples *= 1 / 32768.0
+    return samples
+
+
+def resample_to_output(samples: np.ndarray, source_sr: int | None) -> np.ndarray:
+    """
+    Converts a chunk of TTS samples to float32 at OUTPUT_SAMPLE_RATE.
+
+    Integer ratios (24 kHz -> 48 kHz) are handled by sample repetition, which is what the
+    client always received, anything else falls back to linear interpolation. Both are
+    stateless per chunk, so chunk boundaries never need to be carried over.
+    """
+    samples = np.asarray(samples, dtype=np.float32)
+    source_sr = source_sr or DEFAULT_TTS_SAMPLE_RATE
+
+    if source_sr == OUTPUT_SAMPLE_RATE or samples.size == 0:
+        return samples
+
+    if OUTPUT_SAMPLE_RATE % source_sr == 0:
+        return np.repeat(samples, OUTPUT_SAMPLE_RATE // source_sr)
+
+    num_samples_target = round(samples.size * OUTPUT_SAMPLE_RATE / source_sr)
+    positions = np.linspace(0, samples.size - 1, num_samples_target, dtype=np.float32)
+    return np.interp(positions, np.arange(samples.size, dtype=np.float32), samples).astype(np.float32)
+
+
+def encode_samples_base64(samples: np.ndarray) -> str:
+    return base64.b64encode(samples.astype('<f4', copy=False).tobytes()).decode('ascii')
@@ -1,6 +1,9 @@
 const CTL_READ_IDX = 1;
 const CTL_SAMPLES_AVAIL_IDX = 2;
 
+// Playout level reports to the server, about every 100 ms at 48 kHz (128 samples per block)
+const REPORT_EVERY_BLOCKS = 37;
+
 
 class SharedAudioProcessor extends AudioWorkletProcessor {
     HIGH_WATERMARK_SAMPLES = 0
@@ -8,6 +11,8 @@ class SharedAudioProcessor extends AudioWorkletProcessor {
 
     valid: boolean = false;
     isSignalingPause = false
+    blocksSinceReport = 0
+    lastReportedSamples = 0
 
     audioSAB = new SharedArrayBuffer(16)
     controlSAB = new SharedArrayBuffer(16)
@@ -43,10 +48,11 @@ class SharedAudioProcessor extends AudioWorkletProcessor {
         this.port.postMessage({ type: 'worklet_ready' });
     }
 
-    sendControlMessage(command: 'pause_sending' | 'resume_sending') {
+    sendControlMessage(command: 'pause_sending' | 'resume_sending' | 'report', samplesAvailable: number) {
         this.port.postMessage({
             type: 'control',
-            command: command
+            command: command,
+            buffered_ms: samplesAvailable / sampleRate * 1000
         });
     }
 
@@ -57,6 +63,14 @@ class SharedAudioProcessor extends AudioWorkletProcessor {
         const blockSize = outputs[0][0].length;
 
         let samplesAvailable = Atomics.load(this.controlBuffer, CTL_SAMPLES_AVAIL_IDX);
+
+        this.blocksSinceReport++;
+        if (this.blocksSinceReport >= REPORT_EVERY_BLOCKS && (samplesAvailable > 0 || this.lastReportedSamples > 0)) {
+            this.sendControlMessage('report', samplesAvailable);
+            this.blocksSinceReport = 0;
+            this.lastReportedSamples = samplesAvailable;
+        }
+
         if (samplesAvailable < blockSize) {
             return true
         }
@@ -98,12 +112,12 @@ class SharedAudioProcessor extends AudioWorkletProcessor {
 
         if (!this.isSignalingPause && samplesAvailable > this.HIGH_WATERMARK_SAMPLES) {
             console.warn(`[AudioWorklet] High watermark reached (${samplesAvailable} > ${this.HIGH_WATERMARK_SAMPLES}). Requesting PAUSE.`);
-            this.sendControlMessage('pause_sending');
+            this.sendControlMessage('pause_sending', samplesAvailable);
             this.isSignalingPause = true;
         }
         else if (this.isSignalingPause && samplesAvailable < this.LOW_WATERMARK_SAMPLES) {
             console.log(`[AudioWorklet] Low watermark reached (${samplesAvailable} < ${this.LOW_WATERMARK_SAMPLES}). Requesting RESUME.`);
-            this.sendControlMessage('resume_sending');
+            this.sendControlMessage('resume_sending', samplesAvailable);
             this.isSignalingPause = false;
         }
 
@@ -17,3 +17,87 @@ export function base64ToArrayBuffer(base64: string): ArrayBuffer {
     }
     return bytes.buffer;
 }
+
+
+export const FRAME_HEADER_BYTES = 8
+export const FRAME_SPEECH_FLOAT32 = 0x01
+export const FRAME_SPEECH_INT16 = 0x02
+export const FRAME_SPEECH_OPUS = 0x03
+export const FRAME_MIC_FLOAT32 = 0x10
+// The server encodes 20 ms Opus packets
+const OPUS_PACKET_DURATION_US = 20_000
+
+export function decodeSpeechFrame(buffer: ArrayBuffer): Float32Array | null {
+    const kind = new DataView(buffer).getUint8(0)
+
+    if (kind === FRAME_SPEECH_FLOAT32) {
+        return new Float32Array(buffer, FRAME_HEADER_BYTES)
+    }
+    if (kind === FRAME_SPEECH_INT16) {
+        const pcm = new Int16Array(buffer, FRAME_HEADER_BYTES)
+        const samples = new Float32Array(pcm.length)
+        for (let i = 0; i < pcm.length; i++) {
+            samples[i] = pcm[i] / 32768
+        }
+        return samples
+    }
+    return null
+}
+
+export function isOpusFrame(buffer: ArrayBuffer): boolean {
+    return new DataView(buffer).getUint8(0) === FRAME_SPEECH_OPUS
+}
+
+export function opusDecodingSupported(): boolean {
+    return typeof AudioDecoder !== "undefined"
+}
+
+// Decodes Opus speech frames with WebCodecs, samples are handed to onSamples as they are decoded
+export class OpusSpeechDecoder {
+    private decoder: AudioDecoder
+    private timestamp = 0
+
+    constructor(sampleRate: number, onSamples: (samples: Float32Array) => void) {
+        this.decoder = new AudioDecoder({
+            output: (data: AudioData) => {
+                const samples = new Float32Array(data.numberOfFrames)
+                data.copyTo(samples, {planeIndex: 0, format: 'f32-planar'})
+                data.close()
+                onSamples(samples)
+            },
+            error: (e: DOMException) => console.error(`Opus decoding failed: ${e.message}`)
+        })
+        this.decoder.configure({codec: 'opus', sampleRate, numberOfChannels: 1})
+    }
+
+    decode(buffer: ArrayBuffer) {
+        const view = new DataView(buffer)
+        let offset = FRAME_HEADER_BYTES
+        while (offset + 2 <= buffer.byteLength) {
+            const length = view.getUint16(offset, true)
+            offset += 2
+            this.decoder.decode(new EncodedAudioChunk({
+                type: 'key',
+                timestamp: this.timestamp,
+                data: new Uint8Array(buffer, offset, length)
+            }))
+            offset += length
+            this.timestamp += OPUS_PACKET_DURATION_US
+        }
+    }
+
+    close() {
+        if (this.decoder.state !== 'closed') {
+            this.decoder.close()
+        }
+    }
+}
+
+export function encodeMicFrame(samples: Float32Array, sampleRate: number): ArrayBuffer {
+    const buffer = new ArrayBuffer(FRAME_HEADER_BYTES + samples.byteLength)
+    const header = new DataView(buffer)
+    header.setUint8(0, FRAME_MIC_FLOAT32)
+    header.setUint32(4, sampleRate, true)
+    new Float32Array(buffer, FRAME_HEADER_BYTES).set(samples)
+    return buffer
+}
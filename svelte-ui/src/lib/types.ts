@@ -61,6 +61,7 @@ export interface ManualPromptEvent {
 export interface ReceivedConfigEvent {
     type: WebsocketEventType.CONFIGURATION
     configuration: Configuration
+    speech_output_formats: SpeechOutputFormat[]
 }
 
 export interface SpeechSamplesEvent {
@@ -97,6 +98,8 @@ export type OrpheusConfiguration = {
 }
 
 
+export type SpeechOutputFormat = 'json' | 'float32' | 'int16' | 'opus'
+
 export type Configuration = {
     stt: STTConfiguration
     tts: KokoroConfiguration | OrpheusConfiguration
@@ -106,6 +109,14 @@ export type Configuration = {
         voice_input_enabled: boolean
         voice_output_enabled: boolean
         after_user_speech_confirmation_delay_ms: number
+        speech_output_format: SpeechOutputFormat
+        tts_lookahead: number
+        playback_lead_ms: number
+        speculative_llm_enabled: boolean
+        speculative_stability_ms: number
+        speculative_tts_enabled: boolean
+        prefix_warmup_enabled: boolean
+        prefix_warmup_interval_ms: number
     }
 }
 export type Message = {